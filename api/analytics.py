@@ -0,0 +1,213 @@
+"""
+Daily request rollups for the staff analytics API.
+
+Every transition appends a ``RequestEvent`` and bumps the matching
+``DailyRequestStats`` / ``TechnicianDailyStats`` rows with F() deltas in the
+same transaction. ``rebuild_days`` recomputes rollups for a date range from
+the event log, which is what the ``refresh_rollups`` catch-up command runs.
+Reads only ever touch the rollup tables, one row per day (per technician).
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DailyRequestStats, RequestEvent, ServiceRequest, TechnicianDailyStats
+from .signals import request_rated, request_status_changed
+
+# وضعیت مقصد -> نوع رویداد
+STATUS_EVENTS = {
+    'assigned': 'assigned',
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+    'paid': 'paid',
+}
+COUNT_FIELDS = {
+    'created': 'created_count',
+    'assigned': 'assigned_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+    'paid': 'paid_count',
+}
+STAT_FIELDS = (
+    'created_count', 'assigned_count', 'completed_count', 'cancelled_count', 'paid_count',
+    'revenue', 'discount_total', 'rating_sum', 'rating_count',
+)
+
+
+def _event_deltas(event):
+    deltas = Counter()
+    if event.kind in COUNT_FIELDS:
+        deltas[COUNT_FIELDS[event.kind]] += 1
+    if event.kind == 'paid':
+        deltas['revenue'] += event.amount or 0
+        deltas['discount_total'] += event.discount or 0
+    if event.kind == 'rated':
+        deltas['rating_sum'] += event.rating
+        deltas['rating_count'] += 1
+    return deltas
+
+
+def _bump(model, lookup, deltas, now):
+    model.objects.bulk_create([model(updated_at=now, **lookup)], ignore_conflicts=True)
+    model.objects.filter(**lookup).update(
+        updated_at=now, **{field: F(field) + value for field, value in deltas.items() if value}
+    )
+
+
+def record_events(events):
+    """Append ``events`` to the log and fold them into the rollups."""
+    if not events:
+        return
+    now = timezone.now()
+    daily = defaultdict(Counter)
+    per_technician = defaultdict(Counter)
+    for event in events:
+        deltas = _event_deltas(event)
+        day = timezone.localdate(event.occurred_at)
+        daily[day].update(deltas)
+        if event.technician_id:
+            per_technician[(event.technician_id, day)].update(deltas)
+
+    with transaction.atomic():
+        RequestEvent.objects.bulk_create(events)
+        for day, deltas in daily.items():
+            _bump(DailyRequestStats, {'day': day}, deltas, now)
+        if per_technician:
+            _bump_technicians(per_technician, now)
+
+
+def _bump_technicians(per_technician, now):
+    # A dispatch round touches hundreds of technicians with the same few deltas:
+    # create the missing rows in one insert and run one UPDATE per distinct delta.
+    TechnicianDailyStats.objects.bulk_create(
+        [TechnicianDailyStats(technician_id=technician_id, day=day, updated_at=now)
+         for technician_id, day in per_technician],
+        ignore_conflicts=True,
+    )
+    groups = defaultdict(list)
+    for (technician_id, day), deltas in per_technician.items():
+        groups[(day, frozenset(deltas.items()))].append(technician_id)
+    for (day, deltas), technician_ids in groups.items():
+        TechnicianDailyStats.objects.filter(day=day, technician_id__in=technician_ids).update(
+            updated_at=now, **{field: F(field) + value for field, value in deltas if value}
+        )
+
+
+@receiver(request_status_changed, dispatch_uid='analytics_request_status_changed')
+def on_request_status_changed(sender, changes, **kwargs):
+    now = timezone.now()
+    paid_ids = [change.request_id for change in changes if change.to_status == 'paid']
+    amounts = {}
+    if paid_ids:
+        amounts = {
+            row['pk']: row for row in
+            ServiceRequest.objects.filter(pk__in=paid_ids).values('pk', 'final_price', 'discount_amount')
+        }
+
+    events = []
+    for change in changes:
+        if change.from_status is None and change.to_status is not None:
+            kind = 'created'
+        elif change.from_status != change.to_status:
+            kind = STATUS_EVENTS.get(change.to_status)
+        else:
+            kind = None
+        if kind is None:
+            continue
+        event = RequestEvent(request_id=change.request_id, technician_id=change.technician_id,
+                             kind=kind, occurred_at=now)
+        if kind == 'paid' and change.request_id in amounts:
+            row = amounts[change.request_id]
+            discount = row['discount_amount'] or Decimal('0')
+            event.amount = (row['final_price'] or Decimal('0')) - discount
+            event.discount = discount
+        events.append(event)
+    record_events(events)
+
+
+@receiver(request_rated, dispatch_uid='analytics_request_rated')
+def on_request_rated(sender, instance, **kwargs):
+    record_events([RequestEvent(
+        request_id=instance.pk, technician_id=instance.technician_id, kind='rated',
+        rating=instance.rating, occurred_at=timezone.now(),
+    )])
+
+
+def _aggregates():
+    aggregates = {
+        field: Count('pk', filter=Q(kind=kind)) for kind, field in COUNT_FIELDS.items()
+    }
+    aggregates.update(
+        revenue=Sum('amount', filter=Q(kind='paid')),
+        discount_total=Sum('discount', filter=Q(kind='paid')),
+        rating_sum=Sum('rating', filter=Q(kind='rated')),
+        rating_count=Count('pk', filter=Q(kind='rated')),
+    )
+    return aggregates
+
+
+def _row_values(row):
+    return {field: row[field] or 0 for field in STAT_FIELDS}
+
+
+@transaction.atomic
+def rebuild_days(start, end):
+    """Recompute the rollups for ``start``..``end`` (inclusive) from the event log."""
+    DailyRequestStats.objects.filter(day__gte=start, day__lte=end).delete()
+    TechnicianDailyStats.objects.filter(day__gte=start, day__lte=end).delete()
+
+    # Filter on the raw timestamp so the occurred_at index bounds the scan.
+    tz = timezone.get_current_timezone()
+    events = (RequestEvent.objects
+              .filter(occurred_at__gte=datetime.combine(start, time.min, tzinfo=tz),
+                      occurred_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz))
+              .annotate(day=TruncDate('occurred_at')))
+    now = timezone.now()
+    DailyRequestStats.objects.bulk_create([
+        DailyRequestStats(day=row['day'], updated_at=now, **_row_values(row))
+        for row in events.values('day').annotate(**_aggregates()).order_by()
+    ])
+    TechnicianDailyStats.objects.bulk_create([
+        TechnicianDailyStats(day=row['day'], technician_id=row['technician_id'], updated_at=now,
+                             **_row_values(row))
+        for row in (events.filter(technician_id__isnull=False)
+                    .values('day', 'technician_id').annotate(**_aggregates()).order_by())
+    ])
+
+
+def summarize(row):
+    """Add the derived ratios to a row of summed counters."""
+    row = {field: row.get(field) or 0 for field in STAT_FIELDS} | {
+        key: value for key, value in row.items() if key not in STAT_FIELDS
+    }
+    # از درخواست‌هایی که در این بازه بسته شده‌اند، چه سهمی تکمیل شده است
+    closed = row['completed_count'] + row['cancelled_count']
+    row['completion_rate'] = round(row['completed_count'] / closed, 4) if closed else None
+    row['average_rating'] = (
+        round(row['rating_sum'] / row['rating_count'], 2) if row['rating_count'] else None
+    )
+    return row
+
+
+def query(start, end, group_by):
+    """Sum the rollups for ``start``..``end`` grouped by day, week, month or technician."""
+    sums = {field: Sum(field) for field in STAT_FIELDS}
+    if group_by == 'technician':
+        rows = (TechnicianDailyStats.objects.filter(day__gte=start, day__lte=end)
+                .values('technician_id', 'technician__phone_number')
+                .annotate(**sums).order_by('technician_id'))
+        return [summarize(row) for row in rows]
+
+    rows = DailyRequestStats.objects.filter(day__gte=start, day__lte=end)
+    if group_by != 'day':
+        trunc = {'week': TruncWeek, 'month': TruncMonth}[group_by]
+        rows = rows.annotate(period=trunc('day')).values('period').annotate(**sums).order_by('period')
+    else:
+        rows = rows.annotate(period=F('day')).values('period', *STAT_FIELDS).order_by('period')
+    return [summarize(row) for row in rows]
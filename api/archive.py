@@ -0,0 +1,86 @@
+"""
+Archival of closed requests.
+
+``archive_batch`` moves one chunk of old paid/cancelled requests and their
+attachments into the archive tables inside a single transaction. The rows are
+copied column for column, keeping their ids, and then deleted from the hot
+tables. ``archive_requests`` runs it in a loop.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import blobstore
+from .models import ArchivedRequestAttachment, ArchivedServiceRequest, RequestAttachment, ServiceRequest
+
+TERMINAL_STATUSES = ('paid', 'cancelled')
+
+
+def archive_after_days():
+    return getattr(settings, 'ARCHIVE_AFTER_DAYS', 180)
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+REQUEST_COLUMNS = _columns(ServiceRequest)
+ATTACHMENT_COLUMNS = _columns(RequestAttachment)
+
+
+def archivable(cutoff):
+    return ServiceRequest.objects.filter(status__in=TERMINAL_STATUSES, updated_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=500):
+    """
+    Move up to ``batch_size`` requests closed before ``cutoff``.
+    Returns (requests selected, requests moved); a request changed after the
+    SELECT is selected but stays live.
+    """
+    with transaction.atomic():
+        candidates = archivable(cutoff).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Rows someone is updating right now are left for the next run.
+            candidates = candidates.select_for_update(skip_locked=True)
+        rows = list(candidates.values(*REQUEST_COLUMNS)[:batch_size])
+        if not rows:
+            return 0, 0
+        ids = [row['id'] for row in rows]
+        now = timezone.now()
+        ArchivedServiceRequest.objects.bulk_create(
+            [ArchivedServiceRequest(archived_at=now, **row) for row in rows]
+        )
+        attachments = ArchivedRequestAttachment.objects.bulk_create([
+            ArchivedRequestAttachment(**row)
+            for row in RequestAttachment.objects.filter(request_id__in=ids).values(*ATTACHMENT_COLUMNS)
+        ])
+        # bulk_create sends no post_save; the cascade below still counts the live rows going away.
+        blobstore.add_references(Counter(attachment.blob_id for attachment in attachments))
+        # The predicate is repeated so a request changed since the SELECT stays live
+        # (its attachments go with it through the cascade); its stale copy is dropped.
+        archivable(cutoff).filter(pk__in=ids).delete()
+        kept = list(ServiceRequest.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        if kept:
+            ArchivedServiceRequest.objects.filter(pk__in=kept).delete()
+    return len(ids), len(ids) - len(kept)
+
+
+def archive(older_than_days=None, batch_size=500, max_batches=None, on_batch=None):
+    """Archive closed requests older than ``older_than_days`` chunk by chunk."""
+    days = archive_after_days() if older_than_days is None else older_than_days
+    cutoff = timezone.now() - timedelta(days=days)
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        found, moved = archive_batch(cutoff, batch_size)
+        # A batch whose rows were all changed under it moves nothing, but later rows may still be due.
+        if not found:
+            break
+        total += moved
+        batches += 1
+        if on_batch:
+            on_batch(moved)
+    return total
@@ -0,0 +1,133 @@
+"""
+Batched reads for the mobile app's startup screens.
+
+``POST /api/batch/`` takes a list of GET sub-requests and runs each one
+in-process through the URLconf and the existing view, so routing,
+permissions and serializers are unchanged. The outer request is
+authenticated once and every sub-request reuses its user and token through
+DRF's forced authentication, which skips the JWT decode and the user SELECT.
+Sub-requests run one after another on the outer request's DB connection or,
+with ``parallel``, on a small thread pool (one connection per worker thread).
+
+Only paths routed through ``api.urls`` are accepted; the admin and the docs
+UIs are not reachable through a batch. A sub-request that raises gets a 500
+of its own instead of failing the whole batch.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.template.response import SimpleTemplateResponse
+from django.urls import Resolver404, URLResolver, get_resolver, get_urlconf
+from rest_framework.response import Response
+
+URL_NAME = 'batch'
+API_URLCONF = 'api.urls'
+FORWARDED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+
+
+def max_workers():
+    return getattr(settings, 'BATCH_MAX_WORKERS', 4)
+
+
+def _error(item, status_code, detail):
+    return {'id': item.get('id'), 'status': status_code, 'headers': {}, 'body': {'detail': detail}}
+
+
+def _sub_request(request, path, query):
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = {
+        **request.META, 'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'HTTP_ACCEPT': 'application/json',
+    }
+    sub.META.pop('CONTENT_TYPE', None)
+    sub.META.pop('CONTENT_LENGTH', None)
+    sub.GET = QueryDict(query)
+    sub.COOKIES = request.COOKIES
+    sub.user = request.user
+    # DRF uses these instead of running the authentication classes again.
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _api_resolver():
+    """The resolver of the ``include('api.urls')`` in the root URLconf."""
+    for pattern in get_resolver(get_urlconf()).url_patterns:
+        if isinstance(pattern, URLResolver) and getattr(pattern.urlconf_name, '__name__', None) == API_URLCONF:
+            return pattern
+    return None
+
+
+def _resolve(path):
+    """ResolverMatch of ``path`` within api.urls; Resolver404 if the root URLconf has no such path."""
+    resolver = _api_resolver()
+    if resolver is not None and path.startswith('/'):
+        try:
+            return resolver.resolve(path[1:])
+        except Resolver404:
+            pass
+    get_resolver(get_urlconf()).resolve(path)
+    return None
+
+
+def _body(response):
+    if isinstance(response, Response):
+        # The data goes into the combined response as is; no render and re-parse.
+        return response.data
+    if isinstance(response, SimpleTemplateResponse):
+        response.render()
+    if 'json' in response.get('Content-Type', ''):
+        return json.loads(response.content)
+    return response.content.decode(response.charset)
+
+
+def dispatch(request, item):
+    """Run one sub-request ``item`` ({'id', 'path'}) and return its result dict."""
+    parts = urlsplit(item['path'])
+    try:
+        match = _resolve(parts.path)
+    except Resolver404:
+        return _error(item, 404, "آدرس پیدا نشد.")
+    if match is None:
+        return _error(item, 400, "فقط آدرس‌های API در درخواست دسته‌ای مجاز هستند.")
+    if match.url_name == URL_NAME:
+        return _error(item, 400, "درخواست دسته‌ای تو در تو مجاز نیست.")
+
+    sub = _sub_request(request, parts.path, parts.query)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if getattr(response, 'streaming', False):
+            return _error(item, 400, "پاسخ‌های جریانی در درخواست دسته‌ای پشتیبانی نمی‌شوند.")
+        body = _body(response)
+    except Http404:
+        return _error(item, 404, "پیدا نشد.")
+    except Exception:
+        return _error(item, 500, "خطای داخلی سرور.")
+    headers = {name: response[name] for name in FORWARDED_HEADERS if response.has_header(name)}
+    return {'id': item.get('id'), 'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def run(request, items, parallel=False):
+    """Dispatch ``items`` and return their results in order."""
+    if not parallel or len(items) < 2:
+        return [dispatch(request, item) for item in items]
+
+    def task(item):
+        try:
+            return dispatch(request, item)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=min(len(items), max_workers())) as executor:
+        return list(executor.map(task, items))
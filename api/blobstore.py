@@ -0,0 +1,176 @@
+"""
+Reference counting, garbage collection and migration of attachment blobs.
+
+``AttachmentBlob.ref_count`` follows the attachment rows (live and archived)
+that use a blob: the receivers below count single saves and deletes
+(cascades from deleted or archived requests included) and ``archive_batch``
+adds the rows it copies with ``bulk_create``. The count only picks
+candidates; ``collect_garbage`` checks both attachment tables again before
+it deletes a blob, batch by batch, and leaves alone blobs an upload used
+within ``ATTACHMENT_BLOB_GC_GRACE`` seconds.
+
+``dedupe`` moves attachments stored before content addressing onto blobs:
+files are hashed on a thread pool (hashlib and file reads release the GIL),
+the first copy of each content is hard-linked (or copied) to its blob name,
+the rows are repointed and the old files deleted once nothing refers to them.
+"""
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import storage
+from .models import ArchivedRequestAttachment, AttachmentBlob, RequestAttachment
+
+ATTACHMENT_MODELS = (RequestAttachment, ArchivedRequestAttachment)
+
+DedupeResult = namedtuple('DedupeResult', 'files attachments blobs_created missing bytes_reclaimed')
+
+
+def gc_grace():
+    return timedelta(seconds=getattr(settings, 'ATTACHMENT_BLOB_GC_GRACE', 3600))
+
+
+def add_references(counts):
+    """Apply ``{blob_id: delta}`` to the reference counts, one UPDATE per distinct delta."""
+    by_delta = {}
+    for blob_id, delta in counts.items():
+        if blob_id is not None and delta:
+            by_delta.setdefault(delta, []).append(blob_id)
+    for delta, blob_ids in by_delta.items():
+        AttachmentBlob.objects.filter(pk__in=blob_ids).update(ref_count=F('ref_count') + delta)
+
+
+@receiver(post_save, sender=RequestAttachment, dispatch_uid='blobstore_attachment_saved')
+@receiver(post_save, sender=ArchivedRequestAttachment, dispatch_uid='blobstore_archived_attachment_saved')
+def on_attachment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.blob_id:
+        add_references({instance.blob_id: 1})
+
+
+@receiver(post_delete, sender=RequestAttachment, dispatch_uid='blobstore_attachment_deleted')
+@receiver(post_delete, sender=ArchivedRequestAttachment, dispatch_uid='blobstore_archived_attachment_deleted')
+def on_attachment_deleted(sender, instance, **kwargs):
+    if instance.blob_id:
+        add_references({instance.blob_id: -1})
+
+
+def _unreferenced(queryset):
+    for model in ATTACHMENT_MODELS:
+        queryset = queryset.filter(~Exists(model.objects.filter(blob=OuterRef('pk'))))
+    return queryset
+
+
+def _delete_file(name, cutoff):
+    path = storage.attachment_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    if stat.st_mtime >= cutoff.timestamp():
+        return 0  # written again by an upload racing the collector
+    storage.attachment_storage.delete(name)
+    return stat.st_size
+
+
+def collect_garbage(batch_size=500, max_batches=None, on_batch=None):
+    """Delete blobs no attachment uses; return (blobs deleted, bytes freed)."""
+    cutoff = timezone.now() - gc_grace()
+    deleted = freed = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            candidates = _unreferenced(AttachmentBlob.objects.filter(ref_count__lte=0, touched_at__lt=cutoff))
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            rows = dict(candidates.order_by('pk').values_list('pk', 'name')[:batch_size])
+            if not rows:
+                break
+            # The predicate is repeated so a blob picked up by an upload since the SELECT survives.
+            _unreferenced(AttachmentBlob.objects.filter(pk__in=rows, ref_count__lte=0,
+                                                        touched_at__lt=cutoff)).delete()
+            survivors = set(AttachmentBlob.objects.filter(pk__in=rows).values_list('pk', flat=True))
+        gone = [name for pk, name in rows.items() if pk not in survivors]
+        if not gone:
+            break
+        freed += sum(_delete_file(name, cutoff) for name in gone)
+        deleted += len(gone)
+        batches += 1
+        if on_batch:
+            on_batch(len(gone))
+    return deleted, freed
+
+
+def _hash(name):
+    try:
+        return storage.hash_file(storage.attachment_storage.path(name))
+    except FileNotFoundError:
+        return None
+
+
+def _dedupe_batch(model, rows, executor, result):
+    names = sorted({name for _, name in rows if name})
+    hashes = dict(zip(names, executor.map(_hash, names)))
+    blobs = {}
+    created_bytes = 0
+    for name, hashed in hashes.items():
+        if hashed is None:
+            continue
+        sha256, size = hashed
+        target = storage.blob_name(sha256, name)
+        if target not in blobs:
+            if not storage.attachment_storage.exists(target):
+                storage.attachment_storage.adopt(name, target)
+                created_bytes += size
+                result['blobs_created'] += 1
+            blobs[target] = AttachmentBlob.for_file(target, size)
+        blobs[name] = blobs[target]
+
+    updated = []
+    for pk, name in rows:
+        blob = blobs.get(name)
+        if blob is None:
+            result['missing'] += 1
+            continue
+        updated.append(model(pk=pk, file=blob.name, blob=blob))
+    with transaction.atomic():
+        model.objects.bulk_update(updated, ['file', 'blob'])
+        add_references(Counter(row.blob_id for row in updated))
+
+    # Old files go once no attachment, live or archived, still names them.
+    old = [name for name in hashes if name in blobs and blobs[name].name != name]
+    still_used = set()
+    for attachment_model in ATTACHMENT_MODELS:
+        still_used.update(attachment_model.objects.filter(file__in=old).values_list('file', flat=True))
+    freed = 0
+    for name in old:
+        if name not in still_used:
+            freed += storage.attachment_storage.size(name)
+            storage.attachment_storage.delete(name)
+    result['files'] += len(names)
+    result['attachments'] += len(updated)
+    result['bytes_reclaimed'] += freed - created_bytes
+
+
+def dedupe(batch_size=500, workers=4, on_batch=None):
+    """Move every attachment without a blob onto one; return a ``DedupeResult``."""
+    result = Counter(files=0, attachments=0, blobs_created=0, missing=0, bytes_reclaimed=0)
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        for model in ATTACHMENT_MODELS:
+            last_pk = 0
+            while True:
+                rows = list(model.objects.filter(blob__isnull=True, pk__gt=last_pk)
+                            .order_by('pk').values_list('pk', 'file')[:batch_size])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                _dedupe_batch(model, rows, executor, result)
+                if on_batch:
+                    on_batch(len(rows))
+    return DedupeResult(**result)
@@ -0,0 +1,37 @@
+from django.core.checks import Tags, Warning, register
+
+from . import schema
+
+
+def check_schema_built(app_configs, **kwargs):
+    """Whether the artifact exists; reads one small file."""
+    if schema.built_fingerprint() is None:
+        return [Warning(
+            'The OpenAPI schema artifact has not been built; /api/schema/ will return 503.',
+            hint='Run "python manage.py build_schema" as part of the build.',
+            id='api.W001',
+        )]
+    return []
+
+
+def check_schema_current(app_configs, **kwargs):
+    """Whether the artifact matches the code; fingerprinting reads every view module."""
+    built = schema.built_fingerprint()
+    # Lean workers (no drf_spectacular) serve an artifact built with the full settings.
+    if built is not None and schema.docs_enabled() and built != schema.fingerprint():
+        return [Warning(
+            'The OpenAPI schema artifact was built from different URLs/serializers.',
+            hint='Re-run "python manage.py build_schema".',
+            id='api.W002',
+        )]
+    return []
+
+
+def check_schema_artifact(app_configs, **kwargs):
+    return check_schema_built(app_configs) or check_schema_current(app_configs)
+
+
+# The fingerprint is only compared by "check --deploy" (build and release steps), not on
+# every command or test run; the cheap existence check runs everywhere docs are served.
+register(check_schema_current, Tags.urls, deploy=True)
+register(check_schema_built, Tags.urls, deploy=not schema.docs_enabled())
@@ -0,0 +1,47 @@
+"""
+Optimistic concurrency for service requests.
+
+Every response carrying a request sets ``ETag`` to its ``version``. A write
+may send that value back in ``If-Match``; a request that has moved on since
+gets 412 before anything is changed. The write itself is a compare-and-set
+on the version the row was read at (``ServiceRequest.save_versioned``), so
+two writers that read the same version cannot both succeed, whether or not
+they sent ``If-Match``.
+"""
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "این درخواست در این فاصله تغییر کرده است؛ آن را دوباره دریافت کنید و مجدداً تلاش کنید."
+    default_code = 'precondition_failed'
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def _if_match_versions(header):
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        versions.add(tag.strip('"'))
+    return versions
+
+
+def check_if_match(request, instance):
+    """Raise 412 if ``If-Match`` was sent and does not name the current version."""
+    header = request.META.get('HTTP_IF_MATCH')
+    if header is None or header.strip() == '*':
+        return
+    if str(instance.version) not in _if_match_versions(header):
+        raise PreconditionFailed()
+
+
+def save(instance, update_fields):
+    """Version-checked write of ``update_fields``; 412 if the row moved on."""
+    if not instance.save_versioned(update_fields):
+        raise PreconditionFailed()
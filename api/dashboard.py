@@ -0,0 +1,148 @@
+"""
+Per-user home-screen counters (``UserDashboard``).
+
+Request counters are adjusted with F() deltas from ``request_status_changed``
+inside the writing transaction. Contract counters are cheap to recount, so any
+contract write recounts them for its owner. ``refresh_users`` recomputes
+everything from the source tables and is what the rebuild command and the
+contract sweeper use.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import InsuranceContract, MaintenanceContract, ServiceRequest, User, UserDashboard
+from .signals import RequestStatusChange, request_status_changed
+
+OPEN_STATUSES = ('submitted', 'assigned', 'in_progress')
+AWAITING_PAYMENT_STATUSES = ('completed',)
+COUNTER_FIELDS = ('open_requests', 'awaiting_payment', 'active_contracts', 'insurance_expiring_soon')
+
+
+def expiring_soon_days():
+    return getattr(settings, 'DASHBOARD_EXPIRING_SOON_DAYS', 30)
+
+
+def _request_counters(request_status):
+    counters = Counter()
+    if request_status in OPEN_STATUSES:
+        counters['open_requests'] += 1
+    if request_status in AWAITING_PAYMENT_STATUSES:
+        counters['awaiting_payment'] += 1
+    return counters
+
+
+def request_deltas(changes):
+    """Fold a list of RequestStatusChange into {user_id: Counter(field=delta)}."""
+    deltas = defaultdict(Counter)
+    for change in changes:
+        before = _request_counters(change.from_status)
+        after = _request_counters(change.to_status)
+        deltas[change.customer_id].update(after)
+        deltas[change.customer_id].subtract(before)
+        if change.previous_technician_id:
+            deltas[change.previous_technician_id].subtract(before)
+        if change.technician_id:
+            deltas[change.technician_id].update(after)
+    return {
+        user_id: Counter({field: delta for field, delta in counter.items() if delta})
+        for user_id, counter in deltas.items() if user_id and any(counter.values())
+    }
+
+
+def apply_deltas(deltas):
+    if not deltas:
+        return
+    existing = set(
+        UserDashboard.objects.filter(user_id__in=list(deltas)).values_list('user_id', flat=True)
+    )
+    # A user without a row yet gets a full recount, which already includes this change.
+    missing = [user_id for user_id in deltas if user_id not in existing]
+    if missing:
+        refresh_users(missing)
+
+    # Users sharing the same delta are updated together with one UPDATE.
+    groups = defaultdict(list)
+    for user_id, counter in deltas.items():
+        if user_id in existing:
+            groups[tuple(sorted(counter.items()))].append(user_id)
+    now = timezone.now()
+    for delta, user_ids in groups.items():
+        UserDashboard.objects.filter(user_id__in=user_ids).update(
+            updated_at=now, **{field: F(field) + value for field, value in delta}
+        )
+
+
+def refresh_users(user_ids, today=None):
+    """Recompute every counter for ``user_ids`` from the source tables."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    today = today or date.today()
+    soon = today + timedelta(days=expiring_soon_days())
+    counts = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+
+    request_aggregates = {
+        'open': Count('pk', filter=Q(status__in=OPEN_STATUSES)),
+        'awaiting': Count('pk', filter=Q(status__in=AWAITING_PAYMENT_STATUSES)),
+    }
+    for role_field in ('customer_id', 'technician_id'):
+        rows = (ServiceRequest.objects.filter(**{f'{role_field}__in': user_ids})
+                .values(role_field).annotate(**request_aggregates).order_by())
+        for row in rows:
+            counts[row[role_field]]['open_requests'] += row['open']
+            counts[row[role_field]]['awaiting_payment'] += row['awaiting']
+
+    rows = (MaintenanceContract.objects.filter(user_id__in=user_ids, is_active=True, end_date__gte=today)
+            .values('user_id').annotate(n=Count('pk')).order_by())
+    for row in rows:
+        counts[row['user_id']]['active_contracts'] = row['n']
+
+    rows = (InsuranceContract.objects.filter(user_id__in=user_ids, is_active=True,
+                                             end_date__gte=today, end_date__lte=soon)
+            .values('user_id').annotate(n=Count('pk')).order_by())
+    for row in rows:
+        counts[row['user_id']]['insurance_expiring_soon'] = row['n']
+
+    now = timezone.now()
+    UserDashboard.objects.bulk_create(
+        [UserDashboard(user_id=user_id, updated_at=now, **values) for user_id, values in counts.items()],
+        update_conflicts=True, unique_fields=['user'], update_fields=[*COUNTER_FIELDS, 'updated_at'],
+    )
+
+
+def _deleting_user(origin):
+    # When a user is deleted their dashboard row goes too; recreating it would break the FK.
+    return isinstance(origin, User) or getattr(origin, 'model', None) is User
+
+
+@receiver(request_status_changed, dispatch_uid='dashboard_request_status_changed')
+def on_request_status_changed(sender, changes, **kwargs):
+    apply_deltas(request_deltas(changes))
+
+
+@receiver(post_delete, sender=ServiceRequest, dispatch_uid='dashboard_request_deleted')
+def on_request_deleted(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    if instance.status in OPEN_STATUSES or instance.status in AWAITING_PAYMENT_STATUSES:
+        apply_deltas(request_deltas([
+            RequestStatusChange(instance.pk, instance.customer_id, None, instance.technician_id,
+                                instance.status, None)
+        ]))
+
+
+@receiver(post_save, sender=MaintenanceContract, dispatch_uid='dashboard_maintenance_saved')
+@receiver(post_delete, sender=MaintenanceContract, dispatch_uid='dashboard_maintenance_deleted')
+@receiver(post_save, sender=InsuranceContract, dispatch_uid='dashboard_insurance_saved')
+@receiver(post_delete, sender=InsuranceContract, dispatch_uid='dashboard_insurance_deleted')
+def on_contract_changed(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    # Contract writes are rare; recounting is a handful of indexed COUNTs.
+    refresh_users([instance.user_id])
@@ -0,0 +1,124 @@
+"""
+Discount code lookup and redemption.
+
+Code rules are read through an in-process LRU keyed by the normalized code
+(unknown codes are cached too, so a flood of typos stays off the database).
+Usage limits are never taken from the cache: redemption bumps ``used_count``
+with a conditional UPDATE, so concurrent redemptions cannot go over
+``max_uses``, and the remaining checks run after that UPDATE while its row
+lock is held.
+"""
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import concurrency
+from .lru import LRUCache
+from .models import DiscountCode, DiscountRedemption, normalize_discount_code
+
+DiscountRule = namedtuple('DiscountRule', (
+    'pk', 'code', 'kind', 'value', 'max_discount', 'min_price', 'valid_from', 'valid_until',
+    'max_uses_per_user', 'is_active',
+))
+
+_cache = None
+
+
+def rule_cache():
+    """The LRU of code rules, built on first use so that DISCOUNT_CACHE_* settings apply."""
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(maxsize=getattr(settings, 'DISCOUNT_CACHE_SIZE', 4096),
+                          ttl=getattr(settings, 'DISCOUNT_CACHE_TTL', 60))
+    return _cache
+
+
+@receiver(setting_changed, dispatch_uid='discount_cache_settings_changed')
+def reset_rule_cache(setting, **kwargs):
+    global _cache
+    if setting in ('DISCOUNT_CACHE_SIZE', 'DISCOUNT_CACHE_TTL'):
+        _cache = None
+
+
+def get_rule(code):
+    """Return the ``DiscountRule`` for ``code`` or None if there is no such code."""
+    code = normalize_discount_code(code)
+    if not code:
+        return None
+
+    def load():
+        row = DiscountCode.objects.filter(code=code).values_list(*DiscountRule._fields).first()
+        return DiscountRule(*row) if row else None
+
+    return rule_cache().get_or_set(code, load)
+
+
+def compute_amount(rule, price):
+    if rule.kind == 'percent':
+        amount = (price * rule.value / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    else:
+        amount = rule.value
+    if rule.max_discount is not None:
+        amount = min(amount, rule.max_discount)
+    return min(amount, price)
+
+
+def check(rule, price, now=None):
+    """Validate ``rule`` for a request of ``price`` and return the discount amount."""
+    now = now or timezone.now()
+    if rule is None or not rule.is_active:
+        raise ValidationError("کد تخفیف نامعتبر است.")
+    if (rule.valid_from and now < rule.valid_from) or (rule.valid_until and now > rule.valid_until):
+        raise ValidationError("کد تخفیف در این بازه زمانی معتبر نیست.")
+    if price < rule.min_price:
+        raise ValidationError(f"حداقل مبلغ برای استفاده از این کد {rule.min_price} است.")
+    return compute_amount(rule, price)
+
+
+def redeem(service_request, code, user):
+    """Apply ``code`` to ``service_request`` for ``user`` and count the use."""
+    rule = get_rule(code)
+    now = timezone.now()
+    amount = check(rule, service_request.final_price, now)
+
+    with transaction.atomic():
+        # The claim comes first so every check below runs under the code's row lock.
+        claimed = (DiscountCode.objects
+                   .filter(pk=rule.pk, is_active=True)
+                   .filter(Q(max_uses__isnull=True) | Q(used_count__lt=F('max_uses')))
+                   .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now))
+                   .update(used_count=F('used_count') + 1))
+        if not claimed:
+            # ممکن است کد در این فاصله غیرفعال شده باشد؛ نسخه کش‌شده دیگر معتبر نیست
+            rule_cache().pop(rule.code)
+            raise ValidationError("ظرفیت استفاده از این کد تخفیف تکمیل شده است.")
+
+        if DiscountRedemption.objects.filter(request=service_request).exists():
+            raise ValidationError("برای این درخواست قبلاً کد تخفیف ثبت شده است.")
+        used_by_user = DiscountRedemption.objects.filter(discount_code_id=rule.pk, user=user).count()
+        if used_by_user >= rule.max_uses_per_user:
+            raise ValidationError("شما قبلاً از این کد تخفیف استفاده کرده‌اید.")
+
+        DiscountRedemption.objects.create(discount_code_id=rule.pk, user=user,
+                                          request=service_request, amount=amount)
+        service_request.discount_code = rule.code
+        service_request.discount_amount = amount
+        # اگر درخواست در این فاصله تغییر کرده باشد، مصرف کد هم برگردانده می‌شود
+        concurrency.save(service_request, ['discount_code', 'discount_amount'])
+    return amount
+
+
+@receiver(post_save, sender=DiscountCode, dispatch_uid='discount_code_saved')
+@receiver(post_delete, sender=DiscountCode, dispatch_uid='discount_code_deleted')
+def invalidate_discount_code(sender, instance, **kwargs):
+    # A rename leaves the old code cached under its previous key, and edits are
+    # rare next to lookups, so drop everything rather than track old codes.
+    rule_cache().clear()
@@ -0,0 +1,188 @@
+"""
+Batch dispatcher that assigns unassigned submitted requests to technicians.
+
+Each round loads the oldest waiting requests and the active technicians,
+solves a greedy assignment (oldest request first, cheapest technician with
+free capacity) and applies it with a conditional CASE UPDATE per chunk of
+requests, so a request a technician accepted by hand in the meantime is
+simply skipped.
+
+The cost of giving a request to a technician is::
+
+    workload * open_jobs + rating * (5 - rating) + distance * km
+
+with the weights taken from ``DISPATCH_WEIGHTS``.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.utils import timezone
+
+from . import geo
+from .models import ServiceRequest, TechnicianProfile
+from .signals import RequestStatusChange, request_status_changed
+
+DEFAULT_WEIGHTS = {'workload': 1.0, 'rating': 0.5, 'distance': 0.2}
+# Technicians are bucketed on coarse cells (about 39km x 20km) to find candidates quickly.
+BUCKET_PRECISION = 4
+KM_PER_DEGREE = 111.2
+
+
+def get_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'DISPATCH_WEIGHTS', {})}
+
+
+def max_open_jobs():
+    return getattr(settings, 'DISPATCH_MAX_OPEN_JOBS', 3)
+
+
+def max_distance_km():
+    return getattr(settings, 'DISPATCH_MAX_DISTANCE_KM', 30.0)
+
+
+@dataclass
+class Technician:
+    user_id: int
+    rating: float
+    latitude: float = None
+    longitude: float = None
+    radius_km: float = None
+    load: int = 0
+    assigned: list = field(default_factory=list)
+
+    @property
+    def located(self):
+        return self.latitude is not None and self.longitude is not None
+
+
+def load_requests(batch_size):
+    return list(
+        ServiceRequest.objects.filter(technician__isnull=True, status='submitted')
+        .order_by('created_at', 'pk')
+        .values('pk', 'latitude', 'longitude')[:batch_size]
+    )
+
+
+def load_technicians():
+    technicians = {
+        row['user_id']: Technician(row['user_id'], row['rating'], row['base_latitude'],
+                                   row['base_longitude'], row['service_radius_km'])
+        for row in TechnicianProfile.objects.filter(status='active', user__is_active=True).values(
+            'user_id', 'rating', 'base_latitude', 'base_longitude', 'service_radius_km')
+    }
+    if technicians:
+        loads = (ServiceRequest.objects
+                 .filter(technician_id__in=list(technicians), status__in=('assigned', 'in_progress'))
+                 .values('technician_id').annotate(n=Count('pk')).order_by())
+        for row in loads:
+            technicians[row['technician_id']].load = row['n']
+    return list(technicians.values())
+
+
+def plan(requests, technicians, weights=None, capacity=None, max_distance=None):
+    """
+    Greedy assignment: walk requests oldest first and give each one to the
+    cheapest technician that still has capacity and covers its location.
+    Returns {technician_id: [request_id, ...]}.
+    """
+    weights = weights or get_weights()
+    capacity = capacity if capacity is not None else max_open_jobs()
+    max_distance = max_distance if max_distance is not None else max_distance_km()
+
+    buckets = defaultdict(list)
+    unlocated = []
+    for technician in technicians:
+        if technician.located:
+            buckets[geo.encode(technician.latitude, technician.longitude, BUCKET_PRECISION)].append(technician)
+        else:
+            unlocated.append(technician)
+
+    for request in requests:
+        latitude, longitude = request['latitude'], request['longitude']
+        if latitude is None or longitude is None:
+            # Without a location only workload and rating count.
+            candidates = ((technician, 0.0) for technician in technicians if technician.load < capacity)
+        else:
+            candidates = _nearby_candidates(buckets, unlocated, latitude, longitude, max_distance, capacity)
+
+        best = best_cost = None
+        for technician, distance in candidates:
+            cost = (weights['workload'] * technician.load
+                    + weights['rating'] * (5 - technician.rating)
+                    + weights['distance'] * distance)
+            if best is None or cost < best_cost:
+                best, best_cost = technician, cost
+        if best is not None:
+            best.load += 1
+            best.assigned.append(request['pk'])
+
+    return {technician.user_id: technician.assigned for technician in technicians if technician.assigned}
+
+
+def _nearby_candidates(buckets, unlocated, latitude, longitude, max_distance, capacity):
+    # An equirectangular distance is well within a percent of haversine at city scale.
+    km_per_lng = KM_PER_DEGREE * math.cos(math.radians(latitude))
+    for ring in geo.cell_rings(latitude, longitude, max_distance, BUCKET_PRECISION):
+        for _, cell in ring:
+            for technician in buckets.get(cell, ()):
+                if technician.load >= capacity:
+                    continue
+                distance = math.hypot((technician.latitude - latitude) * KM_PER_DEGREE,
+                                      (technician.longitude - longitude) * km_per_lng)
+                if distance <= min(max_distance, technician.radius_km or max_distance):
+                    yield technician, distance
+    for technician in unlocated:
+        if technician.load < capacity:
+            yield technician, max_distance
+
+
+def apply(assignments, chunk_size=1000):
+    """
+    Apply a plan with set-based guarded UPDATEs (one per chunk of requests).
+    Returns the list of (request_id, technician_id) pairs actually assigned.
+    """
+    technician_of = {
+        request_id: technician_id
+        for technician_id, request_ids in assignments.items() for request_id in request_ids
+    }
+    request_ids = list(technician_of)
+    applied = []
+    with transaction.atomic():
+        now = timezone.now()
+        changes = []
+        for start in range(0, len(request_ids), chunk_size):
+            chunk = request_ids[start:start + chunk_size]
+            ServiceRequest.objects.filter(
+                pk__in=chunk, status='submitted', technician__isnull=True
+            ).update(
+                technician_id=Case(*[When(pk=request_id, then=Value(technician_of[request_id]))
+                                     for request_id in chunk]),
+                status='assigned',
+                updated_at=now,
+                version=F('version') + 1,
+            )
+            # Rows stamped with this exact updated_at are the ones this UPDATE won;
+            # anything accepted by hand in the meantime kept its own technician.
+            won = ServiceRequest.objects.filter(
+                pk__in=chunk, status='assigned', updated_at=now
+            ).values_list('pk', 'customer_id', 'technician_id')
+            for request_id, customer_id, technician_id in won:
+                if technician_id != technician_of[request_id]:
+                    continue
+                applied.append((request_id, technician_id))
+                changes.append(RequestStatusChange(request_id, customer_id, technician_id, None,
+                                                   'submitted', 'assigned'))
+        if changes:
+            request_status_changed.send(sender=ServiceRequest, changes=changes)
+    return applied
+
+
+def dispatch_once(batch_size=500):
+    requests = load_requests(batch_size)
+    if not requests:
+        return []
+    return apply(plan(requests, load_technicians()))
@@ -0,0 +1,145 @@
+"""
+Streaming CSV / JSONL exports for finance.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (no model
+instances, server-side cursors where the backend has them), encoded a chunk
+at a time and optionally gzip-compressed on the fly, so memory stays flat no
+matter how many rows a table has. The request export also covers the
+archive tables. The same generators back the staff export endpoint and the
+``export_data`` command.
+"""
+import csv
+import zlib
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DateTimeField, Value
+
+from .models import ArchivedServiceRequest, InsuranceContract, MaintenanceContract, ServiceRequest
+
+CHUNK_SIZE = 2000
+# Encoded output is handed on in pieces of about this size.
+BUFFER_BYTES = 64 * 1024
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+EXPORTS = {
+    'requests': (ServiceRequest, (
+        'id', 'customer_id', 'technician_id', 'title', 'status', 'created_at', 'updated_at',
+        'final_price', 'discount_code', 'discount_amount', 'payment_status', 'rating',
+    )),
+    'maintenance-contracts': (MaintenanceContract, (
+        'id', 'user_id', 'package_id', 'package__package_type', 'start_date', 'end_date', 'price',
+        'renewal_price', 'is_active', 'building_floors', 'building_type', 'elevator_age', 'elevator_count',
+        'created_at', 'renewal_of_id',
+    )),
+    'insurance-contracts': (InsuranceContract, (
+        'id', 'user_id', 'insurance_type_id', 'insurance_type__name', 'start_date', 'end_date',
+        'price', 'renewal_price', 'is_active', 'building_floors', 'building_type', 'elevator_age', 'elevator_count',
+        'coverage_level', 'created_at', 'renewal_of_id',
+    )),
+}
+
+
+# Archived rows follow the live ones, with their ``archived_at`` filled in.
+ARCHIVES = {'requests': ArchivedServiceRequest}
+
+
+def export_columns(name):
+    columns = EXPORTS[name][1]
+    return columns + ('archived_at',) if name in ARCHIVES else columns
+
+
+def export_rows(name, chunk_size=CHUNK_SIZE):
+    """Return (columns, row iterator) for the export ``name``."""
+    model, columns = EXPORTS[name]
+    if name not in ARCHIVES:
+        return columns, model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    columns = export_columns(name)
+    live = (model.objects.annotate(archived_at=Value(None, output_field=DateTimeField()))
+            .order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size))
+    archived = ARCHIVES[name].objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    return columns, chain(live, archived)
+
+
+class _Buffer:
+    """Write target for csv.writer that just collects the written text."""
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def drain(self):
+        text = ''.join(self.parts)
+        self.parts.clear()
+        return text
+
+
+def _csv_chunks(columns, rows):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    # BOM تا اکسل متن فارسی را درست باز کند
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    size = 0
+    for row in rows:
+        writer.writerow(row)
+        size += 1
+        if size >= 500:
+            yield buffer.drain()
+            size = 0
+    yield buffer.drain()
+
+
+def _jsonl_chunks(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(columns, row))))
+        if len(lines) >= 500:
+            lines.append('')
+            yield '\n'.join(lines)
+            lines = []
+    if lines:
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+def _batched(chunks):
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_BYTES:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(name, output='csv', gzip=False, chunk_size=CHUNK_SIZE):
+    """Yield the encoded (and optionally gzipped) bytes of the export ``name``."""
+    return stream_rows(*export_rows(name, chunk_size), output=output, gzip=gzip)
+
+
+def stream_rows(columns, rows, output='csv', gzip=False):
+    """Yield ``rows`` encoded like an export; for reports that are not a table dump."""
+    encode = _csv_chunks if output == 'csv' else _jsonl_chunks
+    chunks = _batched(text.encode('utf-8') for text in encode(columns, rows))
+    return _gzipped(chunks) if gzip else chunks
+
+
+def filename(name, output='csv', gzip=False):
+    return f"{name}.{output}{'.gz' if gzip else ''}"
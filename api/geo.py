@@ -0,0 +1,191 @@
+"""
+Geohash helpers and the pluggable address geocoder.
+
+Requests store the geohash of their coordinates at ``GEO_CELL_PRECISION``
+(about 1.2km x 0.6km) in ``ServiceRequest.geo_cell``; the nearby-jobs feed
+walks the cells around the technician outward and only queries those.
+"""
+import math
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+GEO_CELL_PRECISION = 6
+EARTH_RADIUS_KM = 6371.0
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+
+# _SPREAD[b] has the bits of byte b moved to the even positions (0b1011 -> 0b1000101).
+_SPREAD = [sum(((value >> bit) & 1) << (2 * bit) for bit in range(8)) for value in range(256)]
+
+
+def _bit_split(precision):
+    total_bits = precision * 5
+    return (total_bits + 1) // 2, total_bits // 2  # (lng_bits, lat_bits)
+
+
+def _interleave(value):
+    result = shift = 0
+    while value:
+        result |= _SPREAD[value & 0xff] << shift
+        value >>= 8
+        shift += 16
+    return result
+
+
+def encode_indices(lat_index, lng_index, precision=GEO_CELL_PRECISION):
+    """Geohash of the cell at integer grid position (lat_index, lng_index)."""
+    lng_bits, lat_bits = _bit_split(precision)
+    # Geohash interleaves bits starting with longitude; when longitude has one
+    # extra bit, pad latitude with a zero low bit and drop it afterwards.
+    code = _interleave(lng_index) << 1 | _interleave(lat_index << (lng_bits - lat_bits))
+    code >>= lng_bits - lat_bits
+    return ''.join(_BASE32[(code >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+
+def grid_indices(latitude, longitude, precision=GEO_CELL_PRECISION):
+    lng_bits, lat_bits = _bit_split(precision)
+    lat_cells, lng_cells = 1 << lat_bits, 1 << lng_bits
+    lat_index = min(lat_cells - 1, max(0, int((latitude + 90.0) / 180.0 * lat_cells)))
+    lng_index = min(lng_cells - 1, max(0, int((longitude + 180.0) / 360.0 * lng_cells)))
+    return lat_index, lng_index
+
+
+def encode(latitude, longitude, precision=GEO_CELL_PRECISION):
+    return encode_indices(*grid_indices(latitude, longitude, precision), precision)
+
+
+def bounds(cell):
+    """Return (min_lat, min_lng, max_lat, max_lng) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def cell_size(precision=GEO_CELL_PRECISION):
+    """Return the (lat, lng) size in degrees of cells at ``precision``."""
+    lng_bits, lat_bits = _bit_split(precision)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _ring_offsets(ring):
+    if ring == 0:
+        yield 0, 0
+        return
+    for j in range(-ring, ring + 1):
+        yield -ring, j
+        yield ring, j
+    for i in range(-ring + 1, ring):
+        yield i, -ring
+        yield i, ring
+
+
+def cell_rings(latitude, longitude, radius_km, precision=GEO_CELL_PRECISION):
+    """
+    Yield the cells overlapping the circle ring by ring around the cell that
+    contains the point, each ring as ``[(min_distance_km, cell), ...]``.
+
+    Rings are generated lazily so callers that already have enough nearby
+    results can stop without computing the outer cells at all.
+    """
+    lat_step, lng_step = cell_size(precision)
+    lng_bits, lat_bits = _bit_split(precision)
+    lat_cells, lng_cells = 1 << lat_bits, 1 << lng_bits
+    center_lat, center_lng = grid_indices(latitude, longitude, precision)
+    ring = 0
+    while True:
+        cells = []
+        ring_min = None
+        for i, j in _ring_offsets(ring):
+            lat_index = center_lat + i
+            if not 0 <= lat_index < lat_cells:
+                continue
+            lng_index = (center_lng + j) % lng_cells
+            cell_min_lat = lat_index * lat_step - 90.0
+            cell_min_lng = (center_lng + j) * lng_step - 180.0
+            # Distance to the nearest point of the cell (0 when the point is inside it).
+            distance = haversine_km(
+                latitude, longitude,
+                min(max(latitude, cell_min_lat), cell_min_lat + lat_step),
+                min(max(longitude, cell_min_lng), cell_min_lng + lng_step),
+            )
+            ring_min = distance if ring_min is None else min(ring_min, distance)
+            if distance <= radius_km:
+                cells.append((distance, encode_indices(lat_index, lng_index, precision)))
+        if ring_min is None or ring_min > radius_km:
+            return
+        cells.sort()
+        yield cells
+        ring += 1
+
+
+class OfflineGeocoder:
+    """
+    Local stand-in for a real geocoding service.
+
+    Matches well-known place names inside the free-text address against a
+    small built-in gazetteer (extendable via ``GEOCODER_GAZETTEER``) and
+    returns None when nothing matches. It never makes network calls.
+    """
+    GAZETTEER = {
+        'تهران': (35.6892, 51.3890),
+        'تجریش': (35.8044, 51.4337),
+        'ونک': (35.7575, 51.4100),
+        'سعادت آباد': (35.7796, 51.3730),
+        'پونک': (35.7620, 51.3330),
+        'نارمک': (35.7437, 51.4990),
+        'تهرانپارس': (35.7466, 51.5432),
+        'شهرری': (35.5940, 51.4350),
+        'کرج': (35.8400, 50.9391),
+        'مهرشهر': (35.8188, 50.9110),
+        'گوهردشت': (35.8247, 50.9590),
+        'اصفهان': (32.6546, 51.6680),
+        'شیراز': (29.5918, 52.5837),
+        'مشهد': (36.2605, 59.6168),
+        'تبریز': (38.0962, 46.2738),
+    }
+
+    def __init__(self):
+        self.places = dict(self.GAZETTEER)
+        self.places.update(getattr(settings, 'GEOCODER_GAZETTEER', {}))
+
+    def geocode(self, address):
+        if not address:
+            return None
+        # Addresses run from city to street, so the match that starts last is the
+        # most specific one; on a tie the longer name wins ('تهرانپارس' over 'تهران').
+        best = max(
+            ((address.rfind(name), len(name), name) for name in self.places if name in address),
+            default=None,
+        )
+        return self.places[best[2]] if best else None
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = import_string(getattr(settings, 'GEOCODER', 'api.geo.OfflineGeocoder'))()
+    return _geocoder
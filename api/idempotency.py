@@ -0,0 +1,153 @@
+"""
+Idempotency-Key support for POST endpoints that mobile clients retry.
+
+The first request carrying a key claims a row in ``IdempotencyKey`` and runs
+the view; its response is stored and replayed verbatim for every retry with
+the same key and body until the row expires (another body gets 422).
+Concurrent duplicates inside one worker wait on the in-flight request
+(single-flight) instead of racing it, while a duplicate that lands on
+another worker sees the claimed row and gets 409.
+"""
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def request_fingerprint(request):
+    """Hash of the method, path and parsed body, so a key reused with another payload is caught."""
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict (form or multipart): keep repeated keys, order-free
+        data = dict(data.lists())
+    # Uploaded files are represented by their names (str()).
+    body = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    raw = f"{request.method}:{request.path}:{body}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _replay(record):
+    response = Response(json.loads(record.response_body) if record.response_body else None,
+                        status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _lookup(user, key, fingerprint):
+    """Return a response for an existing record, or None if the key is free."""
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        return None
+    if record.expires_at <= timezone.now():
+        record.delete()
+        return None
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": "این کلید قبلاً برای درخواست دیگری استفاده شده است."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if not record.is_completed:
+        return Response(
+            {"detail": "درخواستی با همین کلید در حال پردازش است."},
+            status=status.HTTP_409_CONFLICT,
+            headers={'Retry-After': '1'}
+        )
+    return _replay(record)
+
+
+def _run_and_store(view_func, view, request, args, kwargs, user, key, fingerprint):
+    try:
+        record = IdempotencyKey.objects.create(
+            user=user, key=key, request_hash=fingerprint,
+            expires_at=timezone.now() + get_ttl()
+        )
+    except IntegrityError:
+        # Another worker claimed the key between our lookup and insert.
+        return _lookup(user, key, fingerprint)
+
+    try:
+        response = view_func(view, request, *args, **kwargs)
+    except Exception:
+        record.delete()
+        raise
+
+    if response.status_code >= 500 or not hasattr(response, 'data'):
+        record.delete()
+        return response
+
+    record.status_code = response.status_code
+    record.response_body = json.dumps(response.data, cls=JSONEncoder) if response.data is not None else ''
+    record.save(update_fields=['status_code', 'response_body'])
+    return response
+
+
+def idempotent(view_func):
+    """
+    Make a viewset method safe to retry with an ``Idempotency-Key`` header.
+
+    Requests without the header are passed through untouched.
+    """
+    @wraps(view_func)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"طول Idempotency-Key نباید بیشتر از {MAX_KEY_LENGTH} کاراکتر باشد."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user = request.user
+        fingerprint = request_fingerprint(request)
+        flight_key = (user.pk, key)
+
+        while True:
+            with _inflight_lock:
+                event = _inflight.get(flight_key)
+                if event is None:
+                    event = _inflight[flight_key] = threading.Event()
+                    leader = True
+                else:
+                    leader = False
+
+            if not leader:
+                # Wait for the in-flight request, then serve whatever it stored.
+                # If it failed and stored nothing, loop and take over as leader.
+                event.wait()
+                response = _lookup(user, key, fingerprint)
+                if response is not None:
+                    return response
+                continue
+
+            try:
+                response = _lookup(user, key, fingerprint)
+                if response is not None:
+                    return response
+                return _run_and_store(view_func, view, request, args, kwargs, user, key, fingerprint)
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(flight_key, None)
+                event.set()
+
+    return wrapper
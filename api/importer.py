@@ -0,0 +1,291 @@
+"""
+Bulk loading of users, maintenance packages and historical requests.
+
+Files (CSV or JSONL) are read as a stream and written with ``bulk_create`` a
+batch at a time. Each batch commits together with its ``ImportCheckpoint``,
+so a failed run restarted on the same file skips exactly the committed rows;
+the checkpoint is deleted once a run reaches the end of the file, so a new
+file imported later from the same path starts from its first row.
+Phone numbers are resolved to user ids through an in-memory map that is
+filled a batch at a time. Plain-text ``password`` values are hashed on a
+process pool; a ``password_hash`` column holds hashes that are stored as they
+are once Django recognises their hasher.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import dashboard, geo, listcache, quotes
+from .models import STATUS_CHOICES, ImportCheckpoint, MaintenancePackage, ServiceRequest, TechnicianProfile, User
+
+KINDS = ('users', 'packages', 'requests')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+
+class ImportRowError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"row {line}: {message}")
+
+
+def read_rows(path, file_format=None):
+    """Yield dict rows from a CSV (with header) or JSONL file."""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def checkpoint_key(kind, path):
+    # Keyed by path only, so a file fixed after a failed run resumes where it stopped.
+    # A finished run deletes its checkpoint (see run).
+    return f"{kind}:{os.path.abspath(path)}"[-255:]
+
+
+def _blank(value):
+    return value is None or value == ''
+
+
+def _bool(value, default=False):
+    if _blank(value):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _decimal(value):
+    return None if _blank(value) else Decimal(str(value))
+
+
+def _float(value):
+    return None if _blank(value) else float(value)
+
+
+def _int(value):
+    return None if _blank(value) else int(value)
+
+
+def _datetime(value):
+    if _blank(value):
+        return None
+    parsed = value if isinstance(value, datetime) else parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"invalid datetime {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _hash_password(password):
+    return make_password(None if _blank(password) else password)
+
+
+def _password_hash(value, line):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        raise ImportRowError(line, "invalid password_hash") from None
+    return value
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+class PasswordHasher:
+    """Hash passwords on ``workers`` processes (inline when workers is 0)."""
+    def __init__(self, workers):
+        self.executor = ProcessPoolExecutor(workers, initializer=_init_worker) if workers else None
+
+    def hash_many(self, passwords):
+        if self.executor is None:
+            return [_hash_password(password) for password in passwords]
+        return list(self.executor.map(_hash_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class UserResolver:
+    """phone_number -> user id, filled from the database one batch at a time."""
+    def __init__(self):
+        self.ids = {}
+
+    def load(self, phone_numbers):
+        missing = {phone for phone in phone_numbers if phone and phone not in self.ids}
+        if missing:
+            self.ids.update(User.objects.filter(phone_number__in=missing).values_list('phone_number', 'id'))
+
+    def get(self, phone_number, line, required=True):
+        if _blank(phone_number):
+            if required:
+                raise ImportRowError(line, "phone number is required")
+            return None
+        try:
+            return self.ids[phone_number]
+        except KeyError:
+            raise ImportRowError(line, f"unknown user {phone_number}") from None
+
+
+def import_users(batch, hasher, resolver):
+    plain = [row.get('password') for _, row in batch if _blank(row.get('password_hash'))]
+    hashes = iter(hasher.hash_many(plain))
+    users = []
+    for line, row in batch:
+        if _blank(row.get('phone_number')):
+            raise ImportRowError(line, "phone_number is required")
+        if _blank(row.get('password_hash')):
+            password = next(hashes)
+        else:
+            password = _password_hash(row['password_hash'], line)
+        users.append(User(
+            phone_number=row['phone_number'].strip(), password=password,
+            first_name=row.get('first_name') or '', last_name=row.get('last_name') or '',
+            role=row.get('role') or 'customer', is_active=_bool(row.get('is_active'), True),
+        ))
+    # Users that already exist (e.g. a re-imported file) are left untouched.
+    User.objects.bulk_create(users, ignore_conflicts=True)
+
+    technicians = [(line, row) for line, row in batch if row.get('role') == 'technician']
+    if technicians:
+        resolver.load(row['phone_number'].strip() for _, row in technicians)
+        TechnicianProfile.objects.bulk_create([
+            TechnicianProfile(
+                user_id=resolver.get(row['phone_number'].strip(), line),
+                status=row.get('technician_status') or 'active',
+                rating=_float(row.get('rating')) or 0.0,
+                base_latitude=_float(row.get('base_latitude')),
+                base_longitude=_float(row.get('base_longitude')),
+                service_radius_km=_float(row.get('service_radius_km')) or 10.0,
+            )
+            for line, row in technicians
+        ], ignore_conflicts=True)
+
+
+def import_packages(batch, hasher, resolver):
+    packages = {}
+    for line, row in batch:
+        features = row.get('features') or []
+        if isinstance(features, str):
+            features = json.loads(features)
+        if row.get('package_type') not in dict(MaintenancePackage.PACKAGE_TYPES):
+            raise ImportRowError(line, f"invalid package_type {row.get('package_type')!r}")
+        # One package per type: a later row (in the batch or a later file) replaces the earlier one.
+        packages[row['package_type']] = MaintenancePackage(
+            name=row['name'], package_type=row['package_type'], description=row.get('description') or '',
+            base_price=_decimal(row['base_price']), features=features,
+        )
+    MaintenancePackage.objects.bulk_create(
+        packages.values(), update_conflicts=True, unique_fields=['package_type'],
+        update_fields=['name', 'description', 'base_price', 'features'],
+    )
+    # bulk_create sends no post_save, so memoized quotes are retired here.
+    quotes.invalidate()
+
+
+def import_requests(batch, hasher, resolver):
+    resolver.load(phone for _, row in batch for phone in (row.get('customer_phone'), row.get('technician_phone')))
+    requests = []
+    timestamps = []
+    for line, row in batch:
+        latitude, longitude = _float(row.get('latitude')), _float(row.get('longitude'))
+        try:
+            created_at = _datetime(row.get('created_at'))
+            updated_at = _datetime(row.get('updated_at')) or created_at
+        except ValueError as exc:
+            raise ImportRowError(line, str(exc)) from None
+        request_status = row.get('status') or 'submitted'
+        if request_status not in dict(STATUS_CHOICES):
+            raise ImportRowError(line, f"invalid status {request_status!r}")
+        requests.append(ServiceRequest(
+            customer_id=resolver.get(row.get('customer_phone'), line),
+            technician_id=resolver.get(row.get('technician_phone'), line, required=False),
+            title=row.get('title') or '', description=row.get('description') or '',
+            address=row.get('address') or '', status=request_status,
+            cancel_reason=row.get('cancel_reason') or None, final_price=_decimal(row.get('final_price')),
+            discount_code=row.get('discount_code') or None,
+            discount_amount=_decimal(row.get('discount_amount')) or 0,
+            payment_status=_bool(row.get('payment_status')), rating=_int(row.get('rating')),
+            review=row.get('review') or None, latitude=latitude, longitude=longitude,
+            geo_cell=geo.encode(latitude, longitude) if latitude is not None and longitude is not None else None,
+        ))
+        timestamps.append((created_at, updated_at))
+    created = ServiceRequest.objects.bulk_create(requests)
+
+    # auto_now_add/auto_now overwrite timestamps on insert; put the historical ones back
+    # with one parameterised statement (a CASE expression per row is far slower to build).
+    dated = [(created_at, updated_at, obj.pk) for obj, (created_at, updated_at) in zip(created, timestamps)
+             if created_at]
+    if dated:
+        _restore_timestamps(dated)
+    # bulk_create skips save(), so the dashboard counters are recounted instead.
+    user_ids = {obj.customer_id for obj in created} | {obj.technician_id for obj in created}
+    dashboard.refresh_users(user_ids - {None})
+    listcache.bump_for_requests((obj.customer_id, obj.technician_id, obj.status) for obj in created)
+
+
+def _restore_timestamps(rows):
+    meta = ServiceRequest._meta
+    adapt = connection.ops.adapt_datetimefield_value
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} = %s, {} = %s WHERE {} = %s'.format(
+        quote(meta.db_table), quote(meta.get_field('created_at').column),
+        quote(meta.get_field('updated_at').column), quote(meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(adapt(created_at), adapt(updated_at), pk) for created_at, updated_at, pk in rows])
+
+
+IMPORTERS = {'users': import_users, 'packages': import_packages, 'requests': import_requests}
+
+
+def run(kind, path, file_format=None, batch_size=1000, workers=0, restart=False, progress=None):
+    """
+    Import ``path`` as ``kind``, resuming after the last committed batch.
+    Returns (rows imported in this run, rows skipped from an earlier run).
+    """
+    key = checkpoint_key(kind, path)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(key=key)
+    if restart:
+        checkpoint.rows_done = 0
+        checkpoint.save()
+    skipped = checkpoint.rows_done
+
+    importer = IMPORTERS[kind]
+    hasher = PasswordHasher(workers if kind == 'users' else 0)
+    resolver = UserResolver()
+    rows = enumerate(read_rows(path, file_format), start=1)
+    imported = 0
+    try:
+        for _ in islice(rows, skipped):
+            pass
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                importer(batch, hasher, resolver)
+                checkpoint.rows_done += len(batch)
+                checkpoint.save(update_fields=['rows_done', 'updated_at'])
+            imported += len(batch)
+            if progress:
+                progress(imported)
+        checkpoint.delete()
+    finally:
+        hasher.close()
+    return imported, skipped
@@ -0,0 +1,141 @@
+"""
+Per-user cache of the request and contract list payloads.
+
+A cached list is stored under a key that contains the generation counters it
+depends on: the user's own counter, plus the open-pool counter for
+technicians (whose list includes every unassigned submitted request) or the
+staff counter for staff (who see every request). Writes never delete cached
+payloads; they bump the counters after commit, so the next read misses and
+old entries age out of the backend. A reader racing a write can at worst
+store a payload under the generation that the write is about to retire.
+
+The backend is the ``LIST_CACHE_ALIAS`` entry of ``CACHES`` (local memory
+by default). Receivers here cover ``save()``/``save_versioned()``, deletes
+(including archiving), the transition engine and the dispatcher; bulk paths
+that bypass signals (import, contract sweep) call ``bump`` themselves.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import InsuranceContract, MaintenanceContract, ServiceRequest
+from .signals import request_status_changed, request_transitioned
+
+POOL = 'pool'
+STAFF = 'staff'
+POOL_STATUS = 'submitted'
+
+
+def _cache():
+    return caches[getattr(settings, 'LIST_CACHE_ALIAS', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'LIST_CACHE_TIMEOUT', 300)
+
+
+def _generation_key(scope):
+    return f'listcache:gen:{scope}'
+
+
+def generations(scopes):
+    """Current counter of each scope (a user id, POOL, STAFF or a named one), creating missing ones."""
+    cache = _cache()
+    keys = {scope: _generation_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    current = {}
+    for scope, key in keys.items():
+        if key not in found:
+            # Started from the clock rather than 1, so a counter evicted from the
+            # cache can never come back at a value an old payload was stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        current[scope] = found[key]
+    return current
+
+
+def payload_key(name, scopes, extra=''):
+    gens = generations(scopes)
+    raw = '|'.join([name, *(f'{scope}={gens[scope]}' for scope in scopes), extra])
+    return 'listcache:payload:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_payload(key):
+    return _cache().get(key)
+
+
+def store_payload(key, payload):
+    _cache().set(key, payload, timeout())
+
+
+def _bump_now(scopes):
+    cache = _cache()
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump(user_ids=(), pool=False, staff=False, scopes=()):
+    """
+    Retire cached lists of ``user_ids`` (and of the pool/staff scopes) once the
+    transaction commits. ``scopes`` names other counters kept here (api.quotes).
+    """
+    scopes = {*scopes, *(user_id for user_id in user_ids if user_id is not None)}
+    if pool:
+        scopes.add(POOL)
+    if staff:
+        scopes.add(STAFF)
+    if scopes:
+        transaction.on_commit(lambda: _bump_now(scopes))
+
+
+def bump_for_requests(rows):
+    """``rows``: (customer_id, technician_id, status) of requests written or removed in bulk."""
+    rows = list(rows)
+    users = {customer_id for customer_id, _, _ in rows} | {technician_id for _, technician_id, _ in rows}
+    bump(users, pool=any(status == POOL_STATUS for _, _, status in rows), staff=bool(rows))
+
+
+@receiver(request_status_changed, dispatch_uid='listcache_request_status_changed')
+def on_request_status_changed(sender, changes, **kwargs):
+    users = set()
+    pool = False
+    for change in changes:
+        users.update((change.customer_id, change.technician_id, change.previous_technician_id))
+        pool = pool or POOL_STATUS in (change.from_status, change.to_status)
+    bump(users, pool=pool, staff=True)
+
+
+@receiver(request_transitioned, dispatch_uid='listcache_request_transitioned')
+def on_request_transitioned(sender, instance, from_status, to_status, request_ids, **kwargs):
+    # Status changes are covered above; this catches same-status ones (set_price, rate).
+    if from_status != to_status:
+        return
+    if instance is not None:
+        bump([instance.customer_id, instance.technician_id], staff=True)
+    else:
+        rows = ServiceRequest.objects.filter(pk__in=request_ids).values_list('customer_id', 'technician_id')
+        bump({user_id for row in rows for user_id in row}, staff=True)
+
+
+@receiver(post_save, sender=ServiceRequest, dispatch_uid='listcache_request_saved')
+@receiver(post_delete, sender=ServiceRequest, dispatch_uid='listcache_request_deleted')
+def on_request_written(sender, instance, **kwargs):
+    bump([instance.customer_id, instance.technician_id],
+         pool=instance.status == POOL_STATUS and instance.technician_id is None, staff=True)
+
+
+@receiver(post_save, sender=MaintenanceContract, dispatch_uid='listcache_maintenance_saved')
+@receiver(post_delete, sender=MaintenanceContract, dispatch_uid='listcache_maintenance_deleted')
+@receiver(post_save, sender=InsuranceContract, dispatch_uid='listcache_insurance_saved')
+@receiver(post_delete, sender=InsuranceContract, dispatch_uid='listcache_insurance_deleted')
+def on_contract_written(sender, instance, **kwargs):
+    bump([instance.user_id])
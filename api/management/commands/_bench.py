@@ -0,0 +1,35 @@
+"""Shared helpers for the bench_* management commands (not a command itself)."""
+import statistics
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def scratch_database(alias='default'):
+    """
+    Run the block against a freshly migrated throwaway database (the test
+    database for ``alias``), so benchmarks never touch real data.
+    """
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    """Format a list of durations (seconds) as p50/p95/p99/mean in milliseconds."""
+    ms = [value * 1000 for value in seconds]
+    return (f'p50={percentile(ms, 0.5):.2f}ms p95={percentile(ms, 0.95):.2f}ms '
+            f'p99={percentile(ms, 0.99):.2f}ms mean={statistics.fmean(ms):.2f}ms')
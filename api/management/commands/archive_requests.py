@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old paid/cancelled requests and their attachments into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive requests closed more than this many days ago '
+                                 '(default: ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to yield to live traffic.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def on_batch(moved):
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        total = archive.archive(options['days'], options['batch_size'], options['max_batches'], on_batch)
+        self.stdout.write(f'Archived {total} requests in {time.perf_counter() - started:.1f}s')
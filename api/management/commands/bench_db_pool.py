@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.backends.sqlite3 import base as sqlite_base
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import pooled
+from api.models import User
+
+from ._bench import latency_summary, scratch_database
+
+MODES = {
+    # CONN_MAX_AGE 0: open and close a connection for every request
+    'per_request': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0},
+    # one connection per worker thread, kept between requests
+    'persistent': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True},
+    # connections shared by all threads through api.pooled
+    'pooled': {'ENGINE': 'api.pooled.sqlite3', 'CONN_MAX_AGE': 0},
+}
+
+
+class Command(BaseCommand):
+    help = ('Per-request latency of GET /api/auth/profile/ through the WSGI handler with '
+            'per-request, persistent and pooled database connections, on a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread.')
+        parser.add_argument('--connect-latency-ms', type=float, default=5.0,
+                            help='Added to every new connection, standing in for a network handshake '
+                                 '(TCP + TLS + auth) that a local SQLite file does not have.')
+        parser.add_argument('--pool-min', type=int, default=2)
+        parser.add_argument('--pool-max', type=int, default=4)
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        # A file database: the in-memory test database is never really closed, so
+        # per-request connections would not be measured.
+        handle, path = tempfile.mkstemp(suffix='.sqlite3', prefix='bench_db_pool_')
+        os.close(handle)
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': path}
+
+        with scratch_database():
+            user = User.objects.create_user(phone_number='09000000000', password=None)
+            token = str(RefreshToken.for_user(user).access_token)
+            connections.close_all()
+            application = get_wsgi_application()
+
+            original = dict(connection.settings_dict)
+            connect = sqlite_base.DatabaseWrapper.get_new_connection
+            delay = options['connect_latency_ms'] / 1000
+            opened = []
+
+            def slow_connect(wrapper, conn_params):
+                time.sleep(delay)
+                opened.append(1)
+                return connect(wrapper, conn_params)
+
+            sqlite_base.DatabaseWrapper.get_new_connection = slow_connect
+            try:
+                for mode in options['modes']:
+                    # Worker threads build their connection wrappers from this shared dict.
+                    connection.settings_dict.update(original)
+                    connection.settings_dict.update(MODES[mode])
+                    connection.settings_dict['POOL'] = {'MIN_SIZE': options['pool_min'],
+                                                        'MAX_SIZE': options['pool_max']}
+                    opened.clear()
+                    self._run(mode, application, token, options, opened)
+            finally:
+                sqlite_base.DatabaseWrapper.get_new_connection = connect
+                connection.settings_dict.clear()
+                connection.settings_dict.update(original)
+
+    def _run(self, mode, application, token, options, opened):
+        latencies, failures = [], []
+        lock = threading.Lock()
+
+        def start_response(status, headers, exc_info=None):
+            if not status.startswith('200'):
+                failures.append(status)
+
+        def worker():
+            own = []
+            try:
+                for _ in range(options['requests']):
+                    environ = {'PATH_INFO': '/api/auth/profile/', 'HTTP_AUTHORIZATION': f'Bearer {token}'}
+                    setup_testing_defaults(environ)
+                    started = time.perf_counter()
+                    response = application(environ, start_response)
+                    b''.join(response)
+                    response.close()  # request_finished: Django releases the connection here
+                    own.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(own)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{mode:>11}: {len(latencies) / elapsed:8.1f} req/s, {len(opened)} connections opened, '
+                          f'{len(failures)} failed')
+        self.stdout.write(f'{"":>11}  {latency_summary(latencies)}')
+        if mode == 'pooled':
+            for alias, stats in pooled.all_stats().items():
+                self.stdout.write(f'{"":>11}  pool[{alias}] in_use={stats["in_use"]} idle={stats["idle"]} '
+                                  f'waits={stats["waits"]} wait_ms_max={stats["wait_ms_max"]} '
+                                  f'overflow_closed={stats["overflow_closed"]}')
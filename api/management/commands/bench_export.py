@@ -0,0 +1,67 @@
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import export
+from api.models import ServiceRequest, User
+
+from ._bench import scratch_database
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = 'Export N synthetic requests from a scratch database and report throughput and RSS growth.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--output', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--max-rss-growth', type=float, default=64.0,
+                            help='Fail when RSS grows by more than this many MB while exporting.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            customer = User.objects.create_user(phone_number='09000000000', password=None, role='customer')
+            started = time.perf_counter()
+            batch = []
+            for index in range(options['rows']):
+                batch.append(ServiceRequest(
+                    customer=customer, title=f'درخواست {index}', description='', address='',
+                    status='paid', final_price=150000 + index % 1000, discount_amount=index % 7 * 1000,
+                    payment_status=True,
+                ))
+                if len(batch) == 5000:
+                    ServiceRequest.objects.bulk_create(batch)
+                    batch = []
+            ServiceRequest.objects.bulk_create(batch)
+            self.stdout.write(f"Seeded {options['rows']} requests in {time.perf_counter() - started:.1f}s")
+
+            baseline = peak = current_rss_mb()
+            written = 0
+            started = time.perf_counter()
+            for index, chunk in enumerate(export.stream('requests', options['output'], options['gzip'])):
+                written += len(chunk)
+                if index % 50 == 0:
+                    peak = max(peak, current_rss_mb())
+            elapsed = time.perf_counter() - started
+            peak = max(peak, current_rss_mb())
+
+        growth = peak - baseline
+        self.stdout.write(
+            f"Exported {options['rows']} rows ({written / 1e6:.1f}MB) in {elapsed:.1f}s "
+            f"({options['rows'] / elapsed:.0f} rows/s); RSS {baseline:.0f}MB -> peak {peak:.0f}MB "
+            f"(+{growth:.1f}MB)"
+        )
+        if growth > options['max_rss_growth']:
+            self.stderr.write(self.style.ERROR(f"RSS grew more than {options['max_rss_growth']}MB"))
+            raise SystemExit(1)
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import geo, matching
+from api.models import ServiceRequest, User
+
+from ._bench import latency_summary, scratch_database
+
+# Roughly the Tehran-Karaj metropolitan area.
+DEFAULT_BBOX = (35.50, 50.85, 35.85, 51.65)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the nearby open jobs feed against N open requests in a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--radius', type=float, default=10.0)
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--bbox', type=float, nargs=4, default=DEFAULT_BBOX,
+                            metavar=('MIN_LAT', 'MIN_LNG', 'MAX_LAT', 'MAX_LNG'))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        min_lat, min_lng, max_lat, max_lng = options['bbox']
+
+        with scratch_database():
+            customer = User.objects.create_user(phone_number='09000000000', password=None, role='customer')
+            started = time.perf_counter()
+            batch = []
+            for index in range(options['requests']):
+                latitude = rng.uniform(min_lat, max_lat)
+                longitude = rng.uniform(min_lng, max_lng)
+                batch.append(ServiceRequest(
+                    customer=customer, title=f'Request {index}', description='', address='',
+                    latitude=latitude, longitude=longitude, geo_cell=geo.encode(latitude, longitude),
+                ))
+                if len(batch) == 5000:
+                    ServiceRequest.objects.bulk_create(batch)
+                    batch = []
+            ServiceRequest.objects.bulk_create(batch)
+            self.stdout.write(
+                f'Seeded {options["requests"]} open requests in {time.perf_counter() - started:.1f}s'
+            )
+
+            timings = []
+            returned = 0
+            for _ in range(options['queries']):
+                latitude = rng.uniform(min_lat, max_lat)
+                longitude = rng.uniform(min_lng, max_lng)
+                started = time.perf_counter()
+                rows = matching.nearby_open_requests(latitude, longitude, options['radius'],
+                                                     limit=options['limit'])
+                timings.append(time.perf_counter() - started)
+                returned += len(rows)
+
+            self.stdout.write(
+                f'Feed radius={options["radius"]}km limit={options["limit"]} '
+                f'over {options["queries"]} queries: {latency_summary(timings)} '
+                f'(avg {returned / max(1, options["queries"]):.1f} rows returned)'
+            )
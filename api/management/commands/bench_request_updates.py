@@ -0,0 +1,106 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+
+from api.models import ServiceRequest, User
+
+from ._bench import latency_summary, scratch_database
+
+
+def _pessimistic(pk, price, think):
+    # قفل ردیف از خواندن تا نوشتن نگه داشته می‌شود
+    with transaction.atomic():
+        service_request = ServiceRequest.objects.select_for_update().get(pk=pk)
+        time.sleep(think)
+        service_request.final_price = price
+        service_request.save(update_fields=['final_price'])
+    return 0
+
+
+def _optimistic(pk, price, think):
+    conflicts = 0
+    while True:
+        service_request = ServiceRequest.objects.get(pk=pk)
+        time.sleep(think)
+        service_request.final_price = price
+        if service_request.save_versioned(['final_price']):
+            return conflicts
+        conflicts += 1
+
+
+MODES = {'select_for_update': _pessimistic, 'optimistic': _optimistic}
+
+
+class Command(BaseCommand):
+    help = ('Contention benchmark for request writes: select_for_update read-modify-write '
+            'vs. version-checked UPDATE with retry, on a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--updates', type=int, default=100, help='Writes per thread.')
+        parser.add_argument('--rows', type=int, default=4, help='Size of the contended row set.')
+        parser.add_argument('--think-ms', type=float, default=2.0,
+                            help='Work between reading the row and writing it (validation, pricing).')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            if not connection.features.has_select_for_update:
+                self.stdout.write(self.style.WARNING(
+                    f'{connection.vendor} has no row locks: select_for_update is a no-op here and '
+                    'writers serialise on the database lock instead; run against PostgreSQL for '
+                    'representative numbers.'
+                ))
+            customer = User.objects.create_user(phone_number='09000000000', password=None)
+            ids = [
+                ServiceRequest.objects.create(customer=customer, title='bench', description='', address='',
+                                              status='completed').pk
+                for _ in range(options['rows'])
+            ]
+            for mode in options['modes']:
+                self._run(mode, ids, options)
+
+    def _run(self, mode, ids, options):
+        write = MODES[mode]
+        think = options['think_ms'] / 1000
+        latencies, conflicts, lock_errors = [], [], []
+        lock = threading.Lock()
+
+        def worker(index):
+            own_latencies, own_conflicts, own_lock_errors = [], 0, 0
+            try:
+                for n in range(options['updates']):
+                    pk = ids[(index + n) % len(ids)]
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            own_conflicts += write(pk, Decimal(1000 + n), think)
+                            break
+                        except OperationalError:
+                            # SQLite reports a busy database instead of waiting on a row lock
+                            own_lock_errors += 1
+                            time.sleep(0.001)
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(own_latencies)
+                conflicts.append(own_conflicts)
+                lock_errors.append(own_lock_errors)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{mode:>17}: {len(latencies) / elapsed:8.1f} writes/s, {sum(conflicts)} version conflicts, '
+            f'{sum(lock_errors)} lock errors retried'
+        )
+        self.stdout.write(f'{"":>17}  {latency_summary(latencies)}')
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ._bench import latency_summary
+
+# Runs in a fresh interpreter: boot the WSGI app and serve one request without a server.
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+booted = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({'boot': booted - started, 'first_response': done - started, 'status': statuses[0],
+                  'spectacular': 'drf_spectacular' in sys.modules}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure worker boot and time-to-first-response in fresh interpreters for each settings profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+',
+                            default=['asanservice.settings', 'asanservice.settings_production'])
+        parser.add_argument('--runs', type=int, default=15)
+        parser.add_argument('--path', default='/api/auth/profile/',
+                            help='Request path for the first response (no DB access needed by default).')
+
+    @staticmethod
+    def _installed_apps(profile):
+        return import_module(profile).INSTALLED_APPS
+
+    def handle(self, *args, **options):
+        for profile in options['profiles']:
+            env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile, 'PYTHONDONTWRITEBYTECODE': '1'}
+            boot, first, wall = [], [], []
+            status = None
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                result = subprocess.run([sys.executable, '-c', PROBE, options['path']], capture_output=True,
+                                        text=True, env=env, cwd=settings.BASE_DIR)
+                wall.append(time.perf_counter() - started)
+                if result.returncode:
+                    raise CommandError(f'{profile}: {result.stderr.strip().splitlines()[-1]}')
+                timings = json.loads(result.stdout.strip().splitlines()[-1])
+                boot.append(timings['boot'])
+                first.append(timings['first_response'])
+                status = timings['status']
+                if timings['spectacular'] and 'drf_spectacular' not in self._installed_apps(profile):
+                    raise CommandError(f'{profile}: drf_spectacular was imported although it is not installed')
+            self.stdout.write(f'{profile} ({options["path"]} -> {status})')
+            self.stdout.write(f'  boot:                {latency_summary(boot)}')
+            self.stdout.write(f'  time to 1st response: {latency_summary(first)}')
+            self.stdout.write(f'  process wall time:   {latency_summary(wall)}')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema artifact served by /api/schema/ (run at build/deploy time).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only verify that the artifact matches the current code.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            built, current = schema.built_fingerprint(), schema.fingerprint()
+            if built != current:
+                raise CommandError(f'Schema artifact is stale or missing in {schema.artifact_dir()}; '
+                                   'run build_schema.')
+            self.stdout.write(f'Schema artifact is up to date ({current[:12]})')
+            return
+        try:
+            current = schema.build()
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Wrote schema to {schema.artifact_dir()} ({current[:12]})'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import blobstore
+
+
+class Command(BaseCommand):
+    help = 'Delete attachment blobs that no live or archived attachment uses any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to yield to live traffic.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def on_batch(deleted):
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        deleted, freed = blobstore.collect_garbage(options['batch_size'], options['max_batches'], on_batch)
+        self.stdout.write(f'Deleted {deleted} blobs ({freed / 1024 / 1024:.1f} MiB) in '
+                          f'{time.perf_counter() - started:.1f}s')
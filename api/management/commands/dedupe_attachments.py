@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import blobstore
+
+
+class Command(BaseCommand):
+    help = ('Move attachments stored before content addressing onto shared blobs, deleting '
+            'duplicate files, and report the space reclaimed. Safe to re-run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4, help='Threads hashing files.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = blobstore.dedupe(options['batch_size'], options['workers'])
+        self.stdout.write(f'Hashed {result.files} files for {result.attachments} attachments in '
+                          f'{time.perf_counter() - started:.1f}s; {result.blobs_created} blobs created, '
+                          f'{result.bytes_reclaimed / 1024 / 1024:.1f} MiB reclaimed')
+        if result.missing:
+            self.stderr.write(f'{result.missing} attachments point at missing files and were left as they are')
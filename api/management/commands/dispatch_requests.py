@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import dispatch
+
+
+class Command(BaseCommand):
+    help = 'Periodically assign waiting submitted requests to active technicians.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between dispatch rounds.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--once', action='store_true', help='Run a single round and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            assigned = dispatch.dispatch_once(options['batch_size'])
+            elapsed = time.perf_counter() - started
+            if assigned or options['verbosity'] > 1:
+                self.stdout.write(f'Assigned {len(assigned)} requests in {elapsed * 1000:.0f}ms')
+            if options['once']:
+                return
+            # A full batch means more are waiting, so go again right away.
+            if len(assigned) < options['batch_size']:
+                try:
+                    time.sleep(options['interval'])
+                except KeyboardInterrupt:
+                    return
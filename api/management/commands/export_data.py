@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import export
+
+
+class Command(BaseCommand):
+    help = 'Stream a whole table (requests or contracts) as CSV or JSONL to a file or stdout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS))
+        parser.add_argument('--output', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--file', help='Write here instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = export.stream(options['name'], options['output'], options['gzip'], options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'wb') as target:
+                written = sum(target.write(chunk) for chunk in chunks)
+            self.stderr.write(f"Wrote {written} bytes to {options['file']}")
+        else:
+            if options['gzip'] and sys.stdout.isatty():
+                raise CommandError('Refusing to write gzip data to a terminal; use --file.')
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
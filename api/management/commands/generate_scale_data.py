@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import scaledata
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic users, technician profiles, requests, attachments and contracts at '
+            'production volumes. The same --seed and counts always produce the same rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000,
+                            help=f'Every {scaledata.TECHNICIAN_EVERY}th user is a technician with a profile.')
+        parser.add_argument('--requests', type=int, default=300000)
+        parser.add_argument('--attachments', type=int, default=100000)
+        parser.add_argument('--maintenance-contracts', type=int, default=20000)
+        parser.add_argument('--insurance-contracts', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per generated chunk and transaction.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Generator processes (0 generates inline).')
+
+    def handle(self, *args, **options):
+        counts = {table: options[table] for table in scaledata.TABLES if table != 'technicians'}
+        try:
+            plan = scaledata.make_plan(counts, options['seed'], options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        started = time.perf_counter()
+        table_started = {}
+
+        def progress(table, done, total):
+            if not done:
+                table_started[table] = time.perf_counter()
+            elif done == total or options['verbosity'] > 1:
+                rate = done / (time.perf_counter() - table_started[table])
+                self.stdout.write(f'{table}: {done}/{total} ({rate:.0f} rows/s)')
+
+        inserted = scaledata.run(plan, options['workers'], progress)
+        elapsed = time.perf_counter() - started
+        rows = sum(inserted.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s). '
+            'Run rebuild_dashboards and refresh_rollups to bring the derived tables up to date.'
+        ))
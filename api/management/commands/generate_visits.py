@@ -0,0 +1,40 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api import visits
+
+
+class Command(BaseCommand):
+    help = ('Release the scheduled visits due today and create the upcoming periodic visit requests of '
+            'active maintenance contracts. Meant to run daily; each run handles one bucket of contracts '
+            '(see VISIT_SPREAD_DAYS).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Run as if today were this date (YYYY-MM-DD).')
+        parser.add_argument('--horizon-days', type=int, default=None,
+                            help='Create visits due up to this many days ahead (default: VISIT_HORIZON_DAYS).')
+        parser.add_argument('--all', action='store_true',
+                            help='Handle every contract instead of the day\'s bucket (e.g. on the first run).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to yield to live traffic.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        contracts = 0
+
+        def on_batch(size):
+            nonlocal contracts
+            contracts += size
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        released = visits.release_due(options['date'], batch_size=options['batch_size'])
+        self.stdout.write(f'Released {released} due visits')
+        created = visits.generate(options['date'], options['horizon_days'], every_contract=options['all'],
+                                  batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(f'Created {created} visits for {contracts} contracts in '
+                          f'{time.perf_counter() - started:.1f}s')
@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users, maintenance packages or historical requests from CSV/JSONL. '
+        'Re-running the same file resumes after the last committed batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=importer.KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=('csv', 'jsonl'),
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes for password hashing (0 hashes inline).')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(imported):
+            rate = imported / (time.perf_counter() - started)
+            self.stdout.write(f'{imported} rows ({rate:.0f} rows/s)')
+
+        try:
+            imported, skipped = importer.run(
+                options['kind'], options['path'], options['file_format'], options['batch_size'],
+                options['workers'], options['restart'],
+                progress=progress if options['verbosity'] else None,
+            )
+        except (importer.ImportRowError, ValueError, KeyError) as exc:
+            raise CommandError(f'{exc}; fix the file and re-run to resume from the last checkpoint.')
+        elapsed = time.perf_counter() - started
+        if skipped:
+            self.stdout.write(f'Resumed after {skipped} already imported rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} {options["kind"]} in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
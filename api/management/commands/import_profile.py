@@ -0,0 +1,58 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+SETUP_SCRIPT = 'import django; django.setup()'
+URLCONF_SCRIPT = '; from django.urls import get_resolver; get_resolver().url_patterns'
+
+
+def parse_importtime(output):
+    """Parse ``python -X importtime`` output into [(module, self_us, cumulative_us, depth)]."""
+    rows = []
+    for line in output.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Report per-module import cost of django.setup() (and optionally the URLconf, '
+        'i.e. what the first request imports) in a fresh interpreter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--first-request', action='store_true',
+                            help='Also import the URLconf and every view it references.')
+
+    def handle(self, *args, **options):
+        script = SETUP_SCRIPT + (URLCONF_SCRIPT if options['first_request'] else '')
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        rows = parse_importtime(result.stderr)
+
+        total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+        self.stdout.write(f'{settings.SETTINGS_MODULE}: {len(rows)} modules, {total / 1000:.1f}ms of imports')
+
+        self.stdout.write(f"\n{'cumulative':>12} {'self':>9}  module")
+        for module, self_us, cumulative, _ in sorted(rows, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f'{cumulative / 1000:10.1f}ms {self_us / 1000:7.1f}ms  {module}')
+
+        packages = defaultdict(int)
+        for module, self_us, _, _ in rows:
+            packages[module.split('.')[0]] += self_us
+        self.stdout.write(f"\n{'self total':>12}  package")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{self_us / 1000:10.1f}ms  {package}')
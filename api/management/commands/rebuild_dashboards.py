@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api import dashboard
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserDashboard counters from the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('phone_numbers', nargs='*',
+                            help='Only rebuild these users (default: everyone).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['phone_numbers']:
+            users = users.filter(phone_number__in=options['phone_numbers'])
+
+        batch_size = options['batch_size']
+        total = 0
+        last_pk = 0
+        while True:
+            ids = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            dashboard.refresh_users(ids)
+            total += len(ids)
+            last_pk = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt dashboards for {total} users.'))
@@ -0,0 +1,59 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import pricing
+
+
+class Command(BaseCommand):
+    help = ('Price every active maintenance/insurance contract against a candidate catalog and report '
+            'the renewal price impact; with --apply, store the new prices as renewal_price.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--catalog', help='JSON file with the catalog entries to change '
+                                              '(see api.pricing.Catalog); default: the current catalog.')
+        parser.add_argument('--kind', action='append', choices=list(pricing.KINDS), dest='kinds',
+                            help='Contract kind to reprice (repeatable; default: all).')
+        parser.add_argument('--report', help='Write a per-contract CSV diff to this path.')
+        parser.add_argument('--apply', action='store_true', help='Store the new prices as renewal_price.')
+        parser.add_argument('--chunk-size', type=int, default=pricing.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        changes = {}
+        if options['catalog']:
+            with open(options['catalog'], encoding='utf-8') as source:
+                changes = json.load(source)
+        try:
+            catalog = pricing.Catalog.current().with_changes(changes)
+        except pricing.CatalogError as exc:
+            raise CommandError(str(exc))
+        kinds = options['kinds'] or list(pricing.KINDS)
+
+        started = time.perf_counter()
+        on_chunk = None
+        report = None
+        if options['report']:
+            # utf-8-sig: the BOM lets Excel open the file as UTF-8, like the exports.
+            report = open(options['report'], 'w', newline='', encoding='utf-8-sig')
+            writer = csv.writer(report)
+            writer.writerow(pricing.REPORT_COLUMNS)
+
+            def on_chunk(chunk):
+                writer.writerows(pricing.report_row(change) for change in chunk)
+        try:
+            summaries = pricing.run(catalog, kinds, options['apply'], options['chunk_size'], on_chunk)
+        finally:
+            if report is not None:
+                report.close()
+
+        for kind, summary in summaries.items():
+            delta = summary['new_total'] - summary['current_total']
+            self.stdout.write(
+                f"{kind}: {summary['contracts']} contracts, {summary['changed']} changed "
+                f"({summary['increased']} up, {summary['decreased']} down), "
+                f"total {summary['current_total']} -> {summary['new_total']} ({delta:+})"
+            )
+        action = 'renewal prices stored' if options['apply'] else 'dry run'
+        self.stdout.write(f'{action} in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,94 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import dispatch, geo
+from api.models import ServiceRequest, TechnicianProfile, User
+
+from ._bench import latency_summary, percentile, scratch_database
+
+DEFAULT_BBOX = (35.50, 50.85, 35.85, 51.65)
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a synthetic technician fleet in a scratch database and report '
+        'dispatch throughput and request wait times.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--technicians', type=int, default=500)
+        parser.add_argument('--ticks', type=int, default=60, help='Number of dispatch rounds.')
+        parser.add_argument('--arrivals', type=int, default=300, help='Mean new requests per tick.')
+        parser.add_argument('--completion-rate', type=float, default=0.3,
+                            help='Chance per tick that an assigned job finishes.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        min_lat, min_lng, max_lat, max_lng = DEFAULT_BBOX
+
+        def point():
+            return rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng)
+
+        with scratch_database():
+            customer = User.objects.create_user(phone_number='09000000000', password=None, role='customer')
+            users = User.objects.bulk_create([
+                User(phone_number=f'0935{index:07d}', role='technician')
+                for index in range(options['technicians'])
+            ])
+            profiles = []
+            for user in users:
+                latitude, longitude = point()
+                profiles.append(TechnicianProfile(
+                    user=user, status='active', rating=round(rng.uniform(3, 5), 1),
+                    base_latitude=latitude, base_longitude=longitude, service_radius_km=rng.choice([10, 15, 25]),
+                ))
+            TechnicianProfile.objects.bulk_create(profiles)
+
+            arrived_at = {}
+            waits = []
+            round_times = []
+            assigned_total = 0
+            for tick in range(options['ticks']):
+                new_requests = []
+                for _ in range(max(0, int(rng.gauss(options['arrivals'], options['arrivals'] ** 0.5)))):
+                    latitude, longitude = point()
+                    new_requests.append(ServiceRequest(
+                        customer=customer, title='Sim', description='', address='',
+                        latitude=latitude, longitude=longitude, geo_cell=geo.encode(latitude, longitude),
+                    ))
+                for request in ServiceRequest.objects.bulk_create(new_requests):
+                    arrived_at[request.pk] = tick
+
+                # Drain the queue for this tick the same way the loop command does.
+                started = time.perf_counter()
+                while True:
+                    assigned = dispatch.dispatch_once(options['batch_size'])
+                    for request_id, _ in assigned:
+                        waits.append(tick - arrived_at.pop(request_id))
+                    assigned_total += len(assigned)
+                    if len(assigned) < options['batch_size']:
+                        break
+                round_times.append(time.perf_counter() - started)
+
+                in_service = list(ServiceRequest.objects.filter(status='assigned').values_list('pk', flat=True))
+                finished = [pk for pk in in_service if rng.random() < options['completion_rate']]
+                ServiceRequest.objects.filter(pk__in=finished).update(status='completed')
+
+            total_time = sum(round_times)
+            self.stdout.write(
+                f'{options["technicians"]} technicians, {options["ticks"]} ticks, '
+                f'{assigned_total} assigned, {len(arrived_at)} still waiting'
+            )
+            self.stdout.write(
+                f'Dispatch throughput: {assigned_total / total_time:.0f} assignments/s; '
+                f'round time {latency_summary(round_times)}'
+            )
+            if waits:
+                self.stdout.write(
+                    f'Wait (ticks): p50={percentile(waits, 0.5)} p95={percentile(waits, 0.95)} '
+                    f'max={max(waits)}'
+                )
@@ -0,0 +1,153 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import dashboard, listcache
+from api.models import (
+    INSURANCE_DURATION_DAYS, ContractRenewalReminder, InsuranceContract, MaintenanceContract,
+    contract_duration_days,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deactivate expired maintenance/insurance contracts and create renewal '
+        'reminders and draft renewal contracts for the ones about to expire.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--reminder-days', type=int, default=30,
+                            help='Remind about contracts ending within this many days.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to yield to live traffic.')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        today = date.today()
+        horizon = today + timedelta(days=options['reminder_days'])
+
+        touched_users = set()
+        for model in (MaintenanceContract, InsuranceContract):
+            expired = self.expire(model, today, touched_users)
+            reminders, drafts = self.prepare_renewals(model, today, horizon)
+            self.stdout.write(
+                f'{model.__name__}: {expired} deactivated, '
+                f'{reminders} reminders, {drafts} draft renewals'
+            )
+
+        # "Insurance expiring soon" depends on the date, so owners inside the window are recounted too.
+        soon = today + timedelta(days=dashboard.expiring_soon_days())
+        touched_users.update(
+            InsuranceContract.objects.filter(is_active=True, end_date__gte=today, end_date__lte=soon)
+            .values_list('user_id', flat=True).distinct()
+        )
+        self.refresh_dashboards(sorted(touched_users), today)
+        listcache.bump(touched_users)
+
+    def _sleep(self):
+        if self.pause:
+            time.sleep(self.pause)
+
+    def refresh_dashboards(self, user_ids, today):
+        for start in range(0, len(user_ids), self.batch_size):
+            dashboard.refresh_users(user_ids[start:start + self.batch_size], today=today)
+            self._sleep()
+
+    def expire(self, model, today, touched_users):
+        """Flip is_active off for expired contracts, one bounded UPDATE per batch."""
+        total = 0
+        while True:
+            rows = list(
+                model.objects.filter(is_active=True, end_date__lt=today)
+                .order_by('end_date')
+                .values_list('pk', 'user_id')[:self.batch_size]
+            )
+            if not rows:
+                return total
+            ids = [pk for pk, _ in rows]
+            touched_users.update(user_id for _, user_id in rows)
+            with transaction.atomic():
+                # The predicate is repeated so rows changed since the SELECT are left alone.
+                total += model.objects.filter(
+                    pk__in=ids, is_active=True, end_date__lt=today
+                ).update(is_active=False)
+            self._sleep()
+
+    def prepare_renewals(self, model, today, horizon):
+        is_maintenance = model is MaintenanceContract
+        contract_field = 'maintenance_contract' if is_maintenance else 'insurance_contract'
+        fields = ['pk', 'user_id', 'end_date', 'price', 'renewal_price', 'building_floors',
+                  'building_type', 'elevator_age', 'elevator_count']
+        if is_maintenance:
+            fields += ['package_id', 'package__package_type']
+        else:
+            fields += ['insurance_type_id', 'coverage_level']
+
+        queryset = model.objects.filter(
+            is_active=True, end_date__gte=today, end_date__lte=horizon
+        ).order_by('pk')
+
+        reminders_created = drafts_created = 0
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).values(*fields)[:self.batch_size])
+            if not rows:
+                return reminders_created, drafts_created
+            last_pk = rows[-1]['pk']
+            ids = [row['pk'] for row in rows]
+
+            reminded = set(
+                ContractRenewalReminder.objects.filter(**{f'{contract_field}__in': ids})
+                .values_list(f'{contract_field}_id', flat=True)
+            )
+            renewed = set(
+                model.objects.filter(renewal_of__in=ids).values_list('renewal_of_id', flat=True)
+            )
+
+            reminders = [
+                ContractRenewalReminder(user_id=row['user_id'], end_date=row['end_date'],
+                                        **{f'{contract_field}_id': row['pk']})
+                for row in rows if row['pk'] not in reminded
+            ]
+            drafts = [self.build_draft(model, row) for row in rows if row['pk'] not in renewed]
+
+            with transaction.atomic():
+                # ignore_conflicts keeps a concurrent sweeper run from failing the batch;
+                # the unique constraints guarantee one reminder and one draft per contract.
+                ContractRenewalReminder.objects.bulk_create(reminders, ignore_conflicts=True)
+                model.objects.bulk_create(drafts, ignore_conflicts=True)
+            reminders_created += len(reminders)
+            drafts_created += len(drafts)
+            self._sleep()
+
+    def build_draft(self, model, row):
+        # bulk_create skips save(), so end_date is computed here the same way.
+        start_date = row['end_date']
+        common = {
+            'user_id': row['user_id'],
+            'start_date': start_date,
+            # قیمت تمدید محاسبه‌شده با کاتالوگ جدید، اگر reprice_contracts --apply اجرا شده باشد
+            'price': row['renewal_price'] or row['price'],
+            'is_active': False,
+            'building_floors': row['building_floors'],
+            'building_type': row['building_type'],
+            'elevator_age': row['elevator_age'],
+            'elevator_count': row['elevator_count'],
+            'renewal_of_id': row['pk'],
+        }
+        if model is MaintenanceContract:
+            return MaintenanceContract(
+                package_id=row['package_id'],
+                end_date=start_date + timedelta(days=contract_duration_days(row['package__package_type'])),
+                **common
+            )
+        return InsuranceContract(
+            insurance_type_id=row['insurance_type_id'],
+            coverage_level=row['coverage_level'],
+            end_date=start_date + timedelta(days=INSURANCE_DURATION_DAYS),
+            **common
+        )
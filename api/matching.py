@@ -0,0 +1,40 @@
+"""Nearby open jobs for technicians, served from the geohash cell index."""
+from . import geo
+from .models import ServiceRequest
+
+# Rings of cells are gathered until at least this many cells are pending, then
+# queried together; a dense city center stops after the first query or two.
+CELLS_PER_QUERY = 24
+FEED_FIELDS = ('id', 'title', 'status', 'customer_id', 'created_at', 'address', 'latitude', 'longitude')
+
+
+def nearby_open_requests(latitude, longitude, radius_km, limit=50):
+    """
+    Return up to ``limit`` unassigned submitted requests within ``radius_km``,
+    nearest first, as dicts with an added ``distance_km``.
+    """
+    base = ServiceRequest.objects.filter(technician__isnull=True, status='submitted')
+    found = []
+    pending = []
+
+    def flush():
+        rows = base.filter(geo_cell__in=[cell for _, cell in pending]).values(*FEED_FIELDS)
+        for row in rows:
+            distance = geo.haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+            if distance <= radius_km:
+                row['distance_km'] = round(distance, 3)
+                found.append(row)
+        found.sort(key=lambda row: row['distance_km'])
+        del found[limit:]
+        pending.clear()
+
+    for ring in geo.cell_rings(latitude, longitude, radius_km):
+        if not pending and len(found) >= limit and found[-1]['distance_km'] <= ring[0][0]:
+            # Every remaining cell is farther away than the current k-th result.
+            return found
+        pending.extend(ring)
+        if len(pending) >= CELLS_PER_QUERY:
+            flush()
+    if pending:
+        flush()
+    return found
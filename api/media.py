@@ -0,0 +1,159 @@
+"""
+Attachment downloads.
+
+The view decides who may read a file; ``ATTACHMENT_OFFLOAD`` decides who
+sends its bytes:
+
+    None                the worker streams the file (development, tests)
+    'x-accel-redirect'  nginx, from an internal location for ATTACHMENT_ACCEL_PREFIX:
+                            location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+    'x-sendfile'        Apache mod_xsendfile or lighttpd, from the absolute path
+
+With an offload the front server also answers Range and If-Range, and the
+worker only checks permissions and If-None-Match. The ETag has nginx's
+format ("<mtime hex>-<size hex>") so a validator stays valid whichever side
+issued it. Without one, a single byte range is answered with 206 from a
+reader that stops at the end of the range; requests for several ranges get
+the whole file, which RFC 9110 allows.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+OFFLOAD_MODES = (None, 'x-accel-redirect', 'x-sendfile')
+CACHE_CONTROL = 'private, max-age=3600'
+_RANGE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def offload_mode():
+    mode = getattr(settings, 'ATTACHMENT_OFFLOAD', None)
+    if mode not in OFFLOAD_MODES:
+        raise ImproperlyConfigured(f"ATTACHMENT_OFFLOAD must be one of {OFFLOAD_MODES}, not {mode!r}")
+    return mode
+
+
+def accel_prefix():
+    return getattr(settings, 'ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+
+
+def parse_range(header, size):
+    """
+    (first, last) byte positions asked for by a single-range ``Range`` header,
+    or None when the whole file should be sent (no header, several ranges or
+    a malformed one, which RFC 9110 says to ignore). Raises
+    ``RangeNotSatisfiable`` when the range starts past the end of the file.
+    """
+    match = _RANGE.match(header or '')
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)  # bytes=-N: the last N bytes
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable()
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _if_range_matches(request, etag, last_modified):
+    """False when If-Range names another version of the file, so the Range must be ignored."""
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith(('"', 'W/')):
+        return value == etag  # strong comparison: a weak tag never matches
+    return parse_http_date_safe(value) == last_modified
+
+
+class _RangeFile:
+    """The next ``length`` bytes of ``file``; FileResponse reads it until it returns b''."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _streamed(request, storage, name, filename, size, etag, last_modified):
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) \
+            if _if_range_matches(request, etag, last_modified) else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = storage.open(name, 'rb')
+    if byte_range is None:
+        return FileResponse(file, filename=filename)
+    first, last = byte_range
+    file.seek(first)
+    response = FileResponse(_RangeFile(file, last - first + 1), filename=filename, status=206)
+    response['Content-Length'] = last - first + 1
+    response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    return response
+
+
+def _offloaded(mode, storage, name, filename):
+    content_type, encoding = mimetypes.guess_type(filename)
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = accel_prefix() + quote(name)
+    else:
+        response['X-Sendfile'] = storage.path(name)
+    return response
+
+
+def serve(request, field_file):
+    """Response for a GET of ``field_file`` (a FileField value) the caller has already authorised."""
+    storage, name = field_file.storage, field_file.name
+    try:
+        size = storage.size(name)
+        last_modified = int(storage.get_modified_time(name).timestamp())
+    except OSError:
+        raise Http404
+    etag = f'"{last_modified:x}-{size:x}"'
+    filename = os.path.basename(name)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = offload_mode()
+        if mode is None:
+            response = _streamed(request, storage, name, filename, size, etag, last_modified)
+        else:
+            response = _offloaded(mode, storage, name, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
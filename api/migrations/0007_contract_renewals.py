@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-19 15:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractRenewalReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='insurancecontract',
+            name='renewal_of',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewal', to='api.insurancecontract'),
+        ),
+        migrations.AddField(
+            model_name='maintenancecontract',
+            name='renewal_of',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewal', to='api.maintenancecontract'),
+        ),
+        migrations.AddIndex(
+            model_name='insurancecontract',
+            index=models.Index(fields=['is_active', 'end_date'], name='ins_contract_active_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancecontract',
+            index=models.Index(fields=['is_active', 'end_date'], name='maint_contract_active_end_idx'),
+        ),
+        migrations.AddField(
+            model_name='contractrenewalreminder',
+            name='insurance_contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='renewal_reminders', to='api.insurancecontract'),
+        ),
+        migrations.AddField(
+            model_name='contractrenewalreminder',
+            name='maintenance_contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='renewal_reminders', to='api.maintenancecontract'),
+        ),
+        migrations.AddField(
+            model_name='contractrenewalreminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renewal_reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='contractrenewalreminder',
+            constraint=models.UniqueConstraint(fields=('maintenance_contract',), name='unique_maintenance_renewal_reminder'),
+        ),
+        migrations.AddConstraint(
+            model_name='contractrenewalreminder',
+            constraint=models.UniqueConstraint(fields=('insurance_contract',), name='unique_insurance_renewal_reminder'),
+        ),
+    ]
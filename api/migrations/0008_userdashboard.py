@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-19 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_contract_renewals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDashboard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_requests', models.IntegerField(default=0)),
+                ('awaiting_payment', models.IntegerField(default=0)),
+                ('active_contracts', models.IntegerField(default=0)),
+                ('insurance_expiring_soon', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
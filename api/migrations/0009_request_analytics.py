@@ -0,0 +1,75 @@
+# Generated by Django 4.2 on 2026-10-19 15:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_userdashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created_count', models.IntegerField(default=0)),
+                ('assigned_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RequestEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.BigIntegerField(db_index=True)),
+                ('technician_id', models.BigIntegerField(blank=True, null=True)),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('assigned', 'Assigned'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('paid', 'Paid'), ('rated', 'Rated')], max_length=20)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('discount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('rating', models.IntegerField(blank=True, null=True)),
+                ('occurred_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TechnicianDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created_count', models.IntegerField(default=0)),
+                ('assigned_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('technician', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrequeststats',
+            constraint=models.UniqueConstraint(fields=('day',), name='unique_daily_request_stats_day'),
+        ),
+        migrations.AddIndex(
+            model_name='techniciandailystats',
+            index=models.Index(fields=['day'], name='tech_daily_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='techniciandailystats',
+            constraint=models.UniqueConstraint(fields=('technician', 'day'), name='unique_technician_daily_stats'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-19 15:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_request_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('kind', models.CharField(choices=[('percent', 'درصدی'), ('fixed', 'مبلغ ثابت')], default='percent', max_length=10)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('max_discount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('min_price', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('max_uses', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_uses_per_user', models.PositiveIntegerField(default=1)),
+                ('used_count', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DiscountRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('discount_code', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='redemptions', to='api.discountcode')),
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='discount_redemption', to='api.servicerequest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discount_redemptions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='discountredemption',
+            index=models.Index(fields=['discount_code', 'user'], name='discount_redemption_user_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_request_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedservicerequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='servicerequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-19 16:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicate_packages(apps, schema_editor):
+    """
+    Keep the oldest package of each package_type, move the contracts of the
+    others onto it and delete them, so unique_package_type can be added.
+    """
+    MaintenancePackage = apps.get_model('api', 'MaintenancePackage')
+    MaintenanceContract = apps.get_model('api', 'MaintenanceContract')
+    keep = {}
+    for pk, package_type in MaintenancePackage.objects.order_by('pk').values_list('pk', 'package_type'):
+        if package_type not in keep:
+            keep[package_type] = pk
+            continue
+        MaintenanceContract.objects.filter(package_id=pk).update(package_id=keep[package_type])
+        MaintenancePackage.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_request_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='technician',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='technician_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='insurancecontract',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'end_date'], name='ins_contract_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancecontract',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'end_date'], name='maint_contract_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['technician', 'status', 'rating'], name='request_technician_status_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_packages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='maintenancepackage',
+            constraint=models.UniqueConstraint(fields=('package_type',), name='unique_package_type'),
+        ),
+    ]
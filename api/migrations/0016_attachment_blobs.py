@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-19 16:30
+
+import api.storage
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('touched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='archivedrequestattachment',
+            name='file',
+            field=models.FileField(storage=api.storage.blob_storage, upload_to='request_attachments/'),
+        ),
+        migrations.AlterField(
+            model_name='requestattachment',
+            name='file',
+            field=models.FileField(storage=api.storage.blob_storage, upload_to='request_attachments/'),
+        ),
+        migrations.AddIndex(
+            model_name='attachmentblob',
+            index=models.Index(fields=['ref_count', 'touched_at'], name='blob_gc_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedrequestattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_attachments', to='api.attachmentblob'),
+        ),
+        migrations.AddField(
+            model_name='requestattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='api.attachmentblob'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedservicerequest',
+            name='maintenance_contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_visits', to='api.maintenancecontract'),
+        ),
+        migrations.AddField(
+            model_name='archivedservicerequest',
+            name='visit_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicerequest',
+            name='maintenance_contract',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='visits', to='api.maintenancecontract'),
+        ),
+        migrations.AddField(
+            model_name='servicerequest',
+            name='visit_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='servicerequest',
+            constraint=models.UniqueConstraint(fields=('maintenance_contract', 'visit_date'), name='unique_contract_visit'),
+        ),
+    ]
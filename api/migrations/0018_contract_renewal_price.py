@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_maintenance_visits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insurancecontract',
+            name='renewal_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='maintenancecontract',
+            name='renewal_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_contract_renewal_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedservicerequest',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('submitted', 'Submitted'), ('assigned', 'Assigned'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('paid', 'Paid')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('submitted', 'Submitted'), ('assigned', 'Assigned'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('paid', 'Paid')], default='submitted', max_length=50),
+        ),
+    ]
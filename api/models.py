@@ -1,10 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from decimal import Decimal
 from datetime import date, timedelta
+from . import geo, storage
+from .signals import RequestStatusChange, request_status_changed
 
 # تعریف STATUS_CHOICES قبل از استفاده در مدل
 STATUS_CHOICES = (
+    ('scheduled', 'Scheduled'),
     ('submitted', 'Submitted'),
     ('assigned', 'Assigned'),
     ('in_progress', 'In Progress'),
@@ -65,6 +71,10 @@ class TechnicianProfile(models.Model):
     bio = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending_approval')
     rating = models.FloatField(default=0.0)
+    # محدوده خدمت‌رسانی تکنسین (مرکز و شعاع)
+    base_latitude = models.FloatField(null=True, blank=True)
+    base_longitude = models.FloatField(null=True, blank=True)
+    service_radius_km = models.FloatField(default=10.0)
     
     def __str__(self):
         return f"Profile of {self.user.phone_number}"
@@ -72,7 +82,9 @@ class TechnicianProfile(models.Model):
 
 class ServiceRequest(models.Model):
     customer = models.ForeignKey(User, related_name='customer_requests', on_delete=models.CASCADE)
-    technician = models.ForeignKey(User, related_name='technician_requests', on_delete=models.SET_NULL, null=True, blank=True)
+    # ایندکس تکنسین در request_technician_status_idx (ستون اول) است
+    technician = models.ForeignKey(User, related_name='technician_requests', on_delete=models.SET_NULL, null=True,
+                                   blank=True, db_index=False)
     title = models.CharField(max_length=255)
     description = models.TextField()
     address = models.TextField()
@@ -86,41 +98,113 @@ class ServiceRequest(models.Model):
     payment_status = models.BooleanField(default=False)
     rating = models.IntegerField(null=True, blank=True)
     review = models.TextField(blank=True, null=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # geohash مختصات با دقت GEO_CELL_PRECISION برای جستجوی کارهای نزدیک
+    geo_cell = models.CharField(max_length=12, null=True, blank=True)
+    # با هر نوشتن یکی زیاد می‌شود؛ ETag درخواست و شرط If-Match روی همین است
+    version = models.PositiveIntegerField(default=1)
+    # بازدید دوره‌ای که generate_visits از روی قرارداد نگهداری ساخته است
+    maintenance_contract = models.ForeignKey('MaintenanceContract', related_name='visits', on_delete=models.SET_NULL,
+                                             null=True, blank=True)
+    visit_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # One visit per contract and day, so re-running the generator inserts nothing twice.
+            models.UniqueConstraint(fields=['maintenance_contract', 'visit_date'], name='unique_contract_visit'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'geo_cell'], name='request_open_geo_cell_idx',
+                         condition=models.Q(technician__isnull=True)),
+            models.Index(fields=['status', 'updated_at'], name='request_status_updated_idx'),
+            # A technician's requests, the open pool (technician NULL) and the rating average.
+            models.Index(fields=['technician', 'status', 'rating'], name='request_technician_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} for {self.customer.phone_number}"
 
-    def can_cancel(self, user):
-        """Check if user can cancel this request"""
-        if user.is_staff or user.role == 'admin':
-            return True
-        if user == self.customer:
-            return self.status in ['submitted', 'assigned']
-        if user == self.technician:
-            return self.status in ['assigned', 'in_progress']
-        return False
-
-    def can_set_price(self, user):
-        return (user == self.technician and 
-                self.status == 'completed' and 
-                self.final_price is None)
-
-    def can_pay(self, user):
-        return (user == self.customer and 
-                self.status == 'completed' and 
-                self.final_price is not None)
-
-    def can_rate(self, user):
-        return (user == self.customer and 
-                self.status == 'paid' and 
-                self.rating is None)
-
-        def save(self, *args, **kwargs):
-            # تبدیل مقدار به Decimal قبل از ذخیره
-            if isinstance(self.final_price, str):
-                self.final_price = Decimal(self.final_price)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+
+    def _remember_state(self):
+        self._loaded_status = self.__dict__.get('status')
+        self._loaded_technician_id = self.__dict__.get('technician_id')
+
+    def _set_geo_cell(self):
+        if self.latitude is not None and self.longitude is not None:
+            self.geo_cell = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geo_cell = None
+
+    def _notify_change(self, adding):
+        from_status = None if adding else getattr(self, '_loaded_status', self.status)
+        previous_technician_id = None if adding else getattr(self, '_loaded_technician_id', self.technician_id)
+        if adding or from_status != self.status or previous_technician_id != self.technician_id:
+            request_status_changed.send(sender=ServiceRequest, changes=[RequestStatusChange(
+                self.pk, self.customer_id, self.technician_id, previous_technician_id,
+                from_status, self.status,
+            )])
+
+    def save(self, *args, **kwargs):
+        # وضعیت و ثبت تغییر آن (برای شمارنده‌ها) در یک تراکنش انجام می‌شوند
+        adding = self._state.adding
+        self._set_geo_cell()
+        if not adding:
+            # نوشتن بدون شرط هم نسخه را جلو می‌برد تا ETagهای قبلی باطل شوند
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at', 'geo_cell'}
+        with transaction.atomic(using=kwargs.get('using')):
             super().save(*args, **kwargs)
- 
+            self._notify_change(adding)
+        self._remember_state()
+
+    def save_versioned(self, update_fields):
+        """
+        Write only ``update_fields``, and only if the row is still at the version
+        this instance was loaded with. Returns False (nothing written) when
+        someone else saved the request in between.
+        """
+        fields = {*update_fields, 'updated_at'}
+        if fields & {'latitude', 'longitude'}:
+            self._set_geo_cell()
+            fields.add('geo_cell')
+        self.updated_at = timezone.now()
+        values = {
+            field.attname: getattr(self, field.attname)
+            for field in (self._meta.get_field(name) for name in fields)
+        }
+        with transaction.atomic():
+            updated = ServiceRequest.objects.filter(pk=self.pk, version=self.version).update(
+                version=F('version') + 1, **values
+            )
+            if not updated:
+                return False
+            self.version += 1
+            self._notify_change(adding=False)
+            post_save.send(sender=ServiceRequest, instance=self, created=False, raw=False,
+                           using=self._state.db, update_fields=frozenset(fields))
+        self._remember_state()
+        return True
+
+# مدت قرارداد سرویس بر اساس نوع پکیج (روز)
+PACKAGE_DURATION_DAYS = {
+    'basic': 365,
+    'standard': 730,  # 2 سال
+    'premium': 1095,  # 3 سال
+}
+INSURANCE_DURATION_DAYS = 365
+
+
+def contract_duration_days(package_type):
+    return PACKAGE_DURATION_DAYS.get(package_type, PACKAGE_DURATION_DAYS['premium'])
+
+
 # Define MaintenancePackage before MaintenanceContract
 class MaintenancePackage(models.Model):
     PACKAGE_TYPES = (
@@ -134,16 +218,59 @@ class MaintenancePackage(models.Model):
     description = models.TextField()
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
     features = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            # قراردادها پکیج را با نوعش پیدا می‌کنند
+            models.UniqueConstraint(fields=['package_type'], name='unique_package_type'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_package_type_display()})"
     
     # در فایل models.py قبل از کلاس QuoteRequestSerializer این مدل را اضافه کنید
+class AttachmentBlob(models.Model):
+    """
+    One stored copy of some attachment bytes (see api/storage.py). ``ref_count``
+    counts the live and archived attachments using it; api/blobstore.py keeps
+    it up to date and deletes blobs nothing uses any more.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever an upload resolves to this blob, so garbage collection leaves it alone for a while.
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['ref_count', 'touched_at'], name='blob_gc_idx')]
+
+    @classmethod
+    def for_file(cls, name, size):
+        blob, created = cls.objects.get_or_create(name=name, defaults={'sha256': storage.digest(name), 'size': size})
+        if not created:
+            cls.objects.filter(pk=blob.pk).update(touched_at=timezone.now())
+        return blob
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
 class RequestAttachment(models.Model):
     request = models.ForeignKey(ServiceRequest, related_name='attachments', on_delete=models.CASCADE)
-    file = models.FileField(upload_to='request_attachments/')
+    file = models.FileField(upload_to='request_attachments/', storage=storage.blob_storage)
+    blob = models.ForeignKey(AttachmentBlob, related_name='attachments', on_delete=models.PROTECT,
+                             null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # فایل پیش از درج ذخیره می‌شود تا blob همراه همین ردیف ثبت شود
+            self.file.save(self.file.name, self.file.file, save=False)
+            self.blob = AttachmentBlob.for_file(self.file.name, self.file.size)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Attachment for {self.request.title}"
 
@@ -160,6 +287,18 @@ class MaintenanceContract(models.Model):
     elevator_age = models.CharField(max_length=50)
     elevator_count = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # پیش‌نویس تمدید که توسط sweep_contracts ساخته می‌شود (غیرفعال تا تایید مشتری)
+    renewal_of = models.OneToOneField('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='renewal')
+    # قیمت تمدید طبق آخرین کاتالوگ (reprice_contracts --apply)؛ خالی یعنی همان قیمت فعلی
+    renewal_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'end_date'], name='maint_contract_active_end_idx'),
+            # A user's active contracts (the list endpoint and the dashboard).
+            models.Index(fields=['user', 'end_date'], name='maint_contract_user_active_idx',
+                         condition=models.Q(is_active=True)),
+        ]
     
     def __str__(self):
         return f"قرارداد {self.package.name} برای {self.user.phone_number}"
@@ -167,13 +306,9 @@ class MaintenanceContract(models.Model):
     def save(self, *args, **kwargs):
         # محاسبه خودکار end_date بر اساس نوع پکیج
         if not self.pk:
-            if self.package.package_type == 'basic':
-                self.end_date = self.start_date + timedelta(days=365)
-            elif self.package.package_type == 'standard':
-                self.end_date = self.start_date + timedelta(days=730)  # 2 سال
-            else:
-                self.end_date = self.start_date + timedelta(days=1095)  # 3 سال
-        super().save(*args, **kwargs)
+            self.end_date = self.start_date + timedelta(days=contract_duration_days(self.package.package_type))
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     @property
     def days_remaining(self):
@@ -199,6 +334,15 @@ class InsuranceContract(models.Model):
     elevator_count = models.IntegerField()
     coverage_level = models.CharField(max_length=50)  # مثلاً 'پایه', 'متوسط', 'کامل'
     created_at = models.DateTimeField(auto_now_add=True)
+    renewal_of = models.OneToOneField('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='renewal')
+    renewal_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'end_date'], name='ins_contract_active_end_idx'),
+            models.Index(fields=['user', 'end_date'], name='ins_contract_user_active_idx',
+                         condition=models.Q(is_active=True)),
+        ]
     
     def __str__(self):
         return f"بیمه {self.insurance_type.name} برای {self.user.phone_number}"
@@ -206,10 +350,240 @@ class InsuranceContract(models.Model):
     def save(self, *args, **kwargs):
         # محاسبه خودکار end_date (فرضاً ۱ سال)
         if not self.pk:
-            self.end_date = self.start_date + timedelta(days=365)
-        super().save(*args, **kwargs)
+            self.end_date = self.start_date + timedelta(days=INSURANCE_DURATION_DAYS)
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     @property
     def days_remaining(self):
         return (self.end_date - date.today()).days if self.is_active else 0
-# Rest of your models (User, TechnicianProfile, ServiceRequest, etc.)...
\ No newline at end of file
+
+
+class ContractRenewalReminder(models.Model):
+    """Reminder that a contract is about to expire, one per contract."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='renewal_reminders')
+    maintenance_contract = models.ForeignKey(MaintenanceContract, on_delete=models.CASCADE, null=True, blank=True,
+                                             related_name='renewal_reminders')
+    insurance_contract = models.ForeignKey(InsuranceContract, on_delete=models.CASCADE, null=True, blank=True,
+                                           related_name='renewal_reminders')
+    end_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['maintenance_contract'], name='unique_maintenance_renewal_reminder'),
+            models.UniqueConstraint(fields=['insurance_contract'], name='unique_insurance_renewal_reminder'),
+        ]
+
+    def __str__(self):
+        return f"Renewal reminder for {self.user_id} ({self.end_date})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response for a client-supplied ``Idempotency-Key`` header."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+    @property
+    def is_completed(self):
+        return self.status_code is not None
+
+
+class UserDashboard(models.Model):
+    """Denormalized home-screen counters, kept in step by api.dashboard."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='dashboard')
+    open_requests = models.IntegerField(default=0)
+    awaiting_payment = models.IntegerField(default=0)
+    active_contracts = models.IntegerField(default=0)
+    insurance_expiring_soon = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard of {self.user_id}"
+
+
+class RequestEvent(models.Model):
+    """Append-only log of request transitions, the source of truth for the analytics rollups."""
+    KIND_CHOICES = (
+        ('created', 'Created'),
+        ('assigned', 'Assigned'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+        ('paid', 'Paid'),
+        ('rated', 'Rated'),
+    )
+    # بدون ForeignKey تا بایگانی یا حذف درخواست تاریخچه را پاک نکند
+    request_id = models.BigIntegerField(db_index=True)
+    technician_id = models.BigIntegerField(null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    discount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    rating = models.IntegerField(null=True, blank=True)
+    occurred_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.request_id}"
+
+
+class RequestStatsBase(models.Model):
+    day = models.DateField()
+    created_count = models.IntegerField(default=0)
+    assigned_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class DailyRequestStats(RequestStatsBase):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='unique_daily_request_stats_day'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.day}"
+
+
+class TechnicianDailyStats(RequestStatsBase):
+    technician = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['technician', 'day'], name='unique_technician_daily_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='tech_daily_stats_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.technician_id} on {self.day}"
+
+
+def normalize_discount_code(code):
+    return (code or '').strip().upper()
+
+
+class DiscountCode(models.Model):
+    KIND_CHOICES = (
+        ('percent', 'درصدی'),
+        ('fixed', 'مبلغ ثابت'),
+    )
+
+    code = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='percent')
+    # درصد (برای نوع درصدی) یا مبلغ تخفیف (برای نوع ثابت)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    max_discount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    max_uses = models.PositiveIntegerField(null=True, blank=True)
+    max_uses_per_user = models.PositiveIntegerField(default=1)
+    used_count = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        self.code = normalize_discount_code(self.code)
+        super().save(*args, **kwargs)
+
+
+class DiscountRedemption(models.Model):
+    discount_code = models.ForeignKey(DiscountCode, on_delete=models.PROTECT, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='discount_redemptions')
+    # با آرشیو شدن درخواست، سابقه استفاده از کد باید بماند
+    request = models.OneToOneField(ServiceRequest, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='discount_redemption')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['discount_code', 'user'], name='discount_redemption_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.discount_code_id} by {self.user_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """Rows of an import file already committed, so ``import_data`` can resume."""
+    key = models.CharField(max_length=255, unique=True)
+    rows_done = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.rows_done}"
+
+
+class ArchivedServiceRequest(models.Model):
+    """
+    Closed (paid/cancelled) request moved out of the hot ``ServiceRequest``
+    table by ``archive_requests``. Keeps the original id and every column.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, related_name='archived_customer_requests', on_delete=models.CASCADE)
+    technician = models.ForeignKey(User, related_name='archived_technician_requests', on_delete=models.SET_NULL,
+                                   null=True, blank=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    address = models.TextField()
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    cancel_reason = models.TextField(blank=True, null=True)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_code = models.CharField(max_length=50, blank=True, null=True)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payment_status = models.BooleanField(default=False)
+    rating = models.IntegerField(null=True, blank=True)
+    review = models.TextField(blank=True, null=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geo_cell = models.CharField(max_length=12, null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    maintenance_contract = models.ForeignKey('MaintenanceContract', related_name='archived_visits',
+                                             on_delete=models.SET_NULL, null=True, blank=True)
+    visit_date = models.DateField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedRequestAttachment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    request = models.ForeignKey(ArchivedServiceRequest, related_name='attachments', on_delete=models.CASCADE)
+    # همان فایل قبلی؛ فقط ردیف جابه‌جا می‌شود
+    file = models.FileField(upload_to='request_attachments/', storage=storage.blob_storage)
+    blob = models.ForeignKey(AttachmentBlob, related_name='archived_attachments', on_delete=models.PROTECT,
+                             null=True, blank=True)
+    uploaded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Attachment for archived request {self.request_id}"
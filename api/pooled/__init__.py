@@ -0,0 +1,236 @@
+"""
+In-process database connection pool.
+
+``api.pooled.sqlite3`` and ``api.pooled.postgresql`` are the stock Django
+backends whose ``get_new_connection``/``_close`` check connections out of and
+back into a process-wide ``Pool`` instead of opening and closing them. Keep
+``CONN_MAX_AGE`` at 0 so Django hands the connection back at the end of every
+request (or ASGI task); the next request gets it without a new handshake.
+
+Options go in a ``POOL`` dict on the DATABASES entry:
+
+    MIN_SIZE      idle connections kept open (default 2)
+    MAX_SIZE      hard cap on open connections; extra checkouts wait (default 10)
+    TIMEOUT       seconds to wait for a free connection before failing (default 10)
+    MAX_LIFETIME  seconds after which a connection is retired (default 1800)
+    CHECK_IDLE    a connection idle at least this long is pinged on checkout (default 1)
+
+Connections opened beyond ``MIN_SIZE`` under load are the overflow; they are
+closed when returned to a pool that already holds ``MIN_SIZE`` idle ones.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULTS = {'MIN_SIZE': 2, 'MAX_SIZE': 10, 'TIMEOUT': 10.0, 'MAX_LIFETIME': 1800.0, 'CHECK_IDLE': 1.0}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ('raw', 'created', 'returned')
+
+    def __init__(self, raw, now):
+        self.raw = raw
+        self.created = now
+        self.returned = now
+
+
+class Pool:
+    def __init__(self, options=None):
+        options = {**DEFAULTS, **(options or {})}
+        self.min_size = options['MIN_SIZE']
+        self.max_size = max(options['MAX_SIZE'], self.min_size, 1)
+        self.timeout = options['TIMEOUT']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.check_idle = options['CHECK_IDLE']
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._entries = {}  # id(raw) -> _Entry for every open connection
+        self._open = 0
+        self._in_use = 0
+        self.counters = dict.fromkeys((
+            'checkouts', 'waits', 'timeouts', 'opened', 'closed', 'overflow_closed', 'expired',
+            'health_check_failures',
+        ), 0)
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def checkout(self, connect, ping):
+        """Return an open raw connection; ``connect()`` opens a new one, ``ping(raw)`` checks one."""
+        started = time.monotonic()
+        while True:
+            entry = None
+            with self._cond:
+                waited = False
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()  # most recently used: warmest, least likely stale
+                        break
+                    if self._open < self.max_size:
+                        self._open += 1
+                        break
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(f"no free database connection after {self.timeout}s "
+                                          f"({self.max_size} in use)")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._in_use += 1
+                self.counters['checkouts'] += 1
+                if waited:
+                    wait = time.monotonic() - started
+                    self.counters['waits'] += 1
+                    self.wait_seconds_total += wait
+                    self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+            if entry is None:
+                try:
+                    raw = connect()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                now = time.monotonic()
+                with self._cond:
+                    self._entries[id(raw)] = _Entry(raw, now)
+                    self.counters['opened'] += 1
+                return raw
+
+            now = time.monotonic()
+            if now - entry.created > self.max_lifetime:
+                self._discard(entry, 'expired')
+                continue
+            if now - entry.returned >= self.check_idle and not ping(entry.raw):
+                self._discard(entry, 'health_check_failures')
+                continue
+            return entry.raw
+
+    def checkin(self, raw, reset):
+        """Take back ``raw``; ``reset(raw)`` must leave it with no open transaction."""
+        entry = self._entries.get(id(raw))
+        now = time.monotonic()
+        if entry is None:
+            # Opened before this pool existed (e.g. across a fork); just close it.
+            _close_quietly(raw)
+            return
+        if now - entry.created > self.max_lifetime:
+            self._discard(entry, 'expired')
+            return
+        try:
+            reset(raw)
+        except Exception:
+            self._discard(entry)
+            return
+        with self._cond:
+            if len(self._idle) >= self.min_size:
+                overflow = True
+            else:
+                overflow = False
+                entry.returned = now
+                self._idle.append(entry)
+                self._in_use -= 1
+                self._cond.notify()
+        if overflow:
+            self._discard(entry, 'overflow_closed')
+
+    def _release_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _discard(self, entry, reason=None):
+        _close_quietly(entry.raw)
+        with self._cond:
+            self._entries.pop(id(entry.raw), None)
+            self.counters['closed'] += 1
+            if reason:
+                self.counters[reason] += 1
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'overflow': max(0, self._open - self.min_size),
+                **self.counters,
+                'wait_ms_total': round(self.wait_seconds_total * 1000, 3),
+                'wait_ms_max': round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    # Keyed by database name too: the test runner repoints an alias at the test database.
+    key = (alias, str(settings_dict['NAME']))
+    pid = os.getpid()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != pid:
+            # A forked worker must not share its parent's sockets.
+            pool = _pools[key] = Pool(settings_dict.get('POOL'))
+        return pool
+
+
+def all_stats():
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [(alias, pool) for (alias, _), pool in _pools.items() if pool.pid == pid]
+    return {alias: pool.stats() for alias, pool in pools}
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixed into a backend's ``DatabaseWrapper`` to route connects/closes through the pool."""
+
+    def _connection_pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        try:
+            return self._connection_pool().checkout(lambda: connect(conn_params), _ping)
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._connection_pool().checkin(self.connection, _reset)
+
+
+def _ping(raw):
+    try:
+        cursor = raw.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+def _reset(raw):
+    raw.rollback()
@@ -0,0 +1,204 @@
+"""
+Price catalog and batch repricing of contracts.
+
+A ``Catalog`` holds everything a quote depends on besides the building: the
+maintenance base price, the surcharge per floor above ``floor_threshold``,
+the age, package and coverage multipliers, and overrides of insurance type
+base prices (without one, ``InsuranceType.base_price`` is used). The
+current catalog is the defaults below updated with ``PRICING_CATALOG``; a
+candidate is the current one with some values replaced (``with_changes``).
+
+``reprice`` reads active contracts in primary-key chunks with only the
+pricing columns (insurance base prices come in the same query) and prices
+each distinct combination of inputs in a chunk once, since many contracts
+share one. ``apply`` stores the new prices in ``renewal_price`` with one
+UPDATE per chunk (a CASE over the distinct prices); ``sweep_contracts``
+uses it for the draft renewal.
+"""
+import hashlib
+import json
+from collections import namedtuple
+from dataclasses import dataclass, field, fields, replace
+from datetime import date
+from decimal import Decimal
+from functools import cached_property
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, Value, When
+
+from . import listcache
+from .models import InsuranceContract, MaintenanceContract
+
+CENT = Decimal('0.01')
+CHUNK_SIZE = 2000
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def _decimal_map(values):
+    return {key: Decimal(str(value)) for key, value in values.items()}
+
+
+@dataclass(frozen=True)
+class Catalog:
+    maintenance_base_price: Decimal = Decimal('1000000')
+    floor_threshold: int = 10
+    floor_surcharge: Decimal = Decimal('50000')
+    maintenance_age_multipliers: dict = field(default_factory=lambda: _decimal_map({'5-15': '1.2', '15+': '1.5'}))
+    package_multipliers: dict = field(default_factory=lambda: _decimal_map({'standard': '1.5', 'premium': '2.0'}))
+    insurance_age_multipliers: dict = field(
+        default_factory=lambda: _decimal_map({'۵ تا ۱۵ سال': '1.2', 'بیشتر از ۱۵ سال': '1.5'}))
+    coverage_multipliers: dict = field(default_factory=lambda: _decimal_map({'متوسط': '1.5', 'کامل': '2.0'}))
+    # insurance type id -> base price replacing InsuranceType.base_price
+    insurance_base_prices: dict = field(default_factory=dict)
+
+    @classmethod
+    def current(cls):
+        return cls().with_changes(getattr(settings, 'PRICING_CATALOG', {}))
+
+    def with_changes(self, changes):
+        """
+        A copy with ``changes`` (JSON-style values) applied. Multiplier and
+        base price maps are merged key by key, so a change can name just the
+        entries it alters.
+        """
+        known = {item.name: item for item in fields(self)}
+        updates = {}
+        for name, value in (changes or {}).items():
+            if name not in known:
+                raise CatalogError(f"unknown catalog entry {name!r}")
+            try:
+                if name == 'floor_threshold':
+                    updates[name] = int(value)
+                elif name == 'insurance_base_prices':
+                    updates[name] = {**self.insurance_base_prices,
+                                     **{int(key): Decimal(str(price)) for key, price in value.items()}}
+                elif isinstance(getattr(self, name), dict):
+                    updates[name] = {**getattr(self, name), **_decimal_map(value)}
+                else:
+                    updates[name] = Decimal(str(value))
+            except (ArithmeticError, AttributeError, TypeError, ValueError):
+                raise CatalogError(f"invalid value for {name!r}") from None
+        return replace(self, **updates)
+
+    def as_dict(self):
+        return {item.name: getattr(self, item.name) for item in fields(self)}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True, default=str, ensure_ascii=False)
+
+    @cached_property
+    def version(self):
+        """Fingerprint of every value; equal catalogs have equal versions."""
+        return hashlib.sha256(self.to_json().encode()).hexdigest()[:16]
+
+
+def _building_price(base_price, catalog, floors, elevator_count):
+    if floors > catalog.floor_threshold:
+        base_price += (floors - catalog.floor_threshold) * catalog.floor_surcharge
+    return base_price * elevator_count
+
+
+def maintenance_price(catalog, package_type, floors, elevator_count, elevator_age):
+    price = _building_price(catalog.maintenance_base_price, catalog, floors, elevator_count)
+    price *= catalog.maintenance_age_multipliers.get(elevator_age, 1)
+    return price * catalog.package_multipliers.get(package_type, 1)
+
+
+def insurance_price(catalog, insurance_type_id, base_price, floors, elevator_count, elevator_age, coverage_level):
+    price = catalog.insurance_base_prices.get(insurance_type_id, base_price)
+    price = _building_price(price, catalog, floors, elevator_count)
+    price *= catalog.insurance_age_multipliers.get(elevator_age, 1)
+    return price * catalog.coverage_multipliers.get(coverage_level, 1)
+
+
+# kind -> (model, pricing columns after pk/user_id/price, price function)
+KINDS = {
+    'maintenance': (MaintenanceContract, ('package__package_type', 'building_floors', 'elevator_count',
+                                          'elevator_age'), maintenance_price),
+    'insurance': (InsuranceContract, ('insurance_type_id', 'insurance_type__base_price', 'building_floors',
+                                      'elevator_count', 'elevator_age', 'coverage_level'), insurance_price),
+}
+
+PriceChange = namedtuple('PriceChange', 'kind id user_id current_price new_price')
+REPORT_COLUMNS = ('kind', 'id', 'user_id', 'current_price', 'new_price', 'delta', 'delta_percent')
+
+
+def active_contracts(model, today=None):
+    return model.objects.filter(is_active=True, end_date__gte=today or date.today())
+
+
+def reprice(catalog, kinds=tuple(KINDS), chunk_size=CHUNK_SIZE, today=None):
+    """Yield (kind, [PriceChange, ...]) for each chunk of active contracts."""
+    for kind in kinds:
+        model, columns, price_of = KINDS[kind]
+        queryset = active_contracts(model, today).order_by('pk').values_list('pk', 'user_id', 'price', *columns)
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            prices = {}
+            changes = []
+            for pk, user_id, current_price, *inputs in rows:
+                key = tuple(inputs)
+                new_price = prices.get(key)
+                if new_price is None:
+                    new_price = prices[key] = price_of(catalog, *inputs).quantize(CENT)
+                changes.append(PriceChange(kind, pk, user_id, current_price, new_price))
+            yield kind, changes
+
+
+def apply(kind, changes):
+    """Store ``new_price`` as the contracts' ``renewal_price``; return how many rows were updated."""
+    if not changes:
+        return 0
+    by_price = {}
+    for change in changes:
+        by_price.setdefault(change.new_price, []).append(change.id)
+    model = KINDS[kind][0]
+    with transaction.atomic():
+        updated = model.objects.filter(pk__in=[change.id for change in changes]).update(renewal_price=Case(
+            *[When(pk__in=ids, then=Value(price)) for price, ids in by_price.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    listcache.bump({change.user_id for change in changes})
+    return updated
+
+
+def empty_summary():
+    return {'contracts': 0, 'changed': 0, 'increased': 0, 'decreased': 0,
+            'current_total': Decimal(0), 'new_total': Decimal(0)}
+
+
+def summarize(summary, changes):
+    for change in changes:
+        summary['contracts'] += 1
+        summary['current_total'] += change.current_price
+        summary['new_total'] += change.new_price
+        if change.new_price != change.current_price:
+            summary['changed'] += 1
+            summary['increased' if change.new_price > change.current_price else 'decreased'] += 1
+    return summary
+
+
+def report_row(change):
+    delta = change.new_price - change.current_price
+    percent = (delta * 100 / change.current_price).quantize(CENT) if change.current_price else None
+    return (change.kind, change.id, change.user_id, change.current_price, change.new_price, delta, percent)
+
+
+def run(catalog, kinds=tuple(KINDS), apply_prices=False, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """Reprice every active contract; return {kind: summary}. ``on_chunk(changes)`` sees each chunk."""
+    summaries = {kind: empty_summary() for kind in kinds}
+    for kind, changes in reprice(catalog, kinds, chunk_size):
+        summarize(summaries[kind], changes)
+        if apply_prices:
+            apply(kind, changes)
+        if on_chunk:
+            on_chunk(changes)
+    return summaries
@@ -0,0 +1,122 @@
+"""
+Memoized quote responses.
+
+A quote depends only on the building profile, the catalog (api.pricing) and
+the packages or insurance types on offer, so the whole response of the
+quote endpoints is kept in an in-process LRU keyed by the normalized profile
+and ``catalog_version()``. The version is the catalog fingerprint plus a
+generation counter in the list cache backend (api.listcache) that every
+write to a MaintenancePackage or InsuranceType bumps; entries under an old
+version age out of the LRU. Bulk writes that send no signals call
+``invalidate`` themselves.
+
+The counter only reaches other workers when ``CACHES['lists']`` is a shared
+backend; with the default local-memory one a write is seen by its own
+worker only. Entries therefore also expire after ``QUOTE_CACHE_TTL``
+seconds, which bounds how long any worker can quote a price that contract
+creation (which prices from the database) would no longer charge.
+
+Profiles are normalized before pricing, not only for the key: surrounding
+and repeated whitespace never changes a price, so two spellings that share
+an entry also share a price.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+
+from . import listcache, pricing
+from .lru import LRUCache
+from .models import InsuranceType, MaintenancePackage
+from .serializers import InsuranceTypeSerializer, MaintenancePackageSerializer
+
+CATALOG_SCOPE = 'quote-catalog'
+
+_memo = None
+
+
+def memo():
+    """The LRU of quote responses, built on first use so that QUOTE_CACHE_* settings apply."""
+    global _memo
+    if _memo is None:
+        _memo = LRUCache(maxsize=getattr(settings, 'QUOTE_CACHE_SIZE', 2048),
+                         ttl=getattr(settings, 'QUOTE_CACHE_TTL', 60))
+    return _memo
+
+
+@receiver(setting_changed, dispatch_uid='quote_memo_settings_changed')
+def reset_memo(setting, **kwargs):
+    global _memo
+    if setting in ('QUOTE_CACHE_SIZE', 'QUOTE_CACHE_TTL'):
+        _memo = None
+
+
+def _text(value):
+    return ' '.join(str(value).split())
+
+
+def normalize(data):
+    """(floors, elevator count, building type, elevator age, coverage level) of validated quote data."""
+    coverage_level = data.get('coverage_level')
+    return (
+        int(data['building_floors']),
+        int(data['elevator_count']),
+        _text(data['building_type']).casefold(),
+        _text(data['elevator_age']),
+        None if coverage_level is None else _text(coverage_level),
+    )
+
+
+def catalog_version(catalog):
+    generation = listcache.generations([CATALOG_SCOPE])[CATALOG_SCOPE]
+    return f'{catalog.version}:{generation}'
+
+
+def maintenance_quotes(data, catalog=None):
+    """[{'package': ..., 'price': ...}] for every package, for the building in ``data``."""
+    catalog = catalog or pricing.Catalog.current()
+    profile = floors, count, _, age, _ = normalize(data)
+
+    def compute():
+        return [
+            {'package': MaintenancePackageSerializer(package).data,
+             'price': pricing.maintenance_price(catalog, package.package_type, floors, count, age)}
+            for package in MaintenancePackage.objects.all()
+        ]
+
+    return memo().get_or_set(('maintenance', profile, catalog_version(catalog)), compute)
+
+
+def insurance_quotes(data, catalog=None):
+    """[{'insurance_type': ..., 'price': ...}] for every insurance type, for the building in ``data``."""
+    catalog = catalog or pricing.Catalog.current()
+    profile = floors, count, _, age, coverage_level = normalize(data)
+
+    def compute():
+        return [
+            {'insurance_type': InsuranceTypeSerializer(insurance_type).data,
+             'price': pricing.insurance_price(catalog, insurance_type.pk, insurance_type.base_price,
+                                              floors, count, age, coverage_level)}
+            for insurance_type in InsuranceType.objects.all()
+        ]
+
+    return memo().get_or_set(('insurance', profile, catalog_version(catalog)), compute)
+
+
+def stats():
+    return memo().stats()
+
+
+def invalidate():
+    """Retire every memoized quote once the transaction commits (other workers: see module docstring)."""
+    listcache.bump(scopes=[CATALOG_SCOPE])
+    transaction.on_commit(lambda: memo().clear())
+
+
+@receiver(post_save, sender=MaintenancePackage, dispatch_uid='quotes_package_saved')
+@receiver(post_delete, sender=MaintenancePackage, dispatch_uid='quotes_package_deleted')
+@receiver(post_save, sender=InsuranceType, dispatch_uid='quotes_insurance_type_saved')
+@receiver(post_delete, sender=InsuranceType, dispatch_uid='quotes_insurance_type_deleted')
+def on_catalog_changed(sender, **kwargs):
+    invalidate()
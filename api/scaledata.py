@@ -0,0 +1,425 @@
+"""
+Synthetic data at production volumes, for performance work.
+
+Rows are generated in fixed-size chunks, each from its own
+``random.Random`` seeded with (seed, table, chunk number), so the same seed
+and counts produce the same rows whatever the number of worker processes.
+Primary keys are allocated up front after the current maximum of each
+table, which lets a worker pick foreign keys (customers, technicians,
+requests) arithmetically without reading the database.
+
+Workers return tuples of values already adapted for the database; the
+parent process is the only writer and inserts each chunk with one
+``executemany`` in its own transaction. ``bulk_create`` is used for the
+few reference rows (packages, insurance types) only: for millions of rows,
+building a model instance per row costs more than generating the row.
+
+Every user gets the same password hash, computed once. Signals are not
+sent, so dashboards and rollups must be rebuilt afterwards
+(``rebuild_dashboards``, ``refresh_rollups``).
+"""
+import random
+from bisect import bisect
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import lru_cache
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import geo, quotes
+from .models import (
+    InsuranceContract, InsuranceType, MaintenanceContract, MaintenancePackage, RequestAttachment,
+    ServiceRequest, TechnicianProfile, User, contract_duration_days, INSURANCE_DURATION_DAYS,
+)
+
+PASSWORD = 'scale-data'
+TECHNICIAN_EVERY = 20  # every 20th generated user is a technician (5%)
+HISTORY_DAYS = 730
+# Tehran, where the requests and technician bases are scattered
+LATITUDES = (35.56, 35.82)
+LONGITUDES = (51.18, 51.62)
+
+# share of requests per status, close to a mature deployment where most work is paid for
+STATUS_WEIGHTS = (
+    ('submitted', 8), ('assigned', 5), ('in_progress', 4), ('completed', 8), ('paid', 60), ('cancelled', 15),
+)
+TECHNICIAN_STATUS_WEIGHTS = (('active', 80), ('pending_approval', 10), ('inactive', 7), ('rejected', 3))
+RATING_WEIGHTS = ((1, 3), (2, 4), (3, 13), (4, 35), (5, 45))
+
+TITLES = ('تعمیر آسانسور', 'سرویس دوره‌ای', 'گیر کردن کابین', 'صدای غیرعادی موتور', 'تعویض سیم بکسل',
+          'خرابی درب طبقه', 'ایراد تابلو فرمان', 'بازدید ایمنی')
+CANCEL_REASONS = ('مشکل برطرف شد', 'تکنسین دیر رسید', 'هزینه بالا', 'ثبت تکراری')
+FIRST_NAMES = ('علی', 'محمد', 'زهرا', 'فاطمه', 'حسین', 'مریم', 'رضا', 'سارا', 'مهدی', 'نرگس')
+LAST_NAMES = ('احمدی', 'محمدی', 'حسینی', 'رضایی', 'کریمی', 'موسوی', 'جعفری', 'صادقی', 'رحیمی', 'کاظمی')
+BUILDING_TYPES = ('residential', 'commercial', 'office')
+ELEVATOR_AGES = ('0-5', '5-15', '15+')
+INSURANCE_ELEVATOR_AGES = ('کمتر از ۵ سال', '۵ تا ۱۵ سال', 'بیشتر از ۱۵ سال')
+COVERAGE_LEVELS = ('پایه', 'متوسط', 'کامل')
+PACKAGES = (
+    ('پکیج پایه', 'basic', Decimal('1000000')),
+    ('پکیج استاندارد', 'standard', Decimal('1500000')),
+    ('پکیج ویژه', 'premium', Decimal('2000000')),
+)
+INSURANCE_TYPES = (('مسئولیت مدنی', Decimal('800000')), ('حوادث', Decimal('500000')))
+
+# Generated tables in dependency order, with the columns each generator fills (in order).
+TABLES = {
+    'users': (User, ('id', 'password', 'last_login', 'is_superuser', 'phone_number', 'first_name',
+                     'last_name', 'role', 'is_active', 'is_staff', 'created_at', 'updated_at')),
+    'technicians': (TechnicianProfile, ('user', 'bio', 'status', 'rating', 'base_latitude', 'base_longitude',
+                                        'service_radius_km')),
+    'requests': (ServiceRequest, ('id', 'customer', 'technician', 'title', 'description', 'address', 'status',
+                                  'created_at', 'updated_at', 'cancel_reason', 'final_price', 'discount_code',
+                                  'discount_amount', 'payment_status', 'rating', 'review', 'latitude',
+                                  'longitude', 'geo_cell', 'version')),
+    'attachments': (RequestAttachment, ('id', 'request', 'file', 'uploaded_at')),
+    'maintenance_contracts': (MaintenanceContract, ('id', 'user', 'package', 'start_date', 'end_date', 'price',
+                                                    'is_active', 'building_floors', 'building_type', 'elevator_age',
+                                                    'elevator_count', 'created_at', 'renewal_of')),
+    'insurance_contracts': (InsuranceContract, ('id', 'user', 'insurance_type', 'start_date', 'end_date', 'price',
+                                                'is_active', 'building_floors', 'building_type', 'elevator_age',
+                                                'elevator_count', 'coverage_level', 'created_at', 'renewal_of')),
+}
+
+# Everything a worker needs to generate any chunk; plain values so it pickles cheaply.
+Plan = namedtuple('Plan', (
+    'seed', 'now', 'counts', 'first_ids', 'password', 'packages', 'insurance_types', 'chunk_size',
+))
+
+
+class _Weighted:
+    """Draws from (value, weight) pairs with one random() and a bisect (random.choices is 3x slower)."""
+    def __init__(self, weights):
+        self.values = [value for value, _ in weights]
+        total = sum(weight for _, weight in weights)
+        self.bounds = list(accumulate(weight / total for _, weight in weights))[:-1]
+
+    def draw(self, rng):
+        return self.values[bisect(self.bounds, rng.random())]
+
+
+class _Adapt:
+    """
+    Database value adapters, looked up once per chunk rather than per row.
+    ``now`` is the plan's clock in the form ``datetime`` expects.
+    """
+    def __init__(self, plan):
+        ops = connection.ops
+        if connection.vendor == 'sqlite' and connection.timezone_name == 'UTC':
+            # SQLite stores naive UTC text; do the datetime math naive and skip the per-call checks.
+            self.now = plan.now.astimezone(dt_timezone.utc).replace(tzinfo=None)
+            self.datetime = str
+        else:
+            self.now = plan.now
+            self.datetime = ops.adapt_datetimefield_value
+        # few distinct values (days, whole-rial prices), so remembered
+        self.date = lru_cache(maxsize=None)(ops.adapt_datefield_value)
+        self.decimal = lru_cache(maxsize=None)(lambda value: ops.adapt_decimalfield_value(value, 12, 2))
+
+
+_ELEVATOR_COUNTS = _Weighted(((1, 3), (2, 2), (3, 1)))
+
+
+def _below(rng, n):
+    # int(random() * n) is uniform enough for test data and far cheaper than randrange
+    return int(rng.random() * n)
+
+
+def _user_id(plan, index):
+    return plan.first_ids['users'] + index
+
+
+def _customer_id(plan, rng):
+    users = plan.counts['users']
+    index = _below(rng, users)
+    if index % TECHNICIAN_EVERY == 0:
+        index = index + 1 if index + 1 < users else index - 1
+    return _user_id(plan, index)
+
+
+def _technician_id(plan, rng):
+    return _user_id(plan, _below(rng, plan.counts['technicians']) * TECHNICIAN_EVERY)
+
+
+def _moment(plan, rng, adapt, days=HISTORY_DAYS):
+    when = adapt.now - timedelta(seconds=rng.random() * days * 86400)
+    return when, adapt.datetime(when)
+
+
+def _users(plan, rng, start, stop, adapt):
+    rows = []
+    for index in range(start, stop):
+        pk = _user_id(plan, index)
+        created = _moment(plan, rng, adapt)[1]
+        rows.append((
+            pk, plan.password, None, False, f'08{pk:09d}', rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            'technician' if index % TECHNICIAN_EVERY == 0 else 'customer', rng.random() > 0.02, False,
+            created, created,
+        ))
+    return rows
+
+
+def _technicians(plan, rng, start, stop, adapt):
+    statuses = _Weighted(TECHNICIAN_STATUS_WEIGHTS)
+    rows = []
+    for index in range(start, stop):
+        rows.append((
+            _user_id(plan, index * TECHNICIAN_EVERY), None, statuses.draw(rng), round(rng.uniform(3.0, 5.0), 2),
+            rng.uniform(*LATITUDES), rng.uniform(*LONGITUDES), rng.choice((5.0, 10.0, 15.0, 20.0)),
+        ))
+    return rows
+
+
+def _requests(plan, rng, start, stop, adapt):
+    statuses, ratings = _Weighted(STATUS_WEIGHTS), _Weighted(RATING_WEIGHTS)
+    first_id = plan.first_ids['requests']
+    no_discount = adapt.decimal(Decimal(0))
+    rows = []
+    for index in range(start, stop):
+        status = statuses.draw(rng)
+        created, created_db = _moment(plan, rng, adapt)
+        if status == 'submitted':
+            updated_db = created_db
+        else:
+            updated_db = adapt.datetime(min(adapt.now, created + timedelta(hours=rng.random() * 72)))
+
+        technician_id = None
+        if status != 'submitted' and (status != 'cancelled' or rng.random() < 0.4):
+            technician_id = _technician_id(plan, rng)
+        final_price = discount_code = rating = review = cancel_reason = None
+        discount_amount = no_discount
+        if status == 'paid' or (status == 'completed' and rng.random() < 0.7):
+            price = (500 + _below(rng, 19500)) * 1000
+            final_price = adapt.decimal(Decimal(price))
+            if rng.random() < 0.08:
+                discount_code = 'WELCOME10'
+                discount_amount = adapt.decimal(Decimal(price // 10))
+        if status == 'paid' and rng.random() < 0.65:
+            rating = ratings.draw(rng)
+            if rng.random() < 0.3:
+                review = 'کار تمیز و به موقع' if rating >= 4 else 'تاخیر در انجام کار'
+        if status == 'cancelled':
+            cancel_reason = rng.choice(CANCEL_REASONS)
+        latitude = longitude = geo_cell = None
+        if rng.random() < 0.85:
+            latitude, longitude = rng.uniform(*LATITUDES), rng.uniform(*LONGITUDES)
+            geo_cell = geo.encode(latitude, longitude)
+
+        rows.append((
+            first_id + index, _customer_id(plan, rng), technician_id, rng.choice(TITLES), 'ثبت شده توسط داده آزمایشی',
+            f'تهران، خیابان {1 + _below(rng, 400)}، پلاک {1 + _below(rng, 200)}', status, created_db, updated_db,
+            cancel_reason, final_price, discount_code, discount_amount, status == 'paid', rating, review,
+            latitude, longitude, geo_cell, 1,
+        ))
+    return rows
+
+
+def _attachments(plan, rng, start, stop, adapt):
+    first_id, first_request = plan.first_ids['attachments'], plan.first_ids['requests']
+    rows = []
+    for index in range(start, stop):
+        request_id = first_request + _below(rng, plan.counts['requests'])
+        rows.append((first_id + index, request_id, f'request_attachments/scale/{request_id}-{index}.jpg',
+                     _moment(plan, rng, adapt)[1]))
+    return rows
+
+
+def _contract_terms(plan, rng, adapt, duration_days, base_price):
+    """start, end, price, is_active, floors, building type, elevator count of a contract."""
+    # started up to one term (and four months) ago, so a share has already expired
+    start = plan.now.date() - timedelta(days=_below(rng, duration_days + 120))
+    end = start + timedelta(days=duration_days)
+    elevator_count = _ELEVATOR_COUNTS.draw(rng)
+    return (adapt.date(start), adapt.date(end), adapt.decimal(base_price * elevator_count), end >= plan.now.date(),
+            2 + _below(rng, 23), rng.choice(BUILDING_TYPES), elevator_count)
+
+
+def _maintenance_contracts(plan, rng, start, stop, adapt):
+    first_id = plan.first_ids['maintenance_contracts']
+    rows = []
+    for index in range(start, stop):
+        package_id, package_type, base_price = rng.choice(plan.packages)
+        start_date, end_date, price, active, floors, building_type, elevator_count = _contract_terms(
+            plan, rng, adapt, contract_duration_days(package_type), base_price)
+        rows.append((
+            first_id + index, _customer_id(plan, rng), package_id, start_date, end_date, price, active, floors,
+            building_type, rng.choice(ELEVATOR_AGES), elevator_count, _moment(plan, rng, adapt)[1], None,
+        ))
+    return rows
+
+
+def _insurance_contracts(plan, rng, start, stop, adapt):
+    first_id = plan.first_ids['insurance_contracts']
+    rows = []
+    for index in range(start, stop):
+        type_id, base_price = rng.choice(plan.insurance_types)
+        start_date, end_date, price, active, floors, building_type, elevator_count = _contract_terms(
+            plan, rng, adapt, INSURANCE_DURATION_DAYS, base_price)
+        rows.append((
+            first_id + index, _customer_id(plan, rng), type_id, start_date, end_date, price, active, floors,
+            building_type, rng.choice(INSURANCE_ELEVATOR_AGES), elevator_count, rng.choice(COVERAGE_LEVELS),
+            _moment(plan, rng, adapt)[1], None,
+        ))
+    return rows
+
+
+GENERATORS = {
+    'users': _users, 'technicians': _technicians, 'requests': _requests, 'attachments': _attachments,
+    'maintenance_contracts': _maintenance_contracts, 'insurance_contracts': _insurance_contracts,
+}
+
+
+def generate_chunk(plan, table, chunk):
+    """Rows of chunk number ``chunk`` of ``table``; the same for the same plan, on any process."""
+    start = chunk * plan.chunk_size
+    stop = min(start + plan.chunk_size, plan.counts[table])
+    rng = random.Random(f'{plan.seed}:{table}:{chunk}')
+    return GENERATORS[table](plan, rng, start, stop, _Adapt(plan))
+
+
+def _generate_chunk(args):
+    return generate_chunk(*args)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _insert_sql(model, fields):
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    return 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns)),
+    )
+
+
+def _reference_rows():
+    """Ids (and what the generators need) of the packages and insurance types, creating a default set if empty."""
+    created = False
+    if not MaintenancePackage.objects.exists():
+        MaintenancePackage.objects.bulk_create([
+            MaintenancePackage(name=name, package_type=package_type, description='', base_price=price)
+            for name, package_type, price in PACKAGES
+        ])
+        created = True
+    if not InsuranceType.objects.exists():
+        InsuranceType.objects.bulk_create([
+            InsuranceType(name=name, base_price=price) for name, price in INSURANCE_TYPES
+        ])
+        created = True
+    if created:
+        quotes.invalidate()  # bulk_create sends no post_save
+    packages = tuple(MaintenancePackage.objects.order_by('pk').values_list('pk', 'package_type', 'base_price'))
+    insurance_types = tuple(InsuranceType.objects.order_by('pk').values_list('pk', 'base_price'))
+    return packages, insurance_types
+
+
+def make_plan(counts, seed=0, chunk_size=10000, now=None):
+    """Allocate primary keys for ``counts`` ({table: rows}) after what the database already holds."""
+    counts = {table: counts.get(table, 0) for table in TABLES if table != 'technicians'}
+    counts['technicians'] = (counts['users'] + TECHNICIAN_EVERY - 1) // TECHNICIAN_EVERY
+    dependent = counts['requests'] or counts['maintenance_contracts'] or counts['insurance_contracts']
+    if dependent and counts['users'] < 2:
+        raise ValueError('requests and contracts need at least 2 generated users')
+    if counts['attachments'] and not counts['requests']:
+        raise ValueError('attachments need generated requests')
+    first_ids = {}
+    for table, (model, _) in TABLES.items():
+        if model is not TechnicianProfile:
+            first_ids[table] = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    packages, insurance_types = _reference_rows()
+    # A fixed salt, so the hash (and every generated row) depends on the seed only.
+    password = make_password(PASSWORD, salt=f'scaledata{seed}')
+    now = (now or timezone.now()).replace(microsecond=0)
+    return Plan(seed, now, counts, first_ids, password, packages, insurance_types, chunk_size)
+
+
+@contextmanager
+def _deferred_indexes(models):
+    """
+    Drop the non-unique indexes Django declares on ``models`` and rebuild
+    them on exit: one sorted build is much cheaper than keeping four indexes
+    up to date through millions of random-order inserts.
+    """
+    dropped = []
+    with connection.schema_editor() as editor, connection.cursor() as cursor:
+        for model in models:
+            existing = {name for name, info in connection.introspection.get_constraints(
+                cursor, model._meta.db_table).items() if info['index'] and not info['unique']}
+            # (private schema editor API, the same calls migrations make)
+            for statement in editor._model_indexes_sql(model):
+                name = str(statement.parts['name']).strip('"`')
+                if name in existing:
+                    editor.execute(editor._delete_index_sql(model, name))
+                    dropped.append(statement)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for statement in dropped:
+                editor.execute(statement)
+
+
+def _generated(executor, tasks, ahead):
+    """Results of ``tasks`` in order, keeping at most ``ahead`` chunks in flight (bounded memory)."""
+    if executor is None:
+        yield from map(_generate_chunk, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(_generate_chunk, task))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def run(plan, workers=0, progress=None, defer_indexes=True):
+    """
+    Generate and insert every table of ``plan``, chunk by chunk; chunks are
+    generated on ``workers`` processes (inline when 0) while the parent
+    inserts the previous ones. ``progress(table, done, total)`` is called as
+    each table starts and after every chunk. Returns {table: rows inserted}.
+    """
+    models = [model for table, (model, _) in TABLES.items() if plan.counts[table]]
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker) if workers else None
+    inserted = {}
+    try:
+        with (_deferred_indexes(models) if defer_indexes else nullcontext()), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # a page cache big enough for the PK and unique indexes being appended to
+                cursor.execute('PRAGMA cache_size = -262144')
+            for table, (model, fields) in TABLES.items():
+                total = plan.counts[table]
+                if not total:
+                    continue
+                sql = _insert_sql(model, fields)
+                tasks = [(plan, table, chunk) for chunk in range(-(-total // plan.chunk_size))]
+                done = 0
+                if progress:
+                    progress(table, done, total)
+                for rows in _generated(executor, tasks, ahead=2 * max(workers, 1)):
+                    with transaction.atomic():
+                        cursor.executemany(sql, rows)
+                    done += len(rows)
+                    if progress:
+                        progress(table, done, total)
+                inserted[table] = done
+            if connection.vendor == 'sqlite':
+                cursor.execute('PRAGMA cache_size = -2000')  # SQLite's default
+            # Explicit ids leave sequence-based backends (PostgreSQL) behind; no-op on SQLite.
+            for statement in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(statement)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return inserted
@@ -0,0 +1,138 @@
+"""
+Prebuilt OpenAPI schema.
+
+``build_schema`` renders the schema once (YAML and JSON) into
+``SCHEMA_ARTIFACT_DIR`` together with a fingerprint of everything the schema
+is generated from: the URL patterns, the modules of their views, the modules
+in ``SCHEMA_FINGERPRINT_MODULES`` and the spectacular settings. The schema
+views only ever read that artifact. The ``api.W001`` system check warns when
+it is missing, and ``api.W002`` (``check --deploy`` only, as it re-reads the
+code) when it was built from different code. Views take
+``extend_schema`` from here, which is a no-op in settings without
+drf_spectacular so lean workers never import it.
+"""
+import hashlib
+import json
+import os
+import sys
+from importlib import import_module
+
+from django.conf import settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+FORMATS = ('yaml', 'json')
+CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+    'json': 'application/vnd.oai.openapi+json; charset=utf-8',
+}
+META_FILE = 'openapi.meta.json'
+
+
+def docs_enabled():
+    return 'drf_spectacular' in settings.INSTALLED_APPS
+
+
+if docs_enabled():
+    from drf_spectacular.utils import extend_schema
+else:
+    def extend_schema(*args, **kwargs):
+        """No-op stand-in when drf_spectacular is not installed (lean API workers)."""
+        return lambda target: target
+
+
+def artifact_dir():
+    return str(getattr(settings, 'SCHEMA_ARTIFACT_DIR', os.path.join(settings.BASE_DIR, 'build', 'schema')))
+
+
+def artifact_path(file_format):
+    return os.path.join(artifact_dir(), f'openapi.{file_format}')
+
+
+def _walk(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route, pattern.callback
+
+
+def fingerprint():
+    """Hash of the inputs the schema is generated from."""
+    import drf_spectacular
+
+    digest = hashlib.sha256()
+    digest.update(drf_spectacular.__version__.encode())
+    digest.update(json.dumps(getattr(settings, 'SPECTACULAR_SETTINGS', {}), sort_keys=True, default=str).encode())
+    modules = set(getattr(settings, 'SCHEMA_FINGERPRINT_MODULES', ('api.serializers', 'api.models')))
+    for route, callback in _walk(get_resolver().url_patterns):
+        view = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None) or callback
+        modules.add(view.__module__)
+        digest.update(f'{route} {view.__module__}.{view.__qualname__}\n'.encode())
+    for name in sorted(modules):
+        module = sys.modules.get(name) or import_module(name)
+        path = getattr(module, '__file__', None)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+def build():
+    """Generate the schema and write the artifact; returns the fingerprint."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+    if not docs_enabled():
+        raise RuntimeError('drf_spectacular is not installed in these settings; build the schema '
+                           'with the full settings so the view annotations are included.')
+    current = fingerprint()
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    rendered = {
+        'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+        'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+    os.makedirs(artifact_dir(), exist_ok=True)
+    for file_format, content in rendered.items():
+        _write(artifact_path(file_format), content)
+    _write(os.path.join(artifact_dir(), META_FILE), json.dumps({
+        'fingerprint': current,
+        'version': schema.get('info', {}).get('version'),
+    }).encode())
+    _loaded.clear()
+    return current
+
+
+def _write(path, content):
+    # Written next to the target and renamed, so readers never see half a file.
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as target:
+        target.write(content)
+    os.replace(tmp, path)
+
+
+def built_fingerprint():
+    try:
+        with open(os.path.join(artifact_dir(), META_FILE)) as meta:
+            return json.load(meta)['fingerprint']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_loaded = {}
+
+
+def load(file_format):
+    """Return (content, etag) of the artifact, or None if it has not been built."""
+    path = artifact_path(file_format)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _loaded.get(file_format)
+    if cached is None or cached[0] != (path, mtime):
+        with open(path, 'rb') as source:
+            content = source.read()
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest()[:32])
+        cached = _loaded[file_format] = ((path, mtime), content, etag)
+    return cached[1], cached[2]
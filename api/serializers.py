@@ -1,9 +1,11 @@
-from decimal import Decimal
+from datetime import date, timedelta
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import InsuranceContract, InsuranceType, RequestAttachment, ServiceRequest, MaintenancePackage, MaintenanceContract
+from . import batch, discounts, geo, pricing, transitions
+from .models import ArchivedServiceRequest, InsuranceContract, InsuranceType, RequestAttachment, ServiceRequest, MaintenancePackage, MaintenanceContract, UserDashboard
 
 User = get_user_model()
 
@@ -49,12 +51,24 @@ class ServiceRequestCreateSerializer(serializers.ModelSerializer):
         required=False
     )
     
+    latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    
     class Meta:
         model = ServiceRequest
-        fields = ('title', 'description', 'address', 'attachments')
+        fields = ('title', 'description', 'address', 'latitude', 'longitude', 'attachments')
+    
+    def validate(self, data):
+        if ('latitude' in data) != ('longitude' in data):
+            raise ValidationError("عرض و طول جغرافیایی باید با هم ارسال شوند.")
+        return data
     
     def create(self, validated_data):
         attachments = validated_data.pop('attachments', [])
+        if 'latitude' not in validated_data:
+            coordinates = geo.get_geocoder().geocode(validated_data.get('address'))
+            if coordinates:
+                validated_data['latitude'], validated_data['longitude'] = coordinates
         request = super().create(validated_data)
         
         # ذخیره فایل‌های پیوست
@@ -76,19 +90,29 @@ class ServiceRequestSerializer(serializers.ModelSerializer):
         model = ServiceRequest
         fields = ('id', 'customer', 'technician', 'title', 'description', 'address',
                  'status', 'created_at', 'updated_at', 'cancel_reason', 'final_price',
-                 'discount_code', 'discount_amount', 'payment_status', 'rating', 'review')
+                 'discount_code', 'discount_amount', 'payment_status', 'rating', 'review', 'version',
+                 'maintenance_contract', 'visit_date')
+        # Status, payment, pricing and rating only change through their actions (transitions.perform).
+        read_only_fields = ('version', 'maintenance_contract', 'visit_date', 'status', 'cancel_reason',
+                            'discount_code', 'discount_amount', 'payment_status', 'rating', 'review')
     
     def get_final_price(self, obj):
         return float(obj.final_price) if obj.final_price else 0.0
     
 
+class ArchivedServiceRequestSerializer(ServiceRequestSerializer):
+    class Meta:
+        model = ArchivedServiceRequest
+        fields = ServiceRequestSerializer.Meta.fields + ('archived_at',)
+
+
 class ServiceRequestStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
         fields = ['status']
     
     def validate_status(self, value):
-        valid_statuses = ['assigned', 'in_progress', 'completed', 'cancelled']
+        valid_statuses = list(transitions.STATUS_ACTIONS)
         if value not in valid_statuses:
             raise ValidationError(
                 f"وضعیت نامعتبر است. وضعیت‌های مجاز: {', '.join(valid_statuses)}"
@@ -96,19 +120,40 @@ class ServiceRequestStatusUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
+class BulkRequestIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        # Read per call, not at import, so BULK_MAX_IDS changes apply.
+        limit = getattr(settings, 'BULK_MAX_IDS', 5000)
+        if len(value) > limit:
+            raise ValidationError(f"حداکثر {limit} شناسه در هر درخواست مجاز است.")
+        return value
+
+
+class BulkStatusUpdateSerializer(BulkRequestIdsSerializer):
+    status = serializers.ChoiceField(choices=list(transitions.STATUS_ACTIONS))
+
+
+class BulkCancelSerializer(BulkRequestIdsSerializer):
+    cancel_reason = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BulkResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    result = serializers.ChoiceField(choices=('ok', 'not_found', 'forbidden', 'invalid', 'conflict'))
+    detail = serializers.CharField(allow_null=True)
+
+
+class BulkResponseSerializer(serializers.Serializer):
+    updated = serializers.IntegerField()
+    results = BulkResultSerializer(many=True)
+
+
 class ServiceRequestCancelSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
         fields = ['cancel_reason']
-    
-    def validate(self, data):
-        request = self.context.get('request')
-        service_request = self.instance
-        
-        if not service_request.can_cancel(request.user):
-            raise ValidationError("شما نمی‌توانید این درخواست را لغو کنید.")
-        
-        return data
 
 
 class ServiceRequestPriceSerializer(serializers.ModelSerializer):
@@ -126,22 +171,18 @@ class ServiceRequestDiscountSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
         fields = ['discount_code']
+        extra_kwargs = {'discount_code': {'required': True, 'allow_null': False, 'allow_blank': False}}
     
-    def validate(self, data):
-        # در اینجا می‌توانید منطق اعتبارسنجی کد تخفیف را اضافه کنید
-        return data
+    def validate_discount_code(self, value):
+        if discounts.get_rule(value) is None:
+            raise ValidationError("کد تخفیف نامعتبر است.")
+        return value
 
 
 class ServiceRequestPaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
         fields = []
-    
-    def validate(self, data):
-        service_request = self.instance
-        if not service_request.can_pay(self.context['request'].user):
-            raise ValidationError("شما نمی‌توانید این درخواست را پرداخت کنید.")
-        return data
 
 
 class ServiceRequestRatingSerializer(serializers.ModelSerializer):
@@ -154,12 +195,6 @@ class ServiceRequestRatingSerializer(serializers.ModelSerializer):
             raise ValidationError("امتیاز باید بین 1 تا 5 باشد.")
         return value
     
-    def validate(self, data):
-        service_request = self.instance
-        if not service_request.can_rate(self.context['request'].user):
-            raise ValidationError("شما نمی‌توانید به این درخواست امتیاز دهید.")
-        return data
-    
 
 class MaintenancePackageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -174,6 +209,7 @@ class MaintenanceContractSerializer(serializers.ModelSerializer):
     class Meta:
         model = MaintenanceContract
         fields = '__all__'
+        read_only_fields = ('renewal_price',)
     
     def get_days_remaining(self, obj):
         return obj.days_remaining
@@ -185,34 +221,10 @@ class QuoteRequestSerializer(serializers.Serializer):
     elevator_age = serializers.CharField(max_length=50)
     elevator_count = serializers.IntegerField(min_value=1)
     
-    def calculate_price(self, package_type):
-        # منطق قیمت‌دهی بر اساس پارامترهای ورودی
-        floors = self.validated_data['building_floors']
-        elevator_count = self.validated_data['elevator_count']
-        age = self.validated_data['elevator_age']
-        
-        base_price = 1000000  # قیمت پایه
-        
-        # محاسبه بر اساس تعداد طبقات
-        if floors > 10:
-            base_price += (floors - 10) * 50000
-        
-        # محاسبه بر اساس تعداد آسانسورها
-        base_price *= elevator_count
-        
-        # محاسبه بر اساس عمر آسانسور
-        if age == '5-15':
-            base_price *= 1.2
-        elif age == '15+':
-            base_price *= 1.5
-        
-        # اعمال ضریب بر اساس نوع پکیج
-        if package_type == 'standard':
-            base_price *= 1.5
-        elif package_type == 'premium':
-            base_price *= 2.0
-        
-        return base_price
+    def calculate_price(self, package_type, catalog=None):
+        data = self.validated_data
+        return pricing.maintenance_price(catalog or pricing.Catalog.current(), package_type,
+                                         data['building_floors'], data['elevator_count'], data['elevator_age'])
 
 
 class RequestAttachmentSerializer(serializers.ModelSerializer):
@@ -231,6 +243,7 @@ class InsuranceContractSerializer(serializers.ModelSerializer):
     class Meta:
         model = InsuranceContract
         fields = '__all__'
+        read_only_fields = ('renewal_price',)
     
     def get_days_remaining(self, obj):
         return obj.days_remaining
@@ -242,39 +255,15 @@ class InsuranceQuoteSerializer(serializers.Serializer):
     elevator_count = serializers.IntegerField(min_value=1)
     coverage_level = serializers.CharField(max_length=50)  # 'پایه', 'متوسط', 'کامل'
     
-    def calculate_price(self, insurance_type_name):
-        # منطق محاسبه قیمت (شبیه به QuoteRequestSerializer)
-        floors = self.validated_data['building_floors']
-        elevator_count = self.validated_data['elevator_count']
-        age = self.validated_data['elevator_age']
-        coverage = self.validated_data['coverage_level']
-        
+    def calculate_price(self, insurance_type_name, catalog=None):
+        data = self.validated_data
         try:
             insurance_type = InsuranceType.objects.get(name=insurance_type_name)
-            base_price = insurance_type.base_price
         except InsuranceType.DoesNotExist:
             raise ValidationError("نوع بیمه نامعتبر است.")
-        
-        # محاسبه بر اساس تعداد طبقات
-        if floors > 10:
-            base_price += (floors - 10) * Decimal('50000')
-        
-        # محاسبه بر اساس تعداد آسانسورها
-        base_price *= elevator_count
-        
-        # محاسبه بر اساس عمر آسانسور
-        if age == '۵ تا ۱۵ سال':
-            base_price *= Decimal('1.2')
-        elif age == 'بیشتر از ۱۵ سال':
-            base_price *= Decimal('1.5')
-        
-        # محاسبه بر اساس سطح پوشش
-        if coverage == 'متوسط':
-            base_price *= Decimal('1.5')
-        elif coverage == 'کامل':
-            base_price *= Decimal('2.0')
-        
-        return base_price
+        return pricing.insurance_price(catalog or pricing.Catalog.current(), insurance_type.pk,
+                                       insurance_type.base_price, data['building_floors'], data['elevator_count'],
+                                       data['elevator_age'], data['coverage_level'])
 
 class InsuranceCreateSerializer(serializers.ModelSerializer):
     insurance_type = serializers.PrimaryKeyRelatedField(queryset=InsuranceType.objects.all())
@@ -289,4 +278,104 @@ class InsuranceCreateSerializer(serializers.ModelSerializer):
         price = quote_serializer.calculate_price(validated_data['insurance_type'].name)
         validated_data['price'] = price
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class UserDashboardSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserDashboard
+        fields = ('open_requests', 'awaiting_payment', 'active_contracts', 'insurance_expiring_soon', 'updated_at')
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    GROUP_BY_CHOICES = ('day', 'week', 'month', 'technician')
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES, default='day')
+
+    def validate(self, data):
+        end = data.get('end') or date.today()
+        start = data.get('start') or end - timedelta(days=30)
+        if start > end:
+            raise ValidationError("تاریخ شروع باید قبل از تاریخ پایان باشد.")
+        data['start'], data['end'] = start, end
+        return data
+
+
+class NearbyRequestsQuerySerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    radius_km = serializers.FloatField(min_value=0.1, max_value=100, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
+    def validate(self, data):
+        if ('latitude' in data) != ('longitude' in data):
+            raise ValidationError("عرض و طول جغرافیایی باید با هم ارسال شوند.")
+        return data
+
+
+class NearbyRequestSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    status = serializers.CharField()
+    customer_id = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+    address = serializers.CharField()
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    distance_km = serializers.FloatField()
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=('csv', 'jsonl'), default='csv')
+    gzip = serializers.BooleanField(default=False)
+
+
+class RepriceRequestSerializer(serializers.Serializer):
+    catalog = serializers.DictField(required=False, default=dict,
+                                    help_text="Catalog entries to change, e.g. {\"insurance_base_prices\": {\"3\": 2500000}}.")
+    kinds = serializers.MultipleChoiceField(choices=tuple(pricing.KINDS), required=False)
+    apply = serializers.BooleanField(default=False)
+    report = serializers.BooleanField(default=False)
+
+    def validate_catalog(self, value):
+        try:
+            return pricing.Catalog.current().with_changes(value)
+        except pricing.CatalogError as exc:
+            raise ValidationError(f"کاتالوگ قیمت نامعتبر است: {exc}")
+
+    def validate(self, data):
+        if data['apply'] and data['report']:
+            raise ValidationError("گزارش ردیف‌به‌ردیف فقط در اجرای آزمایشی (بدون apply) ارسال می‌شود.")
+        kinds = data.get('kinds') or pricing.KINDS
+        data['kinds'] = [kind for kind in pricing.KINDS if kind in kinds]
+        return data
+
+
+class BatchItemSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, max_length=64)
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    path = serializers.RegexField(r'^/', max_length=2048)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    requests = serializers.ListField(child=BatchItemSerializer(), allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        # Read per call, not at import, so BATCH_MAX_REQUESTS changes apply.
+        limit = batch.max_requests()
+        if len(value) > limit:
+            raise ValidationError(f"حداکثر {limit} درخواست در هر دسته مجاز است.")
+        return value
+
+
+class BatchResultSerializer(serializers.Serializer):
+    id = serializers.CharField(allow_null=True)
+    status = serializers.IntegerField()
+    headers = serializers.DictField(child=serializers.CharField())
+    body = serializers.JSONField()
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    responses = BatchResultSerializer(many=True)
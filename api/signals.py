@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+from django.dispatch import Signal
+
+# One entry per ServiceRequest whose status or technician changed.
+# from_status is None for a newly created request, to_status is None for a deleted one.
+RequestStatusChange = namedtuple('RequestStatusChange', [
+    'request_id', 'customer_id', 'technician_id', 'previous_technician_id', 'from_status', 'to_status',
+])
+
+# Sent inside the writing transaction with ``changes``: a list of RequestStatusChange.
+# Receivers must be cheap and set-based since bulk operations send many changes at once.
+request_status_changed = Signal()
+
+# Sent with ``instance`` after a customer rates a paid ServiceRequest.
+request_rated = Signal()
+
+# Sent inside the writing transaction after each applied transition with ``action``,
+# ``from_status``, ``to_status``, ``user`` and ``request_ids``; ``instance`` is the
+# request for single transitions and None for ``transitions.perform_many``.
+request_transitioned = Signal()
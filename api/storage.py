@@ -0,0 +1,100 @@
+"""
+Content-addressed file storage for request attachments.
+
+An upload is hashed (SHA-256) while it is streamed to a temporary file,
+which is then renamed to ``blobs/<aa>/<bb>/<digest><ext>``. The same bytes
+uploaded again end up at the same name, so the disk holds one copy however
+many attachments refer to it. The extension stays part of the name so that
+content types can still be guessed from it. Which rows use a blob is
+tracked in the database (``AttachmentBlob``, see api/blobstore.py); this
+module only deals with files. Names outside ``blobs/`` (files stored
+before this backend) are read and deleted as usual.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_DIR = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+_BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[0-9a-z]{1,10})?$')
+_EXTENSION = re.compile(r'^\.[0-9a-z]{1,10}$')
+
+
+def blob_name(sha256, original_name=''):
+    extension = os.path.splitext(original_name)[1].lower()
+    if not _EXTENSION.match(extension):
+        extension = ''
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def digest(name):
+    """SHA-256 encoded in a blob name, or None for a name this storage did not produce."""
+    match = _BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+
+def hash_file(path):
+    """(sha256, size) of the file at ``path``, read a chunk at a time."""
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the content hash in _save, so no "_abc123" suffixes.
+        return name
+
+    def _temporary(self):
+        directory = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, delete=False)
+
+    def _publish(self, temporary_path, name):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary_path, self.file_permissions_mode)
+        # A rename, even over an existing copy: the file is whole whenever it is visible.
+        os.replace(temporary_path, path)
+
+    def _save(self, name, content):
+        sha256 = hashlib.sha256()
+        with self._temporary() as temporary:
+            try:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                temporary.close()
+                os.unlink(temporary.name)
+                raise
+        name = blob_name(sha256.hexdigest(), name)
+        self._publish(temporary.name, name)
+        return name
+
+    def adopt(self, source_name, name):
+        """Make the existing file ``source_name`` available as blob ``name`` (hard link, else copy)."""
+        with self._temporary() as temporary:
+            pass
+        os.unlink(temporary.name)
+        try:
+            os.link(self.path(source_name), temporary.name)
+        except OSError:
+            shutil.copyfile(self.path(source_name), temporary.name)
+        self._publish(temporary.name, name)
+
+
+def blob_storage():
+    return attachment_storage
+
+
+attachment_storage = ContentAddressedStorage()
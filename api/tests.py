@@ -1,3 +1,111 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.checks.registry import registry
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import (
+    User, ServiceRequest, IdempotencyKey, MaintenancePackage, MaintenanceContract,
+    InsuranceType, InsuranceContract, ContractRenewalReminder, UserDashboard,
+    DailyRequestStats, RequestEvent, TechnicianDailyStats, TechnicianProfile, DiscountCode, DiscountRedemption,
+    ImportCheckpoint, ArchivedServiceRequest, ArchivedRequestAttachment, RequestAttachment, AttachmentBlob,
+)
+from . import (
+    archive, blobstore, checks, concurrency, dashboard, discounts, dispatch, export, geo, media, pooled, scaledata,
+    pricing, quotes, schema, serializers, signals, storage, transitions, visits,
+)
+
+
+class ServiceRequestTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            phone_number='09123456789',
+            password='testpass',
+            first_name='John',
+            last_name='Doe',
+            role='customer'
+        )
+        self.technician = User.objects.create_user(
+            phone_number='09123456780',
+            password='testpass',
+            first_name='Tech',
+            last_name='Nician',
+            role='technician'
+        )
+        self.admin = User.objects.create_superuser(
+            phone_number='09123456781',
+            password='adminpass',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.request = ServiceRequest.objects.create(
+            customer=self.customer,
+            title='Test Request',
+            description='Test Description',
+            address='Test Address',
+            status='submitted'
+        )
+
+    def test_customer_cancel_request(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('servicerequest-cancel', args=[self.request.id])
+        response = self.client.post(url, {'cancel_reason': 'No longer needed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.status, 'cancelled')
+        self.assertEqual(self.request.cancel_reason, 'No longer needed')
+
+    def test_technician_cancel_assigned_request(self):
+        self.request.technician = self.technician
+        self.request.status = 'assigned'
+        self.request.save()
+        
+        self.client.force_authenticate(user=self.technician)
+        url = reverse('servicerequest-cancel', args=[self.request.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admin_cancel_any_request(self):
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('servicerequest-cancel', args=[self.request.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cannot_cancel_completed_request(self):
+        self.request.status = 'completed'
+        self.request.save()
+        
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('servicerequest-cancel', args=[self.request.id])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 def test_technician_can_accept_request(self):
     self.client.force_authenticate(user=self.technician)
     url = reverse('servicerequest-accept', args=[self.request.id])
@@ -26,4 +134,1525 @@ def test_valid_status_transition(self):
     response = self.client.post(url, {'status': 'in_progress'})
     self.assertEqual(response.status_code, status.HTTP_200_OK)
     self.request.refresh_from_db()
-    self.assertEqual(self.request.status, 'in_progress')
\ No newline at end of file
+    self.assertEqual(self.request.status, 'in_progress')
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            phone_number='09123456789',
+            password='testpass',
+            role='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+
+    def test_retried_create_returns_cached_response(self):
+        url = reverse('servicerequest-list')
+        data = {'title': 'Door stuck', 'description': 'Stuck on 3rd floor', 'address': 'Tehran'}
+        first = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY='abc-1')
+        second = self.client.post(url, data, HTTP_IDEMPOTENCY_KEY='abc-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+
+    def test_create_without_key_is_not_deduplicated(self):
+        url = reverse('servicerequest-list')
+        data = {'title': 'Door stuck', 'description': 'Stuck', 'address': 'Tehran'}
+        self.client.post(url, data)
+        self.client.post(url, data)
+        self.assertEqual(ServiceRequest.objects.count(), 2)
+
+    def test_retried_pay_does_not_run_twice(self):
+        service_request = ServiceRequest.objects.create(
+            customer=self.customer, title='T', description='D', address='A',
+            status='completed', final_price=500000
+        )
+        url = reverse('servicerequest-pay', args=[service_request.id])
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='pay-1')
+        second = self.client.post(url, HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['status'], 'paid')
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_key_reused_on_other_endpoint_is_rejected(self):
+        service_request = ServiceRequest.objects.create(
+            customer=self.customer, title='T', description='D', address='A',
+            status='completed', final_price=500000
+        )
+        self.client.post(reverse('servicerequest-list'),
+                         {'title': 'T', 'description': 'D', 'address': 'A'},
+                         HTTP_IDEMPOTENCY_KEY='shared')
+        response = self.client.post(reverse('servicerequest-pay', args=[service_request.id]),
+                                    HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        url = reverse('servicerequest-list')
+        self.client.post(url, {'title': 'T', 'description': 'D', 'address': 'A'}, HTTP_IDEMPOTENCY_KEY='body')
+        response = self.client.post(url, {'title': 'T', 'description': 'D', 'address': 'B'},
+                                    HTTP_IDEMPOTENCY_KEY='body')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(ServiceRequest.objects.count(), 1)
+
+class SweepContractsTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.package = MaintenancePackage.objects.create(
+            name='Basic', package_type='basic', description='', base_price=1000000
+        )
+        self.insurance_type = InsuranceType.objects.create(name='مسئولیت مدنی', base_price=2000000)
+
+    def _maintenance(self, end_date):
+        contract = MaintenanceContract.objects.create(
+            user=self.customer, package=self.package, start_date=date.today() - timedelta(days=300),
+            end_date=end_date, price=1000000, building_floors=5, building_type='residential',
+            elevator_age='0-5', elevator_count=1
+        )
+        MaintenanceContract.objects.filter(pk=contract.pk).update(end_date=end_date)
+        contract.refresh_from_db()
+        return contract
+
+    def test_expired_contracts_are_deactivated(self):
+        expired = self._maintenance(date.today() - timedelta(days=1))
+        current = self._maintenance(date.today() + timedelta(days=200))
+        call_command('sweep_contracts', batch_size=1, stdout=open('/dev/null', 'w'))
+        expired.refresh_from_db()
+        current.refresh_from_db()
+        self.assertFalse(expired.is_active)
+        self.assertTrue(current.is_active)
+
+    def test_expiring_contracts_get_one_reminder_and_draft(self):
+        expiring = self._maintenance(date.today() + timedelta(days=10))
+        insurance = InsuranceContract.objects.create(
+            user=self.customer, insurance_type=self.insurance_type, start_date=date.today() - timedelta(days=350),
+            end_date=date.today(), price=2000000, building_floors=5, building_type='مسکونی',
+            elevator_age='کمتر از ۵ سال', elevator_count=1, coverage_level='پایه'
+        )
+        for _ in range(2):
+            call_command('sweep_contracts', stdout=open('/dev/null', 'w'))
+
+        self.assertEqual(ContractRenewalReminder.objects.count(), 2)
+        draft = MaintenanceContract.objects.get(renewal_of=expiring)
+        self.assertFalse(draft.is_active)
+        self.assertEqual(draft.start_date, expiring.end_date)
+        self.assertEqual(draft.end_date, expiring.end_date + timedelta(days=365))
+        self.assertTrue(InsuranceContract.objects.filter(renewal_of=insurance, is_active=False).exists())
+
+
+class VisitGeneratorTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.today = date.today()
+
+    def _contract(self, package_type='basic', elevator_count=1, days_ago=10, is_active=True):
+        package, _ = MaintenancePackage.objects.get_or_create(
+            package_type=package_type, defaults={'name': package_type.title(), 'description': '', 'base_price': 1000})
+        return MaintenanceContract.objects.create(
+            user=self.customer, package=package, start_date=self.today - timedelta(days=days_ago),
+            end_date=self.today, price=1000, building_floors=5, building_type='residential',
+            elevator_age='0-5', elevator_count=elevator_count, is_active=is_active,
+        )
+
+    def test_calendar_spreads_elevator_groups_over_the_interval(self):
+        start = date(2026, 1, 1)
+        calendar = visits.visit_calendar('premium', 6, start, date(2026, 12, 31), start, date(2026, 1, 31))
+        self.assertEqual([(visit.date.day, visit.group) for visit in calendar],
+                         [(8, 0), (16, 1), (23, 0), (31, 1)])
+        # Never past the contract's end.
+        self.assertEqual(visits.visit_calendar('basic', 1, start, date(2026, 2, 1), start, date(2026, 12, 31)), [])
+
+    def test_generation_is_idempotent(self):
+        contract = self._contract()
+        self._contract(is_active=False)
+        self.assertEqual(visits.generate(self.today, horizon=60, every_contract=True), 1)
+        self.assertEqual(visits.generate(self.today, horizon=60, every_contract=True), 0)
+        visit = ServiceRequest.objects.get()
+        self.assertEqual((visit.maintenance_contract_id, visit.visit_date, visit.status),
+                         (contract.pk, self.today + timedelta(days=50), 'scheduled'))
+
+    def test_visits_wait_outside_the_pool_until_due(self):
+        self._contract()
+        technician = User.objects.create_user(phone_number='09123456780', password='x', role='technician')
+        visits.generate(self.today, horizon=60, every_contract=True)
+        visit = ServiceRequest.objects.get()
+        self.assertEqual(UserDashboard.objects.get(user=self.customer).open_requests, 0)
+        self.assertEqual(dispatch.load_requests(10), [])
+        client = APIClient()
+        client.force_authenticate(user=technician)
+        self.assertEqual(client.get(reverse('servicerequest-list')).data, [])
+        response = client.post(reverse('servicerequest-accept', args=[visit.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(visits.release_due(visit.visit_date - timedelta(days=1)), 0)
+        self.assertEqual(visits.release_due(visit.visit_date), 1)
+        visit.refresh_from_db()
+        self.assertEqual((visit.status, visit.version), ('submitted', 2))
+        self.assertEqual(UserDashboard.objects.get(user=self.customer).open_requests, 1)
+        self.assertEqual(client.post(reverse('servicerequest-accept', args=[visit.pk])).status_code, 200)
+
+    def test_generated_visits_reach_analytics_and_dashboard(self):
+        self._contract(package_type='premium', days_ago=15)
+        created = visits.generate(self.today, horizon=60, every_contract=True)
+        self.assertEqual(ServiceRequest.objects.filter(visit_date=self.today, status='submitted').count(), 1)
+        self.assertEqual(sorted(RequestEvent.objects.values_list('request_id', 'kind')),
+                         [(pk, 'created') for pk in ServiceRequest.objects.order_by('pk').values_list('pk', flat=True)])
+        self.assertEqual(DailyRequestStats.objects.get(day=timezone.localdate()).created_count, created)
+        self.assertEqual(UserDashboard.objects.get(user=self.customer).open_requests, 1)
+
+    def test_daily_run_handles_one_bucket(self):
+        contract = self._contract()
+        other_day = next(day for day in (self.today + timedelta(days=n) for n in range(7))
+                         if day.toordinal() % 7 != contract.pk % 7)
+        bucket_day = next(day for day in (self.today + timedelta(days=n) for n in range(7))
+                          if day.toordinal() % 7 == contract.pk % 7)
+        self.assertEqual(visits.generate(other_day, horizon=60, spread=7), 0)
+        out = io.StringIO()
+        call_command('generate_visits', '--date', bucket_day.isoformat(), '--horizon-days', '60', stdout=out)
+        self.assertIn('Created 1 visits for 1 contracts', out.getvalue())
+
+
+class RepricingTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(phone_number='09123456781', password='x')
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.package = MaintenancePackage.objects.create(name='Premium', package_type='premium', description='',
+                                                         base_price=1000000)
+        self.insurance_type = InsuranceType.objects.create(name='مسئولیت مدنی', base_price=2000000)
+        self.maintenance = MaintenanceContract.objects.create(
+            user=self.customer, package=self.package, start_date=date.today() - timedelta(days=1080),
+            end_date=date.today(), price=5280000, building_floors=12, building_type='residential',
+            elevator_age='5-15', elevator_count=2,
+        )
+        self.insurance = InsuranceContract.objects.create(
+            user=self.customer, insurance_type=self.insurance_type, end_date=date.today() + timedelta(days=300),
+            price=6000000, building_floors=5, building_type='residential', elevator_age='بیشتر از ۱۵ سال',
+            elevator_count=1, coverage_level='کامل',
+        )
+        self.url = reverse('reprice')
+        self.client.force_authenticate(user=self.admin)
+
+    def test_catalog_matches_quotes(self):
+        quote = serializers.QuoteRequestSerializer(data={'building_floors': 12, 'building_type': 'residential',
+                                                         'elevator_age': '5-15', 'elevator_count': 2})
+        quote.is_valid(raise_exception=True)
+        self.assertEqual(quote.calculate_price('premium'), Decimal('5280000'))
+        catalog = pricing.Catalog.current()
+        self.assertEqual(pricing.insurance_price(catalog, self.insurance_type.pk, Decimal('2000000'), 5, 1,
+                                                 'بیشتر از ۱۵ سال', 'کامل'), Decimal('6000000'))
+        candidate = catalog.with_changes({'package_multipliers': {'premium': 3}})
+        self.assertEqual(candidate.package_multipliers, {'standard': Decimal('1.5'), 'premium': Decimal('3')})
+        with self.assertRaises(pricing.CatalogError):
+            catalog.with_changes({'tax': 1})
+
+    def test_dry_run_reports_impact_without_writing(self):
+        response = self.client.post(self.url, {
+            'catalog': {'insurance_base_prices': {str(self.insurance_type.pk): 2500000}},
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = response.data['summary']
+        self.assertEqual((summary['maintenance']['contracts'], summary['maintenance']['changed']), (1, 0))
+        self.assertEqual((summary['insurance']['changed'], summary['insurance']['increased']), (1, 1))
+        self.assertEqual(summary['insurance']['new_total'], Decimal('7500000.00'))
+        self.insurance.refresh_from_db()
+        self.assertIsNone(self.insurance.renewal_price)
+
+        response = self.client.post(self.url, {'catalog': {'coverage_multipliers': {'کامل': 'x'}}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.customer)
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_csv_report(self):
+        response = self.client.post(self.url, {'kinds': ['insurance'], 'report': True,
+                                               'catalog': {'coverage_multipliers': {'کامل': '2.5'}}}, format='json')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], list(pricing.REPORT_COLUMNS))
+        self.assertEqual(rows[1], ['insurance', str(self.insurance.pk), str(self.customer.pk), '6000000.00',
+                                   '7500000.00', '1500000.00', '25.00'])
+
+    def test_report_cannot_be_combined_with_apply(self):
+        response = self.client.post(self.url, {'report': True, 'apply': True,
+                                               'catalog': {'floor_surcharge': 100000}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.maintenance.refresh_from_db()
+        self.assertIsNone(self.maintenance.renewal_price)
+
+    def test_apply_sets_renewal_price_used_by_sweep(self):
+        with tempfile.TemporaryDirectory() as directory:
+            catalog_path = os.path.join(directory, 'catalog.json')
+            report_path = os.path.join(directory, 'report.csv')
+            with open(catalog_path, 'w') as catalog:
+                json.dump({'floor_surcharge': 100000}, catalog)
+            out = io.StringIO()
+            call_command('reprice_contracts', '--catalog', catalog_path, '--report', report_path, '--apply',
+                         stdout=out)
+            with open(report_path, encoding='utf-8-sig') as report:
+                self.assertEqual(len(list(csv.reader(report))), 3)
+        self.assertIn('maintenance: 1 contracts, 1 changed (1 up, 0 down)', out.getvalue())
+        self.maintenance.refresh_from_db()
+        self.assertEqual(self.maintenance.renewal_price, Decimal('5760000.00'))
+
+        call_command('sweep_contracts', stdout=io.StringIO())
+        self.assertEqual(MaintenanceContract.objects.get(renewal_of=self.maintenance).price, Decimal('5760000.00'))
+
+
+class QuoteMemoTests(APITestCase):
+    def setUp(self):
+        quotes.memo().clear()
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.package = MaintenancePackage.objects.create(name='Premium', package_type='premium', description='',
+                                                         base_price=1000000)
+        self.insurance_type = InsuranceType.objects.create(name='مسئولیت مدنی', base_price=2000000)
+        self.client.force_authenticate(user=self.customer)
+        self.stats = quotes.stats()
+        self.profile = {'building_floors': 12, 'building_type': 'residential', 'elevator_age': '5-15',
+                        'elevator_count': 2}
+
+    def _quote(self, **changes):
+        response = self.client.post(reverse('contract-quote'), {**self.profile, **changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _counted(self, name):
+        return quotes.stats()[name] - self.stats[name]
+
+    def test_repeated_profile_is_served_from_memo(self):
+        self.assertEqual(self._quote()[0]['price'], Decimal('5280000'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._quote(building_type=' Residential ', elevator_age=' 5-15')[0]['price'],
+                             Decimal('5280000'))
+        self.assertEqual((quotes.stats()['size'], self._counted('hits'), self._counted('misses')), (1, 1, 1))
+
+        self._quote(elevator_count=3)
+        response = self.client.post(reverse('insurance-quote'), {**self.profile, 'coverage_level': 'کامل'},
+                                    format='json')
+        self.assertEqual(response.data[0]['price'], Decimal('8400000'))
+        self.assertEqual(quotes.stats()['size'], 3)
+
+    def test_package_and_type_changes_invalidate(self):
+        self._quote()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.package.base_price = 1500000
+            self.package.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._quote()[0]['package']['base_price'], '1500000.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            InsuranceType.objects.create(name='بدنه', base_price=1000000)
+        self.assertEqual(quotes.stats()['size'], 0)
+
+    def test_catalog_change_and_eviction(self):
+        self._quote()
+        with self.settings(PRICING_CATALOG={'package_multipliers': {'premium': 3}}):
+            self.assertEqual(self._quote()[0]['price'], Decimal('7920000'))
+        self.assertEqual(self._counted('misses'), 2)
+
+        with self.settings(QUOTE_CACHE_SIZE=1):
+            self._quote()
+            self._quote(building_floors=3)
+            self.assertEqual(quotes.stats()['evictions'], 1)
+
+    def test_entries_expire_for_workers_that_missed_the_change(self):
+        with self.settings(QUOTE_CACHE_TTL=0.01):
+            self._quote()
+            # Another worker's write: no signal here, the row just changes.
+            MaintenancePackage.objects.filter(pk=self.package.pk).update(base_price=1500000)
+            time.sleep(0.02)
+            self.assertEqual(self._quote()[0]['package']['base_price'], '1500000.00')
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('quote-cache')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=User.objects.create_superuser(phone_number='09123456781', password='x'))
+        response = self.client.get(reverse('quote-cache'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('evictions', response.data)
+
+
+class DashboardTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09123456780', password='x', role='technician')
+
+    def _dashboard(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_counters_follow_status_transitions(self):
+        request = ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A')
+        self.assertEqual(self._dashboard(self.customer)['open_requests'], 1)
+
+        request.technician = self.technician
+        request.status = 'assigned'
+        request.save()
+        self.assertEqual(self._dashboard(self.technician)['open_requests'], 1)
+
+        request.status = 'completed'
+        request.save()
+        customer_counts = self._dashboard(self.customer)
+        self.assertEqual(customer_counts['open_requests'], 0)
+        self.assertEqual(customer_counts['awaiting_payment'], 1)
+        self.assertEqual(self._dashboard(self.technician)['awaiting_payment'], 1)
+
+        request.status = 'paid'
+        request.save()
+        self.assertEqual(self._dashboard(self.customer)['awaiting_payment'], 0)
+
+    def test_rebuild_matches_incremental_counters(self):
+        ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A')
+        ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A',
+                                      technician=self.technician, status='completed')
+        incremental = UserDashboard.objects.get(user=self.customer)
+        UserDashboard.objects.all().update(open_requests=99, awaiting_payment=99)
+        call_command('rebuild_dashboards', stdout=open('/dev/null', 'w'))
+        rebuilt = UserDashboard.objects.get(user=self.customer)
+        self.assertEqual((rebuilt.open_requests, rebuilt.awaiting_payment),
+                         (incremental.open_requests, incremental.awaiting_payment))
+
+    def test_contract_create_updates_active_contracts(self):
+        package = MaintenancePackage.objects.create(name='Basic', package_type='basic', description='', base_price=1)
+        MaintenanceContract.objects.create(
+            user=self.customer, package=package, start_date=date.today(), end_date=date.today(),
+            price=1, building_floors=5, building_type='residential', elevator_age='0-5', elevator_count=1
+        )
+        self.assertEqual(self._dashboard(self.customer)['active_contracts'], 1)
+
+
+class RequestAnalyticsTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09123456780', password='x', role='technician')
+        self.admin = User.objects.create_superuser(phone_number='09123456781', password='x')
+
+    def _complete_and_pay(self):
+        request = ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A')
+        request.technician = self.technician
+        request.status = 'assigned'
+        request.save()
+        request.status = 'completed'
+        request.final_price = 500000
+        request.discount_amount = 10000
+        request.save()
+        request.status = 'paid'
+        request.save()
+        return request
+
+    def test_transitions_update_rollups(self):
+        self._complete_and_pay()
+        stats = DailyRequestStats.objects.get()
+        self.assertEqual((stats.created_count, stats.completed_count, stats.paid_count), (1, 1, 1))
+        self.assertEqual(stats.revenue, 490000)
+        self.assertEqual(stats.discount_total, 10000)
+        self.assertEqual(TechnicianDailyStats.objects.get(technician=self.technician).paid_count, 1)
+
+    def test_rate_is_counted_per_technician(self):
+        request = self._complete_and_pay()
+        self.client.force_authenticate(user=self.customer)
+        self.client.post(reverse('servicerequest-rate', args=[request.id]), {'rating': 4})
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('request-analytics'), {'group_by': 'technician'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.data['results'][0]
+        self.assertEqual(row['technician_id'], self.technician.id)
+        self.assertEqual(row['average_rating'], 4)
+        self.assertEqual(row['completion_rate'], 1)
+
+    def test_refresh_rebuilds_same_totals(self):
+        self._complete_and_pay()
+        before = list(DailyRequestStats.objects.values('day', 'created_count', 'paid_count', 'revenue'))
+        DailyRequestStats.objects.update(created_count=0, revenue=0)
+        call_command('refresh_rollups', stdout=open('/dev/null', 'w'))
+        after = list(DailyRequestStats.objects.values('day', 'created_count', 'paid_count', 'revenue'))
+        self.assertEqual(before, after)
+
+    def test_analytics_is_staff_only(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('request-analytics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class NearbyRequestsTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09123456780', password='x', role='technician')
+        TechnicianProfile.objects.create(user=self.technician, status='active',
+                                         base_latitude=35.7575, base_longitude=51.4100, service_radius_km=5)
+
+    def _request(self, latitude, longitude, **extra):
+        return ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A',
+                                             latitude=latitude, longitude=longitude, **extra)
+
+    def test_geohash_cell_contains_point(self):
+        min_lat, min_lng, max_lat, max_lng = geo.bounds(geo.encode(35.7575, 51.41))
+        self.assertTrue(min_lat <= 35.7575 <= max_lat and min_lng <= 51.41 <= max_lng)
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_feed_returns_nearby_open_requests_nearest_first(self):
+        far = self._request(35.84, 50.94)  # Karaj
+        near = self._request(35.7600, 51.4100)
+        nearer = self._request(35.7580, 51.4100)
+        self._request(35.7580, 51.4101, technician=self.technician, status='assigned')
+
+        self.client.force_authenticate(user=self.technician)
+        response = self.client.get(reverse('servicerequest-nearby'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [nearer.id, near.id])
+        self.assertNotIn(far.id, [row['id'] for row in response.data])
+
+    def test_create_geocodes_known_address(self):
+        self.client.force_authenticate(user=self.customer)
+        self.client.post(reverse('servicerequest-list'),
+                         {'title': 'T', 'description': 'D', 'address': 'تهران، ونک، خیابان ملاصدرا'})
+        request = ServiceRequest.objects.get()
+        self.assertEqual((request.latitude, request.longitude), geo.OfflineGeocoder.GAZETTEER['ونک'])
+        self.assertEqual(request.geo_cell, geo.encode(request.latitude, request.longitude))
+
+    def test_feed_is_technician_only(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('servicerequest-nearby'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.near = self._technician('09123456780', 35.7575, 51.4100)
+        self.far = self._technician('09123456781', 35.8044, 51.4337)
+
+    def _technician(self, phone_number, latitude, longitude):
+        user = User.objects.create_user(phone_number=phone_number, password='x', role='technician')
+        TechnicianProfile.objects.create(user=user, status='active', rating=4.5, base_latitude=latitude,
+                                         base_longitude=longitude, service_radius_km=20)
+        return user
+
+    def _request(self, latitude=35.7580, longitude=51.4100, **extra):
+        return ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A',
+                                             latitude=latitude, longitude=longitude, **extra)
+
+    def test_assigns_nearest_free_technician(self):
+        request = self._request()
+        call_command('dispatch_requests', '--once', stdout=open('/dev/null', 'w'))
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.technician), ('assigned', self.near))
+        self.assertEqual(UserDashboard.objects.get(user=self.customer).open_requests, 1)
+        self.assertEqual(TechnicianDailyStats.objects.get(technician=self.near).assigned_count, 1)
+
+    def test_spreads_load_over_capacity(self):
+        requests = [self._request() for _ in range(4)]
+        with self.settings(DISPATCH_MAX_OPEN_JOBS=2):
+            dispatch.dispatch_once()
+        technicians = [ServiceRequest.objects.get(pk=r.pk).technician for r in requests]
+        self.assertEqual(technicians.count(self.near), 2)
+        self.assertEqual(technicians.count(self.far), 2)
+
+    def test_skips_requests_accepted_meanwhile(self):
+        request = self._request()
+        assignments = dispatch.plan(dispatch.load_requests(10), dispatch.load_technicians())
+        request.technician, request.status = self.far, 'assigned'
+        request.save()
+        self.assertEqual(dispatch.apply(assignments), [])
+        request.refresh_from_db()
+        self.assertEqual(request.technician, self.far)
+
+
+class DiscountCodeTests(APITestCase):
+    def setUp(self):
+        discounts.rule_cache().clear()
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.request = ServiceRequest.objects.create(customer=self.customer, title='T', description='D',
+                                                     address='A', status='completed', final_price=200000)
+        self.client.force_authenticate(user=self.customer)
+
+    def _apply(self, code, service_request=None):
+        service_request = service_request or self.request
+        return self.client.post(reverse('servicerequest-apply-discount', args=[service_request.id]),
+                                {'discount_code': code})
+
+    def test_percent_code_is_capped_and_counted(self):
+        DiscountCode.objects.create(code='spring', kind='percent', value=20, max_discount=30000)
+        response = self._apply('  Spring ')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(response.data['discount_amount']), Decimal('30000'))
+        self.assertEqual(DiscountCode.objects.get().used_count, 1)
+
+    def test_per_user_limit_and_unknown_code(self):
+        DiscountCode.objects.create(code='ONCE', kind='fixed', value=5000)
+        other = ServiceRequest.objects.create(customer=self.customer, title='T', description='D',
+                                              address='A', status='completed', final_price=100000)
+        self.assertEqual(self._apply('ONCE').status_code, status.HTTP_200_OK)
+        self.assertEqual(self._apply('ONCE', other).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._apply('NOPE', other).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(DiscountCode.objects.get().used_count, 1)
+
+    def test_cached_rule_is_invalidated_on_update(self):
+        code = DiscountCode.objects.create(code='FLASH', kind='fixed', value=5000)
+        self.assertTrue(discounts.get_rule('flash').is_active)
+        code.is_active = False
+        code.save()
+        self.assertEqual(self._apply('FLASH').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(DiscountRedemption.objects.count(), 0)
+
+    def test_cache_settings_apply_after_import(self):
+        with self.settings(DISCOUNT_CACHE_SIZE=1, DISCOUNT_CACHE_TTL=5):
+            self.assertEqual((discounts.rule_cache().maxsize, discounts.rule_cache().ttl), (1, 5))
+        self.assertEqual(discounts.rule_cache().maxsize, 4096)
+
+
+class DiscountRedemptionConcurrencyTests(TransactionTestCase):
+    def test_limited_code_is_never_over_redeemed(self):
+        discounts.rule_cache().clear()
+        code = DiscountCode.objects.create(code='RUSH', kind='fixed', value=1000, max_uses=5)
+        requests = []
+        for index in range(20):
+            customer = User.objects.create_user(phone_number=f'0912000{index:04d}', password='x', role='customer')
+            requests.append(ServiceRequest.objects.create(customer=customer, title='T', description='D',
+                                                          address='A', status='completed', final_price=50000))
+        results = []
+        barrier = threading.Barrier(len(requests))
+
+        def worker(service_request):
+            barrier.wait()
+            try:
+                # SQLite's shared test database fails lock waits instead of blocking,
+                # so retry those the way a client would retry a busy server.
+                for _ in range(200):
+                    try:
+                        discounts.redeem(service_request, 'rush', service_request.customer)
+                        results.append(True)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+                    except ValidationError:
+                        results.append(False)
+                        return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(r,)) for r in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        code.refresh_from_db()
+        self.assertEqual(len(results), len(requests))
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(code.used_count, 5)
+        self.assertEqual(DiscountRedemption.objects.count(), 5)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.admin = User.objects.create_superuser(phone_number='09123456781', password='x')
+
+    def _seed(self, count):
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=self.customer, title=f'درخواست {index}', description='', address='',
+                           final_price=1000 + index, discount_amount=10, payment_status=True, status='paid')
+            for index in range(count)
+        ])
+
+    def _peak_bytes(self):
+        tracemalloc.start()
+        try:
+            for _ in export.stream('requests', 'jsonl', gzip=True, chunk_size=500):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_csv_download_streams_all_rows(self):
+        self._seed(3)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('export', args=['requests']), {'output': 'csv'},
+                                   HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], list(export.export_columns('requests')))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][3], 'درخواست 0')
+
+    def test_gzipped_jsonl_download(self):
+        self._seed(2)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('export', args=['requests']), {'output': 'jsonl', 'gzip': 'true'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="requests.jsonl.gz"')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[1])['final_price'], '1001.00')
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('export', args=['maintenance-contracts']))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_memory_does_not_grow_with_row_count(self):
+        # 1M-row runs go through bench_export; here a 10x larger table must not
+        # need meaningfully more memory than a small one.
+        self._seed(1500)
+        small = self._peak_bytes()
+        self._seed(13500)
+        large = self._peak_bytes()
+        self.assertLess(large, small * 1.5 + 256 * 1024)
+        self.assertLess(large, 4 * 1024 * 1024)
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write(text)
+        return path
+
+    def _import(self, *args):
+        call_command('import_data', *args, '--workers', '0', stdout=io.StringIO())
+
+    def test_imports_users_and_historical_requests(self):
+        users = self._write('users.csv', (
+            'phone_number,password_hash,password,first_name,role,base_latitude,base_longitude\n'
+            f'09120000001,{make_password("pre-hashed")},,Ali,customer,,\n'
+            '09120000002,,plain-pass,Reza,technician,35.75,51.41\n'
+        ))
+        self._import('users', users)
+        customer = User.objects.get(phone_number='09120000001')
+        technician = User.objects.get(phone_number='09120000002')
+        self.assertTrue(customer.check_password('pre-hashed'))
+        self.assertTrue(technician.check_password('plain-pass'))
+        self.assertEqual(TechnicianProfile.objects.get(user=technician).base_latitude, 35.75)
+
+        requests = self._write('requests.jsonl', json.dumps({
+            'customer_phone': '09120000001', 'technician_phone': '09120000002', 'title': 'T',
+            'status': 'completed', 'final_price': '250000', 'created_at': '2024-03-01T10:00:00+03:30',
+            'latitude': 35.76, 'longitude': 51.41,
+        }) + '\n')
+        self._import('requests', requests)
+        request = ServiceRequest.objects.get()
+        self.assertEqual((request.customer, request.technician), (customer, technician))
+        self.assertEqual(request.created_at.date(), date(2024, 3, 1))
+        self.assertEqual(request.geo_cell, geo.encode(35.76, 51.41))
+        self.assertEqual(UserDashboard.objects.get(user=customer).awaiting_payment, 1)
+
+    def test_unknown_request_status_is_a_row_error(self):
+        User.objects.create_user(phone_number='09120000005', password='x', role='customer')
+        requests = self._write('requests.csv', 'customer_phone,title,status\n09120000005,T,done\n')
+        with self.assertRaisesMessage(CommandError, "row 1: invalid status 'done'"):
+            self._import('requests', requests)
+        self.assertFalse(ServiceRequest.objects.exists())
+
+    def test_password_columns_are_kept_apart(self):
+        users = self._write('users.csv', (
+            'phone_number,password_hash,password\n'
+            '09120000003,,pbkdf2_sha256$looks$like$a-hash\n'
+            '09120000004,not-a-hash,\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'row 2: invalid password_hash'):
+            self._import('users', users, '--batch-size', '1')
+        # A plain password that looks like a hash is still hashed, never stored as is.
+        self.assertTrue(User.objects.get(phone_number='09120000003').check_password('pbkdf2_sha256$looks$like$a-hash'))
+
+    def test_failed_import_resumes_from_checkpoint(self):
+        header = 'name,package_type,description,base_price\n'
+        good = 'Basic,basic,,1000000\nStandard,standard,,2000000\n'
+        path = self._write('packages.csv', header + good + 'Broken,gold,,1\nPremium,premium,,3000000\n')
+        with self.assertRaises(CommandError):
+            self._import('packages', path, '--batch-size', '2')
+        self.assertEqual(MaintenancePackage.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().rows_done, 2)
+
+        self._write('packages.csv', header + good + 'Fixed,premium,,1\nPremium,premium,,3000000\n')
+        self._import('packages', path, '--batch-size', '2')
+        # package_type is unique: the later premium row replaces the earlier one
+        self.assertEqual(list(MaintenancePackage.objects.order_by('pk').values_list('name', 'base_price')),
+                         [('Basic', 1000000), ('Standard', 2000000), ('Premium', 3000000)])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+        # A new file at the same path after a finished run is read from its first row.
+        self._write('packages.csv', header + 'Basic 2,basic,,1500000\n')
+        self._import('packages', path)
+        self.assertEqual(MaintenancePackage.objects.get(package_type='basic').name, 'Basic 2')
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.old = self._request('paid', days_ago=400)
+        RequestAttachment.objects.create(request=self.old, file='request_attachments/photo.jpg')
+        self.recent = self._request('paid', days_ago=1)
+        self.open = self._request('submitted', days_ago=400)
+
+    def _request(self, request_status, days_ago):
+        request = ServiceRequest.objects.create(customer=self.customer, title='T', description='D',
+                                                address='A', status=request_status, final_price=1000)
+        ServiceRequest.objects.filter(pk=request.pk).update(updated_at=timezone.now() - timedelta(days=days_ago))
+        return request
+
+    def test_moves_old_closed_requests_with_attachments(self):
+        call_command('archive_requests', '--days', '180', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(set(ServiceRequest.objects.values_list('pk', flat=True)), {self.recent.pk, self.open.pk})
+        archived = ArchivedServiceRequest.objects.get()
+        self.assertEqual((archived.pk, archived.status, archived.final_price), (self.old.pk, 'paid', 1000))
+        self.assertEqual(ArchivedRequestAttachment.objects.get().request_id, self.old.pk)
+        self.assertFalse(RequestAttachment.objects.exists())
+
+    def test_batch_changed_under_archival_does_not_stop_the_run(self):
+        later = self._request('paid', days_ago=400)
+        touched = []
+
+        def touch_first(counts):
+            # The first request is updated between the batch's SELECT and DELETE.
+            if not touched:
+                touched.append(ServiceRequest.objects.filter(pk=self.old.pk).update(updated_at=timezone.now()))
+
+        with mock.patch('api.blobstore.add_references', side_effect=touch_first):
+            self.assertEqual(archive.archive(older_than_days=180, batch_size=1), 1)
+        self.assertEqual(list(ArchivedServiceRequest.objects.values_list('pk', flat=True)), [later.pk])
+        self.assertTrue(ServiceRequest.objects.filter(pk=self.old.pk).exists())
+
+    def test_detail_and_export_fall_through_to_archive(self):
+        archive.archive(older_than_days=180)
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('servicerequest-detail', args=[self.old.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.old.pk)
+        self.assertIsNotNone(response.data['archived_at'])
+
+        stranger = User.objects.create_user(phone_number='09123456780', password='x', role='customer')
+        self.client.force_authenticate(user=stranger)
+        response = self.client.get(reverse('servicerequest-detail', args=[self.old.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        columns, rows = export.export_rows('requests')
+        self.assertEqual(sorted(row[0] for row in rows), sorted([self.old.pk, self.recent.pk, self.open.pk]))
+
+    def test_archive_has_every_request_column(self):
+        archived = {field.attname for field in ArchivedServiceRequest._meta.concrete_fields}
+        self.assertLessEqual(set(archive.REQUEST_COLUMNS), archived)
+        self.assertLessEqual(set(archive.ATTACHMENT_COLUMNS),
+                             {field.attname for field in ArchivedRequestAttachment._meta.concrete_fields})
+
+
+class AttachmentDownloadTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(MEDIA_ROOT=directory.name, ATTACHMENT_OFFLOAD=None)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+        self.request = ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A')
+        self.attachment = RequestAttachment.objects.create(
+            request=self.request, file=SimpleUploadedFile('photo.jpg', b'0123456789'))
+        self.url = reverse('servicerequest-attachment', args=[self.request.pk, self.attachment.pk])
+        self.client.force_authenticate(user=self.customer)
+
+    def _get(self, **headers):
+        response = self.client.get(self.url, HTTP_ACCEPT='image/*', **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_full_download_with_validators(self):
+        response, body = self._get()
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        cached, _ = self._get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_byte_ranges(self):
+        response, body = self._get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, body), (206, b'2345'))
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-5/10', '4'))
+        response, body = self._get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, body), (206, b'789'))
+        response, body = self._get(HTTP_RANGE='bytes=8-100')
+        self.assertEqual((response['Content-Range'], body), ('bytes 8-9/10', b'89'))
+        response, _ = self._get(HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # several ranges: the whole file
+        response, body = self._get(HTTP_RANGE='bytes=0-1,4-5')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+
+    def test_if_range_for_another_version_sends_whole_file(self):
+        etag = self._get()[0]['ETag']
+        response, body = self._get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response, body = self._get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+
+    def test_only_visible_requests(self):
+        stranger = User.objects.create_user(phone_number='09123456780', password='x', role='customer')
+        self.client.force_authenticate(user=stranger)
+        self.assertEqual(self._get()[0].status_code, 404)
+
+        ServiceRequest.objects.filter(pk=self.request.pk).update(
+            status='paid', updated_at=timezone.now() - timedelta(days=400))
+        archive.archive(older_than_days=180)
+        self.client.force_authenticate(user=self.customer)
+        response, body = self._get()
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+
+    def test_offload_sends_no_bytes(self):
+        with self.settings(ATTACHMENT_OFFLOAD='x-accel-redirect'):
+            response, body = self._get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, body), (200, b''))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.attachment.file.name)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with self.settings(ATTACHMENT_OFFLOAD='x-sendfile'):
+            response, _ = self._get()
+        self.assertEqual(response['X-Sendfile'], self.attachment.file.path)
+
+    def test_parse_range(self):
+        self.assertIsNone(media.parse_range('', 10))
+        self.assertIsNone(media.parse_range('bytes=5-2', 10))
+        self.assertEqual(media.parse_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(media.parse_range('bytes=-20', 10), (0, 9))
+        with self.assertRaises(media.RangeNotSatisfiable):
+            media.parse_range('bytes=-0', 10)
+
+
+class AttachmentBlobTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(MEDIA_ROOT=directory.name, ATTACHMENT_BLOB_GC_GRACE=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.customer = User.objects.create_user(phone_number='09123456789', password='x', role='customer')
+
+    def _request(self, **fields):
+        return ServiceRequest.objects.create(customer=self.customer, title='T', description='D', address='A', **fields)
+
+    def _exists(self, name):
+        return storage.attachment_storage.exists(name)
+
+    def test_same_content_is_stored_once(self):
+        request = self._request()
+        first = RequestAttachment.objects.create(request=request, file=SimpleUploadedFile('a.jpg', b'elevator'))
+        second = RequestAttachment.objects.create(request=request, file=SimpleUploadedFile('b.JPG', b'elevator'))
+        other = RequestAttachment.objects.create(request=request, file=SimpleUploadedFile('c.jpg', b'cabin'))
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(storage.digest(first.file.name), hashlib.sha256(b'elevator').hexdigest())
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        self.assertEqual(AttachmentBlob.objects.get(pk=first.blob_id).ref_count, 2)
+
+        second.delete()
+        self.assertEqual(AttachmentBlob.objects.get(pk=first.blob_id).ref_count, 1)
+        self.assertEqual(blobstore.collect_garbage(), (0, 0))
+
+    def test_archived_attachments_keep_their_blob(self):
+        request = self._request(status='paid')
+        attachment = RequestAttachment.objects.create(request=request, file=SimpleUploadedFile('a.jpg', b'elevator'))
+        ServiceRequest.objects.filter(pk=request.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        archive.archive(older_than_days=180)
+        blob = AttachmentBlob.objects.get()
+        self.assertEqual((blob.ref_count, ArchivedRequestAttachment.objects.get().blob_id), (1, blob.pk))
+        self.assertEqual(blobstore.collect_garbage(), (0, 0))
+
+        # A stale count alone never deletes a blob that is still used.
+        AttachmentBlob.objects.update(ref_count=0)
+        self.assertEqual(blobstore.collect_garbage(), (0, 0))
+
+        ArchivedServiceRequest.objects.all().delete()
+        self.assertEqual(blobstore.collect_garbage(), (1, len(b'elevator')))
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(self._exists(attachment.file.name))
+
+    def test_dedupe_existing_files(self):
+        legacy = []
+        for index, content in enumerate([b'elevator', b'elevator', b'cabin']):
+            name = storage.attachment_storage.path(f'request_attachments/photo{index}.jpg')
+            os.makedirs(os.path.dirname(name), exist_ok=True)
+            with open(name, 'wb') as file:
+                file.write(content)
+            legacy.append(f'request_attachments/photo{index}.jpg')
+        request = self._request()
+        for name in legacy:
+            RequestAttachment.objects.create(request=request, file=name)
+        RequestAttachment.objects.create(request=request, file='request_attachments/lost.jpg')
+
+        output, errors = io.StringIO(), io.StringIO()
+        call_command('dedupe_attachments', '--batch-size', '2', stdout=output, stderr=errors)
+        self.assertIn('2 blobs created', output.getvalue())
+        self.assertIn('1 attachments point at missing files', errors.getvalue())
+
+        attachments = list(RequestAttachment.objects.exclude(blob=None).order_by('pk'))
+        self.assertEqual(len(attachments), 3)
+        self.assertEqual(attachments[0].file.name, attachments[1].file.name)
+        self.assertEqual(attachments[0].file.read(), b'elevator')
+        self.assertEqual(sorted(AttachmentBlob.objects.values_list('ref_count', flat=True)), [1, 2])
+        self.assertFalse(any(self._exists(name) for name in legacy))
+
+        result = blobstore.dedupe()
+        self.assertEqual((result.attachments, result.missing, result.bytes_reclaimed), (0, 1, 0))
+
+
+class SchemaArtifactTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(SCHEMA_ARTIFACT_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_missing_artifact_is_not_generated_on_request(self):
+        self.assertEqual(self.client.get(reverse('schema')).status_code, 503)
+        self.assertEqual([w.id for w in checks.check_schema_artifact(None)], ['api.W001'])
+
+    def test_serves_built_artifact_with_etag(self):
+        call_command('build_schema', stdout=io.StringIO())
+        response = self.client.get(reverse('schema'), {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/requests/', json.loads(response.content)['paths'])
+
+        response = self.client.get(reverse('schema'))
+        self.assertTrue(response['Content-Type'].startswith('application/vnd.oai.openapi;'))
+        cached = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(checks.check_schema_artifact(None), [])
+
+    def test_stale_artifact_is_reported(self):
+        call_command('build_schema', stdout=io.StringIO())
+        with open(os.path.join(schema.artifact_dir(), schema.META_FILE), 'w') as meta:
+            json.dump({'fingerprint': 'old'}, meta)
+        self.assertEqual([w.id for w in checks.check_schema_artifact(None)], ['api.W002'])
+        with self.assertRaises(CommandError):
+            call_command('build_schema', '--check', stdout=io.StringIO())
+
+    def test_fingerprint_is_only_checked_on_deploy(self):
+        self.assertNotIn(checks.check_schema_current, registry.get_checks())
+        self.assertIn(checks.check_schema_current, registry.get_checks(include_deployment_checks=True))
+        self.assertIn(checks.check_schema_built, registry.get_checks())
+
+
+class LeanSettingsTests(TestCase):
+    def test_api_workers_skip_admin_and_docs(self):
+        from asanservice import settings_production
+
+        for app in ('django.contrib.admin', 'django.contrib.sessions', 'drf_spectacular'):
+            self.assertNotIn(app, settings_production.INSTALLED_APPS)
+        self.assertIn('api', settings_production.INSTALLED_APPS)
+        self.assertEqual(settings_production.ROOT_URLCONF, 'asanservice.urls_api')
+
+    def test_api_workers_never_import_drf_spectacular(self):
+        probe = ('import sys, django; django.setup(); from django.urls import get_resolver; '
+                 'get_resolver().url_patterns; from api import views; print("drf_spectacular" in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'asanservice.settings_production',
+                                     'DB_ENGINE': 'api.pooled.sqlite3'})
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_parse_importtime(self):
+        from .management.commands.import_profile import parse_importtime
+
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |     encodings.utf_8\n'
+                  'import time:      2500 |       3100 |   django.db\n')
+        self.assertEqual(parse_importtime(output), [('encodings.utf_8', 120, 120, 2), ('django.db', 2500, 3100, 1)])
+
+
+class OptimisticConcurrencyTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09120000001', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09120000002', password='x', role='technician')
+        self.request = ServiceRequest.objects.create(
+            customer=self.customer, technician=self.technician, title='t', description='d', address='a',
+            status='completed',
+        )
+
+    def test_etag_follows_version(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('servicerequest-detail', args=[self.request.pk]))
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.data['version'], 1)
+
+        self.client.force_authenticate(user=self.technician)
+        response = self.client.post(reverse('servicerequest-set-price', args=[self.request.pk]),
+                                    {'final_price': '150000'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+
+    def test_stale_if_match_is_rejected_without_writing(self):
+        self.client.force_authenticate(user=self.technician)
+        url = reverse('servicerequest-set-price', args=[self.request.pk])
+        self.client.post(url, {'final_price': '100000'}, HTTP_IF_MATCH='"1"')
+        response = self.client.post(url, {'final_price': '90000'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.final_price, Decimal('100000'))
+        self.assertEqual(self.request.version, 2)
+
+    def test_concurrent_writers_cannot_both_win(self):
+        first = ServiceRequest.objects.get(pk=self.request.pk)
+        second = ServiceRequest.objects.get(pk=self.request.pk)
+        first.final_price = Decimal('120000')
+        self.assertTrue(first.save_versioned(['final_price']))
+        second.status = 'cancelled'
+        self.assertFalse(second.save_versioned(['status']))
+
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.status, self.request.final_price, self.request.version),
+                         ('completed', Decimal('120000'), 2))
+
+    def test_plain_save_bumps_version(self):
+        self.request.review = 'ok'
+        self.request.save(update_fields=['review'])
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.version, 2)
+
+
+class TransitionTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09130000001', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09130000002', password='x', role='technician')
+        self.other = User.objects.create_user(phone_number='09130000003', password='x', role='technician')
+        self.request = ServiceRequest.objects.create(customer=self.customer, title='t', description='d', address='a')
+
+    def post(self, user, action_name, data=None):
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse(f'servicerequest-{action_name}', args=[self.request.pk]), data or {})
+
+    def test_full_lifecycle_emits_one_hook_per_transition(self):
+        seen = []
+
+        def record(sender, action, from_status, to_status, **kwargs):
+            seen.append((action, from_status, to_status))
+
+        signals.request_transitioned.connect(record)
+        self.addCleanup(signals.request_transitioned.disconnect, record)
+
+        self.assertEqual(self.post(self.technician, 'accept').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post(self.technician, 'update-status', {'status': 'in_progress'}).status_code, 200)
+        self.assertEqual(self.post(self.technician, 'update-status', {'status': 'completed'}).status_code, 200)
+        self.assertEqual(self.post(self.technician, 'set-price', {'final_price': '500000'}).status_code, 200)
+        self.assertEqual(self.post(self.customer, 'pay').status_code, 200)
+        self.assertEqual(self.post(self.customer, 'rate', {'rating': 5}).status_code, 200)
+
+        self.assertEqual(seen, [
+            ('accept', 'submitted', 'assigned'), ('start', 'assigned', 'in_progress'),
+            ('complete', 'in_progress', 'completed'), ('set_price', 'completed', 'completed'),
+            ('pay', 'completed', 'paid'), ('rate', 'paid', 'paid'),
+        ])
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.status, self.request.technician_id, self.request.rating),
+                         ('paid', self.technician.pk, 5))
+        dashboard_row = UserDashboard.objects.get(user=self.customer)
+        self.assertEqual((dashboard_row.open_requests, dashboard_row.awaiting_payment), (0, 0))
+
+    def test_rules_are_checked_from_the_table(self):
+        self.assertEqual(self.post(self.customer, 'accept').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post(self.customer, 'pay').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(transitions.TABLE[('cancel', 'in_progress', 'assigned_technician')].to_status,
+                         'cancelled')
+        self.assertNotIn(('cancel', 'in_progress', 'customer'), transitions.TABLE)
+        with self.assertRaises(ValueError):
+            transitions.compile_rules(transitions.RULES[:1] * 2)
+
+    def test_racing_accepts_have_one_winner(self):
+        first = ServiceRequest.objects.get(pk=self.request.pk)
+        second = ServiceRequest.objects.get(pk=self.request.pk)
+        transitions.perform('accept', first, self.technician, technician=self.technician)
+        with self.assertRaises(concurrency.PreconditionFailed):
+            transitions.perform('accept', second, self.other, technician=self.other)
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.technician_id, self.technician.pk)
+        self.assertEqual(self.request.version, 2)
+
+    def test_write_since_read_fails_the_transition(self):
+        stale = ServiceRequest.objects.get(pk=self.request.pk)
+        fresh = ServiceRequest.objects.get(pk=self.request.pk)
+        fresh.title = 'renamed'
+        concurrency.save(fresh, {'title': 'renamed'})
+        with self.assertRaises(concurrency.PreconditionFailed):
+            transitions.perform('accept', stale, self.technician, technician=self.technician)
+        accepted = transitions.perform('accept', fresh, self.technician, technician=self.technician)
+        self.assertEqual(accepted.version, ServiceRequest.objects.get(pk=self.request.pk).version)
+
+    def test_update_cannot_change_status_or_payment(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.patch(reverse('servicerequest-detail', args=[self.request.pk]), {
+            'status': 'paid', 'payment_status': True, 'discount_amount': '999', 'rating': 5, 'title': 'renamed',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.status, self.request.payment_status, self.request.discount_amount,
+                          self.request.rating, self.request.title), ('submitted', False, 0, None, 'renamed'))
+
+
+class BulkTransitionTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09140000001', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09140000002', password='x', role='technician')
+        self.staff = User.objects.create_superuser(phone_number='09140000003', password='x')
+
+    def make(self, count, **fields):
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(customer=self.customer, title='t', description='d', address='a', **fields)
+            for _ in range(count)
+        ])
+        dashboard.refresh_users([self.customer.pk, self.technician.pk])
+        return list(ServiceRequest.objects.filter(**fields).order_by('pk').values_list('pk', flat=True))
+
+    def test_technician_completes_many_with_per_id_results(self):
+        ids = self.make(1200, technician=self.technician, status='in_progress')
+        other = self.make(1, status='submitted')
+        self.client.force_authenticate(user=self.technician)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('servicerequest-bulk-update-status'),
+                                        {'ids': ids + other + [10 ** 9], 'status': 'completed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1200)
+        results = {row['id']: row['result'] for row in response.data['results']}
+        self.assertEqual((results[other[0]], results[10 ** 9]), ('forbidden', 'not_found'))
+        self.assertEqual(ServiceRequest.objects.filter(status='completed', version=2).count(), 1200)
+        # Set-based: the query count does not grow with the number of ids.
+        self.assertLess(len(queries), 40)
+
+    def test_staff_cancel_with_reason_skips_closed_requests(self):
+        stale = self.make(3, status='submitted')
+        closed = self.make(1, status='cancelled')
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(reverse('servicerequest-bulk-cancel'),
+                                    {'ids': stale + closed, 'cancel_reason': 'stale'}, format='json')
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(response.data['results'][-1]['result'], 'invalid')
+        self.assertEqual(set(ServiceRequest.objects.filter(pk__in=stale).values_list('status', 'cancel_reason')),
+                         {('cancelled', 'stale')})
+        self.assertEqual(UserDashboard.objects.get(user=self.customer).open_requests, 0)
+
+    def test_id_limit_follows_setting(self):
+        self.client.force_authenticate(user=self.staff)
+        with self.settings(BULK_MAX_IDS=2):
+            response = self.client.post(reverse('servicerequest-bulk-cancel'),
+                                        {'ids': [1, 2, 3], 'cancel_reason': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(phone_number='09150000001', password='x', role='customer')
+        ServiceRequest.objects.create(customer=self.customer, title='t', description='d', address='a')
+        token = RefreshToken.for_user(self.customer).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_startup_reads_in_one_call_with_one_user_lookup(self):
+        items = [
+            {'id': 'profile', 'path': '/api/auth/profile/'},
+            {'id': 'requests', 'path': '/api/requests/'},
+            {'id': 'contracts', 'path': '/api/contracts/'},
+            {'id': 'insurance', 'path': '/api/insurance/?ordering=id'},
+            {'id': 'missing', 'path': '/api/nope/'},
+            {'id': 'nested', 'path': '/api/batch/'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('batch'), {'requests': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {row['id']: row for row in response.json()['responses']}
+        self.assertEqual([results[key]['status'] for key in ('profile', 'requests', 'contracts', 'insurance')],
+                         [200] * 4)
+        self.assertEqual(results['profile']['body']['phone_number'], '09150000001')
+        self.assertEqual(len(results['requests']['body']), 1)
+        self.assertEqual((results['missing']['status'], results['nested']['status']), (404, 400))
+        user_table = User._meta.db_table
+        self.assertEqual(sum(f'FROM "{user_table}"' in query['sql'] for query in queries.captured_queries), 1)
+
+    def test_only_gets_are_batched(self):
+        response = self.client.post(reverse('batch'), {'requests': [
+            {'method': 'POST', 'path': '/api/requests/'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limit_follows_setting(self):
+        items = [{'path': '/api/auth/profile/'}] * 3
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            response = self.client.post(reverse('batch'), {'requests': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('requests', response.json())
+        self.assertEqual(self.client.post(reverse('batch'), {'requests': items}, format='json').status_code, 200)
+
+
+    def test_only_api_paths_are_dispatched(self):
+        items = [
+            {'id': 'admin', 'path': '/admin/'},
+            {'id': 'schema', 'path': '/api/schema/'},
+            {'id': 'profile', 'path': '/api/auth/profile/'},
+        ]
+        response = self.client.post(reverse('batch'), {'requests': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['status'] for row in response.json()['responses']], [400, 400, 200])
+
+    def test_failing_sub_request_does_not_fail_batch(self):
+        items = [{'id': 'broken', 'path': '/api/auth/profile/'}, {'id': 'requests', 'path': '/api/requests/'}]
+        with mock.patch('api.views.UserProfileView.get', side_effect=RuntimeError):
+            response = self.client.post(reverse('batch'), {'requests': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['status'] for row in response.json()['responses']], [500, 200])
+
+
+class ParallelBatchTests(TransactionTestCase):
+    def test_parallel_reads_keep_request_order(self):
+        customer = User.objects.create_user(phone_number='09150000002', password='x', role='customer')
+        client = APIClient()
+        client.force_authenticate(user=customer)
+        paths = ['/api/auth/profile/', '/api/requests/', '/api/dashboard/', '/api/contracts/']
+        response = client.post(reverse('batch'), {
+            'requests': [{'id': str(index), 'path': path} for index, path in enumerate(paths)],
+            'parallel': True,
+        }, format='json')
+        rows = response.json()['responses']
+        self.assertEqual([row['id'] for row in rows], ['0', '1', '2', '3'])
+        self.assertEqual([row['status'] for row in rows], [200] * 4)
+
+
+class ListCacheTests(APITestCase):
+    def setUp(self):
+        caches['lists'].clear()
+        self.customer = User.objects.create_user(phone_number='09160000001', password='x', role='customer')
+        self.technician = User.objects.create_user(phone_number='09160000002', password='x', role='technician')
+        self.request = ServiceRequest.objects.create(customer=self.customer, title='t', description='d', address='a')
+
+    def list_as(self, user, name='servicerequest-list'):
+        self.client.force_authenticate(user=user)
+        return self.client.get(reverse(name)).json()
+
+    def test_repeated_poll_is_served_from_cache(self):
+        self.list_as(self.customer)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.list_as(self.customer)), 1)
+
+    def test_writes_retire_lists_of_customer_technician_and_pool(self):
+        self.assertEqual(len(self.list_as(self.technician)), 1)
+        self.assertEqual(self.list_as(self.customer)[0]['status'], 'submitted')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(user=self.technician)
+            self.client.post(reverse('servicerequest-accept', args=[self.request.pk]))
+        self.assertEqual(self.list_as(self.customer)[0]['status'], 'assigned')
+
+        # A new submitted request enters the open pool every technician sees.
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceRequest.objects.create(customer=self.customer, title='new', description='d', address='a')
+        self.assertEqual(len(self.list_as(self.technician)), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(user=self.customer)
+            self.client.patch(reverse('servicerequest-detail', args=[self.request.pk]), {'title': 'renamed'})
+        self.assertIn('renamed', [row['title'] for row in self.list_as(self.technician)])
+
+    def test_contract_write_retires_owner_list(self):
+        self.assertEqual(self.list_as(self.customer, 'contract-list'), [])
+        package = MaintenancePackage.objects.create(name='Basic', package_type='basic', description='', base_price=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            MaintenanceContract.objects.create(
+                user=self.customer, package=package, start_date=date.today(), end_date=date.today() + timedelta(days=30),
+                price=1, building_floors=3, building_type='residential', elevator_age='new', elevator_count=1,
+            )
+        self.assertEqual(len(self.list_as(self.customer, 'contract-list')), 1)
+
+
+class ConnectionPoolTests(APITestCase):
+    def setUp(self):
+        self.opened = 0
+
+    def connect(self):
+        self.opened += 1
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    def checkout(self, pool, ping=pooled._ping):
+        return pool.checkout(self.connect, ping)
+
+    def test_returned_connection_is_reused(self):
+        pool = pooled.Pool({'MIN_SIZE': 1, 'MAX_SIZE': 2})
+        raw = self.checkout(pool)
+        pool.checkin(raw, pooled._reset)
+        self.assertIs(self.checkout(pool), raw)
+        self.assertEqual(self.opened, 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_overflow_is_closed_on_return(self):
+        pool = pooled.Pool({'MIN_SIZE': 1, 'MAX_SIZE': 3})
+        first, second = self.checkout(pool), self.checkout(pool)
+        self.assertEqual(pool.stats()['overflow'], 1)
+        pool.checkin(first, pooled._reset)
+        pool.checkin(second, pooled._reset)
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['idle'], stats['overflow_closed']), (1, 1, 1))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            second.execute('SELECT 1')
+
+    def test_expired_and_unhealthy_connections_are_replaced(self):
+        pool = pooled.Pool({'MIN_SIZE': 2, 'MAX_LIFETIME': 0.05, 'CHECK_IDLE': 0})
+        raw = self.checkout(pool)
+        pool.checkin(raw, pooled._reset)
+        time.sleep(0.06)
+        self.assertIsNot(self.checkout(pool), raw)
+        self.assertEqual(pool.stats()['expired'], 1)
+
+        pool = pooled.Pool({'MIN_SIZE': 2, 'CHECK_IDLE': 0})
+        raw = self.checkout(pool)
+        pool.checkin(raw, pooled._reset)
+        raw.close()  # e.g. the server dropped it while idle
+        self.assertIsNot(self.checkout(pool), raw)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+    def test_exhausted_pool_waits_then_times_out(self):
+        pool = pooled.Pool({'MIN_SIZE': 1, 'MAX_SIZE': 1, 'TIMEOUT': 0.5})
+        raw = self.checkout(pool)
+        threading.Timer(0.05, pool.checkin, args=(raw, pooled._reset)).start()
+        self.assertIs(self.checkout(pool), raw)
+        self.assertEqual(pool.stats()['waits'], 1)
+        self.assertGreater(pool.stats()['wait_ms_max'], 0)
+
+        pool.timeout = 0.01
+        with self.assertRaises(pooled.PoolTimeout):
+            self.checkout(pool)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_pooled_backend_hands_connection_back_on_close(self):
+        from django.db.utils import ConnectionHandler
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({'default': connection.settings_dict, 'pooltest': {
+                'ENGINE': 'api.pooled.sqlite3', 'NAME': os.path.join(directory, 'pool.sqlite3'),
+                'POOL': {'MIN_SIZE': 1, 'MAX_SIZE': 2},
+            }})
+            wrapper = handler['pooltest']
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            raw = wrapper.connection
+            wrapper.close()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertIs(wrapper.connection, raw)
+            wrapper.close()
+            stats = pooled.all_stats()['pooltest']
+            self.assertEqual((stats['opened'], stats['checkouts'], stats['idle']), (1, 2, 1))
+            raw.close()
+
+    def test_pool_endpoint_is_staff_only(self):
+        user = User.objects.create_user(phone_number='09170000001', password='x')
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(reverse('db-pool')).status_code, status.HTTP_403_FORBIDDEN)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('db-pool'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('default', response.data['databases'])
+        self.assertIn('pools', response.data)
+
+
+class ScaleDataTests(TransactionTestCase):
+    def test_generates_consistent_rows_and_restores_indexes(self):
+        call_command('generate_scale_data', users=40, requests=300, attachments=50, maintenance_contracts=10,
+                     insurance_contracts=5, chunk_size=64, workers=0, stdout=io.StringIO())
+
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(TechnicianProfile.objects.count(), User.objects.filter(role='technician').count())
+        self.assertEqual(ServiceRequest.objects.count(), 300)
+        self.assertEqual(RequestAttachment.objects.count(), 50)
+        self.assertEqual(MaintenanceContract.objects.count(), 10)
+        self.assertEqual(InsuranceContract.objects.count(), 5)
+        self.assertFalse(ServiceRequest.objects.filter(status='submitted', technician__isnull=False).exists())
+        self.assertFalse(ServiceRequest.objects.filter(status='paid', final_price__isnull=True).exists())
+        self.assertFalse(ServiceRequest.objects.exclude(customer__role='customer').exists())
+        self.assertFalse(ServiceRequest.objects.filter(technician__isnull=False)
+                         .exclude(technician__role='technician').exists())
+        self.assertTrue(User.objects.first().check_password(scaledata.PASSWORD))
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, ServiceRequest._meta.db_table)
+        self.assertIn('request_status_updated_idx', constraints)
+        # New rows get ids after the generated ones.
+        self.assertGreater(ServiceRequest.objects.create(customer=User.objects.last(), title='t', description='d',
+                                                         address='a').pk, 300)
+
+    def test_chunks_depend_on_seed_only(self):
+        plan = scaledata.make_plan({'users': 100, 'requests': 100}, seed=7, chunk_size=50)
+        again = scaledata.make_plan({'users': 100, 'requests': 100}, seed=7, chunk_size=50, now=plan.now)
+        self.assertEqual(scaledata.generate_chunk(plan, 'requests', 1), scaledata.generate_chunk(again, 'requests', 1))
+        other = scaledata.make_plan({'users': 100, 'requests': 100}, seed=8, chunk_size=50, now=plan.now)
+        self.assertNotEqual(scaledata.generate_chunk(plan, 'requests', 1), scaledata.generate_chunk(other, 'requests', 1))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'plans are read from SQLite EXPLAIN QUERY PLAN')
+class QueryPlanTests(APITestCase):
+    """The hot endpoint queries, run against a seeded and ANALYZEd database, must not scan big tables."""
+    LARGE_TABLES = {model._meta.db_table for model in (
+        User, TechnicianProfile, ServiceRequest, RequestAttachment, MaintenanceContract, InsuranceContract,
+        ArchivedServiceRequest,
+    )}
+
+    @classmethod
+    def setUpTestData(cls):
+        plan = scaledata.make_plan({'users': 400, 'requests': 4000, 'maintenance_contracts': 400,
+                                    'insurance_contracts': 200}, seed=1, chunk_size=1000)
+        scaledata.run(plan, defer_indexes=False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.customer = ServiceRequest.objects.first().customer
+        cls.technician = User.objects.filter(role='technician').first()
+
+    def setUp(self):
+        caches['lists'].clear()
+
+    def plans_of(self, run):
+        """EXPLAIN QUERY PLAN of every statement ``run()`` reads or writes rows with."""
+        with CaptureQueriesContext(connection) as context:
+            run()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                if query['sql'].split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.append((query['sql'], [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def assertIndexed(self, run, *indexes):
+        plans = self.plans_of(run)
+        for sql, plan in plans:
+            scanned = [line for line in plan if line.startswith('SCAN ') and line.split()[1] in self.LARGE_TABLES]
+            self.assertEqual(scanned, [], f'full scan in {sql}')
+        used = '\n'.join(line for _, plan in plans for line in plan)
+        for index in indexes:
+            self.assertIn(index, used)
+
+    def get(self, user, name, *args):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_lists(self):
+        self.assertIndexed(lambda: self.get(self.customer, 'servicerequest-list'), '(customer_id=?)')
+        # own requests or the open pool: both halves of the OR from one index
+        self.assertIndexed(lambda: self.get(self.technician, 'servicerequest-list'),
+                           'request_technician_status_idx (technician_id=? AND status=?)')
+
+    def test_active_contract_lists(self):
+        customer = MaintenanceContract.objects.filter(is_active=True).first().user
+        self.assertIndexed(lambda: self.get(customer, 'contract-list'), 'maint_contract_user_active_idx')
+        self.assertIndexed(lambda: self.get(customer, 'active-contract'), 'maint_contract_user_active_idx')
+        customer = InsuranceContract.objects.filter(is_active=True).first().user
+        self.assertIndexed(lambda: self.get(customer, 'insurance-list'), 'ins_contract_user_active_idx')
+
+    def test_rating_average_reads_only_the_index(self):
+        service_request = ServiceRequest.objects.filter(status='paid', rating__isnull=True,
+                                                        technician__isnull=False).first()
+        self.client.force_authenticate(user=service_request.customer)
+
+        def rate():
+            response = self.client.post(reverse('servicerequest-rate', args=[service_request.pk]), {'rating': 5})
+            self.assertEqual(response.status_code, 200)
+        self.assertIndexed(rate, 'USING COVERING INDEX request_technician_status_idx')
+
+    def test_package_lookup_by_type(self):
+        self.assertIndexed(lambda: MaintenancePackage.objects.get(package_type='premium'), '(package_type=?)')
@@ -0,0 +1,218 @@
+"""
+Status transitions of a ``ServiceRequest``.
+
+Every request action that is gated on the request's status (accept, start,
+complete, cancel, set_price, pay, rate) is declared once in ``RULES``. At
+import time the rules are compiled into a dict keyed by
+``(action, from_status, role)``, so checking a transition is one lookup.
+
+``perform`` applies a transition with a single UPDATE guarded by
+``status=from_status``, the rule's guard and the version the row was read
+at, so two concurrent writes to the same request cannot both succeed. It then sends
+``request_status_changed`` (when the status or technician changed) and
+``request_transitioned``. ``perform_many`` does the same for a list of ids
+with one UPDATE per (transition, chunk) and reports a result per id.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .concurrency import PreconditionFailed
+from .models import STATUS_CHOICES, ServiceRequest
+from .signals import RequestStatusChange, request_status_changed, request_transitioned
+
+STATUSES = tuple(value for value, _ in STATUS_CHOICES)
+STATUS_LABELS = dict(STATUS_CHOICES)
+
+FORBIDDEN_MESSAGE = "شما اجازه انجام این کار را روی این درخواست ندارید."
+NOT_FOUND_MESSAGE = "درخواست پیدا نشد."
+
+# Roles a user can hold towards one request:
+#   customer             the request's customer
+#   assigned_technician  the technician the request is assigned to
+#   technician           any user with the technician role
+#   admin                staff or the admin role
+
+# guard: (field, must_be_null) pairs checked on the loaded row and repeated in the UPDATE
+# (compiled to (attname, must_be_null) so rows from values_list can be checked too).
+# to_status None keeps the current status (the action only writes fields).
+Rule = namedtuple('Rule', ('action', 'from_statuses', 'to_status', 'roles', 'guard', 'guard_message'))
+Transition = namedtuple('Transition', ('action', 'from_status', 'to_status', 'guard', 'guard_q', 'guard_message'))
+
+RULES = (
+    Rule('accept', ('submitted',), 'assigned', ('technician',), (('technician', True),),
+         "این درخواست قبلاً به تکنسین دیگری اختصاص داده شده است."),
+    Rule('start', ('assigned',), 'in_progress', ('assigned_technician',), (), None),
+    Rule('complete', ('in_progress',), 'completed', ('assigned_technician',), (), None),
+    Rule('cancel', ('scheduled', 'submitted', 'assigned'), 'cancelled', ('customer',), (), None),
+    Rule('cancel', ('assigned', 'in_progress'), 'cancelled', ('assigned_technician',), (), None),
+    Rule('cancel', tuple(s for s in STATUSES if s != 'cancelled'), 'cancelled', ('admin',), (), None),
+    Rule('set_price', ('completed',), None, ('assigned_technician',), (('final_price', True),),
+         "قیمت این درخواست قبلاً تعیین شده است."),
+    Rule('pay', ('completed',), 'paid', ('customer',), (('final_price', False),),
+         "قیمت این درخواست هنوز تعیین نشده است."),
+    Rule('rate', ('paid',), None, ('customer',), (('rating', True),),
+         "به این درخواست قبلاً امتیاز داده شده است."),
+)
+
+# Target status sent to the update_status endpoint -> action.
+STATUS_ACTIONS = {'in_progress': 'start', 'completed': 'complete', 'cancelled': 'cancel'}
+
+
+def compile_rules(rules):
+    table = {}
+    for rule in rules:
+        guard_q = Q()
+        for field, must_be_null in rule.guard:
+            guard_q &= Q(**{f'{field}__isnull': must_be_null})
+        guard = tuple((ServiceRequest._meta.get_field(field).attname, must_be_null)
+                      for field, must_be_null in rule.guard)
+        for from_status in rule.from_statuses:
+            transition = Transition(rule.action, from_status, rule.to_status or from_status,
+                                    guard, guard_q, rule.guard_message)
+            for role in rule.roles:
+                key = (rule.action, from_status, role)
+                if key in table:
+                    raise ValueError(f"duplicate transition rule {key}")
+                table[key] = transition
+    return table
+
+
+TABLE = compile_rules(RULES)
+ACTION_ROLES = {action: {role for a, _, role in TABLE if a == action} for action, _, _ in TABLE}
+
+# Everything ``check`` needs to know about a request, loadable with values_list.
+ROW_FIELDS = ('pk', 'status', 'customer_id', 'technician_id', 'final_price', 'rating')
+RequestRow = namedtuple('RequestRow', ROW_FIELDS)
+
+
+def roles_of(user, service_request):
+    roles = []
+    if user.pk == service_request.customer_id:
+        roles.append('customer')
+    if service_request.technician_id is not None and user.pk == service_request.technician_id:
+        roles.append('assigned_technician')
+    if getattr(user, 'role', None) == 'technician':
+        roles.append('technician')
+    if user.is_staff or getattr(user, 'role', None) == 'admin':
+        roles.append('admin')
+    return roles
+
+
+def check(action, row, user):
+    """
+    Look up the transition ``user`` may take on ``row`` (a ServiceRequest or
+    ``RequestRow``). Returns (transition, None) or (None, (code, message)) with
+    code 'forbidden' or 'invalid'.
+    """
+    roles = roles_of(user, row)
+    for role in roles:
+        transition = TABLE.get((action, row.status, role))
+        if transition is not None:
+            break
+    else:
+        if not ACTION_ROLES.get(action, set()).intersection(roles):
+            return None, ('forbidden', FORBIDDEN_MESSAGE)
+        return None, ('invalid', f"این عملیات در وضعیت «{STATUS_LABELS[row.status]}» مجاز نیست.")
+    for attname, must_be_null in transition.guard:
+        if (getattr(row, attname) is None) != must_be_null:
+            return None, ('invalid', transition.guard_message)
+    return transition, None
+
+
+def find(action, service_request, user):
+    """Return the ``Transition`` ``user`` may take, or raise 403/400 explaining why not."""
+    transition, error = check(action, service_request, user)
+    if error is not None:
+        code, message = error
+        raise PermissionDenied(message) if code == 'forbidden' else ValidationError(message)
+    return transition
+
+
+def perform(action, service_request, user, **values):
+    """
+    Apply ``action`` to ``service_request`` as ``user``, writing ``values``
+    along with the new status in the same guarded UPDATE.
+    """
+    transition = find(action, service_request, user)
+    fields = {}
+    for name, value in values.items():
+        setattr(service_request, name, value)
+        attname = ServiceRequest._meta.get_field(name).attname
+        fields[attname] = getattr(service_request, attname)
+    service_request.status = transition.to_status
+    service_request.updated_at = timezone.now()
+
+    with transaction.atomic():
+        # The version seen when the row was read must still be current, so any write
+        # committed since then (not only a status change) makes this one fail.
+        updated = (ServiceRequest.objects
+                   .filter(transition.guard_q, pk=service_request.pk, status=transition.from_status,
+                           version=service_request.version)
+                   .update(status=transition.to_status, updated_at=service_request.updated_at,
+                           version=F('version') + 1, **fields))
+        if not updated:
+            # ردیف در این فاصله توسط درخواست دیگری تغییر کرده است
+            raise PreconditionFailed()
+        service_request.version += 1
+        service_request._notify_change(adding=False)
+        request_transitioned.send(sender=ServiceRequest, instance=service_request, action=action,
+                                  from_status=transition.from_status, to_status=transition.to_status,
+                                  user=user, request_ids=[service_request.pk])
+    service_request._remember_state()
+    return service_request
+
+
+def perform_many(action, queryset, ids, user, chunk_size=500, **values):
+    """
+    Apply ``action`` as ``user`` to every request in ``ids`` that ``queryset``
+    lets them see, in one transaction. Returns {id: (code, message)} where code
+    is 'ok', 'not_found', 'forbidden', 'invalid' or 'conflict' (changed by
+    someone else between the read and the UPDATE).
+    """
+    ids = list(dict.fromkeys(ids))
+    fields = {ServiceRequest._meta.get_field(name).attname: value for name, value in values.items()}
+    results = {}
+    changes = []
+    with transaction.atomic():
+        now = timezone.now()
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            groups = defaultdict(list)
+            for row in queryset.filter(pk__in=chunk).values_list(*ROW_FIELDS):
+                row = RequestRow(*row)
+                transition, error = check(action, row, user)
+                if error is not None:
+                    results[row.pk] = error
+                else:
+                    groups[transition].append(row)
+
+            for transition, rows in groups.items():
+                row_ids = [row.pk for row in rows]
+                (ServiceRequest.objects
+                 .filter(transition.guard_q, pk__in=row_ids, status=transition.from_status)
+                 .update(status=transition.to_status, updated_at=now, version=F('version') + 1, **fields))
+                # Rows stamped with this exact updated_at are the ones this UPDATE won.
+                won = set(ServiceRequest.objects.filter(pk__in=row_ids, status=transition.to_status, updated_at=now)
+                          .values_list('pk', flat=True))
+                applied = []
+                for row in rows:
+                    if row.pk not in won:
+                        results[row.pk] = ('conflict', PreconditionFailed.default_detail)
+                        continue
+                    results[row.pk] = ('ok', None)
+                    applied.append(row.pk)
+                    if transition.to_status != transition.from_status:
+                        changes.append(RequestStatusChange(row.pk, row.customer_id, row.technician_id,
+                                                           row.technician_id, transition.from_status,
+                                                           transition.to_status))
+                if applied:
+                    request_transitioned.send(sender=ServiceRequest, instance=None, action=action,
+                                              from_status=transition.from_status,
+                                              to_status=transition.to_status, user=user, request_ids=applied)
+        if changes:
+            request_status_changed.send(sender=ServiceRequest, changes=changes)
+    return {pk: results.get(pk, ('not_found', NOT_FOUND_MESSAGE)) for pk in ids}
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import InsuranceContractViewSet, InsuranceQuoteView, ServiceRequestViewSet, UserRegisterView, UserProfileView, MyTokenObtainPairView, MaintenanceContractViewSet, QuoteView 
+from .views import BatchView, DashboardView, DatabasePoolView, ExportView, RequestAnalyticsView, InsuranceContractViewSet, InsuranceQuoteView, QuoteCacheView, RepriceView, ServiceRequestViewSet, UserRegisterView, UserProfileView, MyTokenObtainPairView, MaintenanceContractViewSet, QuoteView 
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -14,6 +14,13 @@ urlpatterns = [
     path('auth/login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/profile/', UserProfileView.as_view(), name='user_profile'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('analytics/requests/', RequestAnalyticsView.as_view(), name='request-analytics'),
+    path('db-pool/', DatabasePoolView.as_view(), name='db-pool'),
+    path('export/<str:name>/', ExportView.as_view(), name='export'),
+    path('pricing/reprice/', RepriceView.as_view(), name='reprice'),
+    path('pricing/quote-cache/', QuoteCacheView.as_view(), name='quote-cache'),
     path('contracts/quote/', QuoteView.as_view(), name='contract-quote'),
     path('contracts/active/', MaintenanceContractViewSet.as_view({'get': 'active'}), name='active-contract'),
     path('', include(router.urls)),
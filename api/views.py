@@ -1,22 +1,38 @@
+import os
+from datetime import date
+
 from django.contrib.auth import get_user_model
+from django.db import connections
 from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
 from rest_framework import generics, permissions, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema
-from .models import InsuranceContract, InsuranceType, ServiceRequest, RequestAttachment, MaintenanceContract, MaintenancePackage, TechnicianProfile
+from .models import ArchivedServiceRequest, InsuranceContract, InsuranceType, ServiceRequest, RequestAttachment, MaintenanceContract, MaintenancePackage, TechnicianProfile, UserDashboard
 from .serializers import (
-    InsuranceContractSerializer, InsuranceCreateSerializer, InsuranceQuoteSerializer, InsuranceTypeSerializer, UserRegisterSerializer, UserProfileSerializer, ServiceRequestSerializer,
+    ArchivedServiceRequestSerializer, BatchRequestSerializer, BatchResponseSerializer, BulkCancelSerializer, BulkResponseSerializer, BulkStatusUpdateSerializer,
+    InsuranceContractSerializer, InsuranceCreateSerializer, InsuranceQuoteSerializer, UserRegisterSerializer, UserProfileSerializer, ServiceRequestSerializer,
     ServiceRequestListSerializer, ServiceRequestCreateSerializer, 
     ServiceRequestStatusUpdateSerializer, ServiceRequestCancelSerializer,
     ServiceRequestPriceSerializer, ServiceRequestDiscountSerializer,
     ServiceRequestPaymentSerializer, ServiceRequestRatingSerializer,
-    MaintenanceContractSerializer, QuoteRequestSerializer, MaintenancePackageSerializer
+    MaintenanceContractSerializer, QuoteRequestSerializer,
+    UserDashboardSerializer, AnalyticsQuerySerializer,
+    NearbyRequestsQuerySerializer, NearbyRequestSerializer, ExportQuerySerializer, RepriceRequestSerializer,
 )
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import MyTokenObtainPairSerializer
+from .idempotency import idempotent
+from . import (
+    analytics, batch, concurrency, dashboard, discounts, export, listcache, matching, media, pooled, pricing, quotes,
+    schema, transitions,
+)
+from .schema import extend_schema
+from .signals import request_rated
 import django.db.models as models
 
 User = get_user_model()
@@ -36,9 +52,52 @@ class UserProfileView(generics.RetrieveAPIView):
         return self.request.user
 
 
-class ServiceRequestViewSet(viewsets.ModelViewSet):
+class DashboardView(generics.RetrieveAPIView):
+    serializer_class = UserDashboardSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        user = self.request.user
+        try:
+            return UserDashboard.objects.get(user=user)
+        except UserDashboard.DoesNotExist:
+            dashboard.refresh_users([user.pk])
+            return UserDashboard.objects.get(user=user)
+
+
+class CachedListMixin:
+    """Serve ``list`` from the per-user list cache (see api.listcache)."""
+    list_cache_name = None
+
+    def list_cache_scopes(self):
+        return [self.request.user.pk]
+
+    def list_cache_extra(self):
+        return ''
+
+    def list(self, request, *args, **kwargs):
+        key = listcache.payload_key(self.list_cache_name, self.list_cache_scopes(),
+                                    f'{self.list_cache_extra()}?{request.GET.urlencode()}')
+        payload = listcache.get_payload(key)
+        if payload is not None:
+            return Response(payload)
+        response = super().list(request, *args, **kwargs)
+        listcache.store_payload(key, response.data)
+        return response
+
+
+class ServiceRequestViewSet(CachedListMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = ServiceRequest.objects.all()
+    list_cache_name = 'requests'
+
+    def list_cache_scopes(self):
+        user = self.request.user
+        if user.is_staff:
+            return [user.pk, listcache.STAFF]
+        if user.role == 'technician':
+            return [user.pk, listcache.POOL]
+        return [user.pk]
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -67,48 +126,97 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
             return queryset.filter(Q(technician=user) | Q(technician__isnull=True, status='submitted'))
         return queryset if user.is_staff else queryset.none()
     
+    def get_archived_queryset(self):
+        user = self.request.user
+        queryset = ArchivedServiceRequest.objects.select_related('customer', 'technician')
+        if user.role == 'customer':
+            return queryset.filter(customer=user)
+        if user.role == 'technician':
+            return queryset.filter(technician=user)
+        return queryset if user.is_staff else queryset.none()
+
+    def perform_content_negotiation(self, request, force=False):
+        # پیوست‌ها فایل خام هستند؛ Accept: image/* نباید ۴۰۶ بگیرد
+        return super().perform_content_negotiation(request, force=force or self.action == 'attachment')
+
+    def get_object(self):
+        service_request = super().get_object()
+        if self.request.method not in permissions.SAFE_METHODS:
+            concurrency.check_if_match(self.request, service_request)
+        return service_request
+
+    def _respond(self, service_request):
+        return Response(
+            ServiceRequestSerializer(service_request).data,
+            status=status.HTTP_200_OK,
+            headers={'ETag': concurrency.etag(service_request)},
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return self._respond(self.get_object())
+        except Http404:
+            # درخواست‌های بسته‌شده قدیمی به جدول آرشیو منتقل شده‌اند
+            archived = generics.get_object_or_404(self.get_archived_queryset(), pk=kwargs['pk'])
+            return Response(ArchivedServiceRequestSerializer(archived).data)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(customer=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = f'"{response.data["version"]}"'
+        return response
+
+    def perform_update(self, serializer):
+        service_request = serializer.instance
+        for field, value in serializer.validated_data.items():
+            setattr(service_request, field, value)
+        concurrency.save(service_request, serializer.validated_data)
     
-    @extend_schema(summary="Accept a request", request=None, responses={200: ServiceRequestSerializer})
-    @action(detail=True, methods=['post'])
-    def accept(self, request, pk=None):
-        service_request = self.get_object()
+    @extend_schema(summary="Open requests near a technician",
+                   parameters=[NearbyRequestsQuerySerializer],
+                   responses={200: NearbyRequestSerializer(many=True)})
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
         user = request.user
-        
         if user.role != 'technician':
             return Response(
-                {"detail": "فقط تکنسین‌ها می‌توانند درخواست را بپذیرند."},
+                {"detail": "فقط تکنسین‌ها به این فهرست دسترسی دارند."},
                 status=status.HTTP_403_FORBIDDEN
             )
-        
-        if service_request.technician is not None:
-            return Response(
-                {"detail": "این درخواست قبلاً به تکنسین دیگری اختصاص داده شده است."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if service_request.status != 'submitted':
-            return Response(
-                {"detail": "فقط درخواست‌های با وضعیت 'ثبت شده' قابل پذیرش هستند."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        service_request.technician = user
-        service_request.status = 'assigned'
-        service_request.save()
-        
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+
+        query = NearbyRequestsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        profile = TechnicianProfile.objects.filter(user=user).first()
+
+        latitude = params.get('latitude', profile.base_latitude if profile else None)
+        longitude = params.get('longitude', profile.base_longitude if profile else None)
+        if latitude is None or longitude is None:
+            raise ValidationError("موقعیت تکنسین مشخص نیست؛ latitude و longitude را ارسال کنید.")
+        radius_km = params.get('radius_km', profile.service_radius_km if profile else 10.0)
+
+        rows = matching.nearby_open_requests(latitude, longitude, radius_km, limit=params['limit'])
+        return Response(NearbyRequestSerializer(rows, many=True).data)
+
+    @extend_schema(summary="Accept a request", request=None, responses={200: ServiceRequestSerializer})
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        service_request = self.get_object()
+        transitions.perform('accept', service_request, request.user, technician=request.user)
+        return self._respond(service_request)
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         service_request = self.get_object()
         user = request.user
         
-        if service_request.technician != user:
+        if service_request.technician_id != user.pk:
             return Response(
                 {"detail": "شما تکنسین اختصاص داده شده به این درخواست نیستید."},
                 status=status.HTTP_403_FORBIDDEN
@@ -117,28 +225,35 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         serializer = ServiceRequestStatusUpdateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        new_status = serializer.validated_data['status']
+        action_name = transitions.STATUS_ACTIONS[serializer.validated_data['status']]
+        transitions.perform(action_name, service_request, user)
         
-        # بررسی انتقال وضعیت مجاز
-        if service_request.status == 'assigned' and new_status != 'in_progress':
-            return Response(
-                {"detail": "فقط امکان تغییر به وضعیت 'در حال انجام' وجود دارد."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if service_request.status == 'in_progress' and new_status not in ['completed', 'cancelled']:
-            return Response(
-                {"detail": "فقط امکان تغییر به وضعیت 'تکمیل شده' یا 'لغو شده' وجود دارد."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        service_request.status = new_status
-        service_request.save()
-        
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        return self._respond(service_request)
+
+    def _bulk(self, action_name, ids, **values):
+        results = transitions.perform_many(action_name, self.get_queryset(), ids, self.request.user, **values)
+        return Response({
+            'updated': sum(1 for code, _ in results.values() if code == 'ok'),
+            'results': [{'id': pk, 'result': code, 'detail': detail} for pk, (code, detail) in results.items()],
+        })
+
+    @extend_schema(summary="Change the status of many requests",
+                   request=BulkStatusUpdateSerializer, responses={200: BulkResponseSerializer})
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action_name = transitions.STATUS_ACTIONS[serializer.validated_data['status']]
+        return self._bulk(action_name, serializer.validated_data['ids'])
+
+    @extend_schema(summary="Cancel many requests",
+                   request=BulkCancelSerializer, responses={200: BulkResponseSerializer})
+    @action(detail=False, methods=['post'])
+    def bulk_cancel(self, request):
+        serializer = BulkCancelSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._bulk('cancel', serializer.validated_data['ids'],
+                          cancel_reason=serializer.validated_data['cancel_reason'])
 
     @extend_schema(summary="Set final price for a completed request", 
                   request=ServiceRequestPriceSerializer, 
@@ -146,10 +261,7 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def set_price(self, request, pk=None):
         service_request = self.get_object()
-        user = request.user
-        
-        if not service_request.can_set_price(user):
-            raise PermissionDenied("You are not allowed to set price for this request.")
+        transitions.find('set_price', service_request, request.user)
         
         serializer = ServiceRequestPriceSerializer(
             service_request,
@@ -158,13 +270,10 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         
-        service_request.final_price = serializer.validated_data['final_price']
-        service_request.save()
+        transitions.perform('set_price', service_request, request.user,
+                            final_price=serializer.validated_data['final_price'])
         
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        return self._respond(service_request)
 
     @extend_schema(summary="Apply discount code", 
                   request=ServiceRequestDiscountSerializer, 
@@ -187,21 +296,15 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         
-        # در اینجا می‌توانید منطق اعمال تخفیف را اضافه کنید
-        discount_code = serializer.validated_data['discount_code']
-        service_request.discount_code = discount_code
-        service_request.discount_amount = 10000  # مثال: تخفیف 10,000 تومانی
-        service_request.save()
+        discounts.redeem(service_request, serializer.validated_data['discount_code'], user)
         
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        return self._respond(service_request)
 
     @extend_schema(summary="Pay for the service", 
                   request=ServiceRequestPaymentSerializer, 
                   responses={200: ServiceRequestSerializer})
     @action(detail=True, methods=['post'])
+    @idempotent
     def pay(self, request, pk=None):
         service_request = self.get_object()
         user = request.user
@@ -214,14 +317,9 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         # در اینجا می‌توانید منطق پرداخت را اضافه کنید
-        service_request.payment_status = True
-        service_request.status = 'paid'
-        service_request.save()
+        transitions.perform('pay', service_request, user, payment_status=True)
         
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        return self._respond(service_request)
 
     @extend_schema(summary="Rate and review the service", 
                   request=ServiceRequestRatingSerializer, 
@@ -236,37 +334,24 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
             data=request.data,
             context={'request': request}
         )
-        if not serializer.is_valid():
-            print("Validation errors:", serializer.errors)  # Log errors to console
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer.is_valid(raise_exception=True)
         
-        service_request.rating = serializer.validated_data['rating']
-        service_request.review = serializer.validated_data.get('review', '')
-        service_request.save()
+        transitions.perform('rate', service_request, user, rating=serializer.validated_data['rating'],
+                            review=serializer.validated_data.get('review', ''))
+        request_rated.send(sender=ServiceRequest, instance=service_request)
         
         # به‌روزرسانی امتیاز تکنسین
-        if service_request.technician:
-            try:
-                technician_profile = service_request.technician.technicianprofile
-                completed_requests = ServiceRequest.objects.filter(
-                    technician=service_request.technician,
-                    status='paid',
-                    rating__isnull=False
-                )
-                if completed_requests.exists():
-                    technician_profile.rating = completed_requests.aggregate(
-                        models.Avg('rating')
-                    )['rating__avg']
-                    technician_profile.save()
-            except TechnicianProfile.DoesNotExist:
-                pass
-        
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        if service_request.technician_id:
+            # One index-only read of request_technician_status_idx (technician, status, rating).
+            average = ServiceRequest.objects.filter(
+                technician_id=service_request.technician_id,
+                status='paid',
+                rating__isnull=False
+            ).aggregate(models.Avg('rating'))['rating__avg']
+            if average is not None:
+                TechnicianProfile.objects.filter(user_id=service_request.technician_id).update(rating=average)
+        
+        return self._respond(service_request)
 
     @extend_schema(summary="Cancel a request", request=ServiceRequestCancelSerializer, responses={200: ServiceRequestSerializer})
     @action(detail=True, methods=['post'])
@@ -279,28 +364,45 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         
-        service_request.status = 'cancelled'
-        service_request.cancel_reason = serializer.validated_data.get('cancel_reason', '')
-        service_request.save()
+        transitions.perform('cancel', service_request, request.user,
+                            cancel_reason=serializer.validated_data.get('cancel_reason', ''))
         
-        return Response(
-            ServiceRequestSerializer(service_request).data,
-            status=status.HTTP_200_OK
-        )
+        return self._respond(service_request)
+
+    @extend_schema(summary="Download a request attachment (supports Range)", responses={200: bytes, 206: bytes})
+    @action(detail=True, methods=['get'], url_path=r'attachments/(?P<attachment_id>\d+)')
+    def attachment(self, request, pk=None, attachment_id=None):
+        try:
+            attachments = self.get_object().attachments.all()
+        except Http404:
+            attachments = generics.get_object_or_404(self.get_archived_queryset(), pk=pk).attachments.all()
+        attachment = generics.get_object_or_404(attachments, pk=attachment_id)
+        return media.serve(request, attachment.file)
 
 
-class MaintenanceContractViewSet(viewsets.ModelViewSet):
+class MaintenanceContractViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = MaintenanceContract.objects.all()
     serializer_class = MaintenanceContractSerializer
+    list_cache_name = 'contracts'
+
+    def list_cache_extra(self):
+        # The list hides contracts past their end date, so it changes at midnight too.
+        return date.today().isoformat()
     
     def get_queryset(self):
-        return MaintenanceContract.objects.filter(user=self.request.user, is_active=True)
+        # قراردادهای منقضی‌شده‌ای که هنوز sweep_contracts غیرفعالشان نکرده نمایش داده نمی‌شوند
+        return MaintenanceContract.objects.filter(user=self.request.user, is_active=True, end_date__gte=date.today())
     
     def get_serializer_class(self):
         if self.action == 'create':
             return MaintenanceContractSerializer  # یا یک سریالایزر جدا برای create
         return MaintenanceContractSerializer
     
+    @action(detail=False, methods=['get'])
+    def active(self, request):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return Response(serializer.data)
+    
     def perform_create(self, serializer):
         data = self.request.data
         package = MaintenancePackage.objects.get(package_type=data.get('package'))  # فرض بر package به جای package_id
@@ -314,12 +416,16 @@ class MaintenanceContractViewSet(viewsets.ModelViewSet):
         price = quote_serializer.calculate_price(package.package_type)
         serializer.save(user=self.request.user, price=price, package=package, start_date=date.today())
 
-class InsuranceContractViewSet(viewsets.ModelViewSet):
+class InsuranceContractViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = InsuranceContract.objects.all()
     serializer_class = InsuranceContractSerializer
+    list_cache_name = 'insurance'
+
+    def list_cache_extra(self):
+        return date.today().isoformat()
     
     def get_queryset(self):
-        return InsuranceContract.objects.filter(user=self.request.user, is_active=True)
+        return InsuranceContract.objects.filter(user=self.request.user, is_active=True, end_date__gte=date.today())
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -348,18 +454,8 @@ class QuoteView(APIView):
         serializer = QuoteRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # محاسبه قیمت برای هر پکیج
-        packages = MaintenancePackage.objects.all()
-        results = []
-        
-        for package in packages:
-            price = serializer.calculate_price(package.package_type)
-            results.append({
-                'package': MaintenancePackageSerializer(package).data,
-                'price': price
-            })
-        
-        return Response(results)
+        # محاسبه قیمت برای هر پکیج (از حافظه در صورت تکرار مشخصات ساختمان)
+        return Response(quotes.maintenance_quotes(serializer.validated_data))
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
@@ -371,15 +467,144 @@ class InsuranceQuoteView(APIView):
         serializer = InsuranceQuoteSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # محاسبه قیمت برای هر نوع بیمه
-        insurance_types = InsuranceType.objects.all()
-        results = []
-        
-        for ins_type in insurance_types:
-            price = serializer.calculate_price(ins_type.name)
-            results.append({
-                'insurance_type': InsuranceTypeSerializer(ins_type).data,
-                'price': price
-            })
-        
-        return Response(results)
\ No newline at end of file
+        # محاسبه قیمت برای هر نوع بیمه (از حافظه در صورت تکرار مشخصات ساختمان)
+        return Response(quotes.insurance_quotes(serializer.validated_data))
+
+
+class RequestAnalyticsView(APIView):
+    """Staff reporting over the pre-aggregated daily rollups."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(parameters=[AnalyticsQuerySerializer], responses={200: dict})
+    def get(self, request):
+        serializer = AnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'group_by': params['group_by'],
+            'results': analytics.query(params['start'], params['end'], params['group_by']),
+        })
+
+
+class BatchView(APIView):
+    """Several GET requests in one round trip, answered in one combined response."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(summary="Run several GET requests in one call",
+                   request=BatchRequestSerializer, responses={200: BatchResponseSerializer})
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return Response({'responses': batch.run(request, data['requests'], parallel=data['parallel'])})
+
+
+class DatabasePoolView(APIView):
+    """Staff view of this worker's database connection settings and pool counters."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(responses={200: dict})
+    def get(self, request):
+        return Response({
+            'pid': os.getpid(),
+            'databases': {
+                alias: {
+                    'engine': connections.settings[alias]['ENGINE'],
+                    'conn_max_age': connections.settings[alias]['CONN_MAX_AGE'],
+                    'conn_health_checks': connections.settings[alias]['CONN_HEALTH_CHECKS'],
+                }
+                for alias in connections
+            },
+            'pools': pooled.all_stats(),
+        })
+
+
+class ExportView(APIView):
+    """Staff download of a whole table as streamed CSV or JSONL (optionally gzipped)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is CSV/JSONL whatever the renderers are; don't 406 an Accept: text/csv.
+        return super().perform_content_negotiation(request, force=True)
+
+    @extend_schema(parameters=[ExportQuerySerializer], responses={200: bytes})
+    def get(self, request, name):
+        if name not in export.EXPORTS:
+            raise Http404
+        serializer = ExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        output, gzip = serializer.validated_data['output'], serializer.validated_data['gzip']
+
+        response = StreamingHttpResponse(
+            export.stream(name, output, gzip),
+            content_type='application/gzip' if gzip else export.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(name, output, gzip)}"'
+        return response
+
+
+class RepriceView(APIView):
+    """
+    Staff: renewal price impact of a candidate catalog on every active contract.
+    Returns totals per contract kind, or with ``report`` a streamed CSV diff;
+    ``apply`` stores the new prices as the contracts' renewal_price. The
+    report is a dry run only: the serializer rejects ``report`` with ``apply``.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The report is CSV whatever the renderers are; don't 406 an Accept: text/csv.
+        return super().perform_content_negotiation(request, force=True)
+
+    @extend_schema(request=RepriceRequestSerializer, responses={200: dict})
+    def post(self, request):
+        serializer = RepriceRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        catalog, kinds = params['catalog'], params['kinds']
+
+        if params['report']:
+            rows = (pricing.report_row(change)
+                    for _, changes in pricing.reprice(catalog, kinds) for change in changes)
+            response = StreamingHttpResponse(export.stream_rows(pricing.REPORT_COLUMNS, rows),
+                                             content_type=export.CONTENT_TYPES['csv'])
+            response['Content-Disposition'] = 'attachment; filename="reprice.csv"'
+            return response
+        return Response({
+            'catalog': catalog.as_dict(),
+            'applied': params['apply'],
+            'summary': pricing.run(catalog, kinds, apply_prices=params['apply']),
+        })
+
+
+class QuoteCacheView(APIView):
+    """Staff view of this worker's memoized quote counters (size, hits, misses, evictions)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(responses={200: dict})
+    def get(self, request):
+        return Response({'pid': os.getpid(), **quotes.stats()})
+
+
+class SchemaView(View):
+    """Serves the prebuilt OpenAPI schema artifact; it is never generated per request."""
+
+    def get(self, request):
+        wants_json = request.GET.get('format') == 'json' or 'json' in request.headers.get('Accept', '')
+        file_format = 'json' if wants_json else 'yaml'
+        loaded = schema.load(file_format)
+        if loaded is None:
+            return JsonResponse(
+                {"detail": "مستندات API هنوز ساخته نشده است؛ دستور build_schema را اجرا کنید."},
+                status=503,
+            )
+        content, etag = loaded
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=schema.CONTENT_TYPES[file_format])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        response['Vary'] = 'Accept'
+        return response
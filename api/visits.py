@@ -0,0 +1,181 @@
+"""
+Recurring maintenance visits.
+
+An active ``MaintenanceContract`` is visited on a fixed calendar counted from
+its start date: every ``VISIT_INTERVAL_DAYS[package_type]`` days for each
+group of up to ``ELEVATORS_PER_VISIT`` elevators, the groups spread evenly
+over the interval. ``generate`` creates the submitted ``ServiceRequest`` of
+every visit due within the horizon that does not exist yet, a batch of
+contracts at a time with one ``executemany`` INSERT per batch. The unique
+(contract, visit_date) key makes re-runs, overlapping horizons and
+concurrent runs insert nothing twice.
+
+To spread the load, the daily run only handles the contracts whose id falls
+in the day's bucket (id mod ``VISIT_SPREAD_DAYS``). The horizon is longer
+than a whole rotation, so every contract is topped up before its next
+visit is due.
+
+Visits due after today are inserted as ``scheduled``: they are not in the
+technicians' open pool, cannot be accepted and do not count as open on the
+dashboard. ``release_due`` (run by the same daily command) moves them to
+``submitted`` on their day.
+
+Neither path calls save(), so each batch sends one ``request_status_changed``
+for the rows it wrote: the dashboard, list cache and analytics receivers
+(the 'created' event of a new visit included) then update in bulk.
+"""
+import math
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .models import MaintenanceContract, ServiceRequest
+from .signals import RequestStatusChange, request_status_changed
+
+VISIT_INTERVAL_DAYS = {'basic': 60, 'standard': 30, 'premium': 15}
+ELEVATORS_PER_VISIT = 4
+SCHEDULED = 'scheduled'
+
+Visit = namedtuple('Visit', 'date group groups')
+
+
+def horizon_days():
+    return getattr(settings, 'VISIT_HORIZON_DAYS', 60)
+
+
+def spread_days():
+    return getattr(settings, 'VISIT_SPREAD_DAYS', 7)
+
+
+def visit_calendar(package_type, elevator_count, start_date, end_date, first, last):
+    """Visits of one contract between ``first`` and ``last`` (inclusive), in date order."""
+    interval = VISIT_INTERVAL_DAYS.get(package_type, VISIT_INTERVAL_DAYS['basic'])
+    groups = min(interval, max(1, math.ceil((elevator_count or 0) / ELEVATORS_PER_VISIT)))
+    first, last = max(first, start_date), min(last, end_date)
+    # Visit k (from 1) is on start_date + k * interval / groups days and covers group (k - 1) % groups.
+    k = max(1, (first - start_date).days * groups // interval)
+    visits = []
+    while True:
+        day = start_date + timedelta(days=k * interval // groups)
+        if day > last:
+            return visits
+        if day >= first:
+            visits.append(Visit(day, (k - 1) % groups, groups))
+        k += 1
+
+
+def _describe(visit, package_name, elevator_count):
+    if visit.groups == 1:
+        return f"سرویس دوره‌ای قرارداد {package_name} ({elevator_count} دستگاه آسانسور)"
+    first = visit.group * ELEVATORS_PER_VISIT + 1
+    last = min(first + ELEVATORS_PER_VISIT - 1, elevator_count)
+    return f"سرویس دوره‌ای قرارداد {package_name}، آسانسورهای {first} تا {last} از {elevator_count}"
+
+
+# Every NOT NULL column of ServiceRequest plus the visit key; the rest stay NULL.
+INSERT_FIELDS = ('customer', 'maintenance_contract', 'visit_date', 'title', 'description', 'address', 'status',
+                 'created_at', 'updated_at', 'discount_amount', 'payment_status', 'version')
+
+
+def _insert_sql():
+    meta = ServiceRequest._meta
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in INSERT_FIELDS]
+    return '{} {} ({}) VALUES ({}) {}'.format(
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE), quote(meta.db_table),
+        ', '.join(quote(field.column) for field in fields), ', '.join(['%s'] * len(fields)),
+        connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+
+
+def _generate_batch(rows, first, last):
+    existing = set(
+        ServiceRequest.objects.filter(maintenance_contract_id__in=[row[0] for row in rows],
+                                      visit_date__gte=first, visit_date__lte=last)
+        .values_list('maintenance_contract_id', 'visit_date')
+    )
+    ops = connection.ops
+    stamp = timezone.now()
+    now = ops.adapt_datetimefield_value(stamp)
+    zero = ops.adapt_decimalfield_value(Decimal(0))
+    # Plain tuples through executemany: building and preparing a model instance per
+    # visit costs several times more than the INSERT itself.
+    values = [
+        (user_id, pk, ops.adapt_datefield_value(visit.date), f"بازدید دوره‌ای {visit.date.isoformat()}",
+         _describe(visit, package_name, elevator_count), '', SCHEDULED if visit.date > first else 'submitted',
+         now, now, zero, False, 1)
+        for pk, user_id, package_type, package_name, elevator_count, start_date, end_date in rows
+        for visit in visit_calendar(package_type, elevator_count, start_date, end_date, first, last)
+        if (pk, visit.date) not in existing
+    ]
+    if not values:
+        return 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Conflicts (a concurrent run inserting the same visit) are skipped, not errors.
+            cursor.executemany(_insert_sql(), values)
+        # Rows a concurrent run inserted first carry its timestamp, not this one.
+        inserted = ServiceRequest.objects.filter(
+            maintenance_contract_id__in=[row[0] for row in rows], visit_date__gte=first, visit_date__lte=last,
+            created_at=stamp,
+        ).values_list('pk', 'customer_id', 'status')
+        changes = [RequestStatusChange(pk, customer_id, None, None, None, request_status)
+                   for pk, customer_id, request_status in inserted]
+        if changes:
+            request_status_changed.send(sender=ServiceRequest, changes=changes)
+    return len(changes)
+
+
+def generate(today=None, horizon=None, spread=None, every_contract=False, batch_size=1000, on_batch=None):
+    """
+    Create the missing visits up to ``today + horizon`` days for today's bucket
+    of contracts (all of them with ``every_contract``); return how many.
+    """
+    today = today or date.today()
+    horizon = horizon_days() if horizon is None else horizon
+    spread = spread_days() if spread is None else spread
+    last = today + timedelta(days=horizon)
+
+    contracts = MaintenanceContract.objects.filter(is_active=True, end_date__gte=today, start_date__lte=last)
+    if not every_contract and spread > 1:
+        contracts = contracts.annotate(bucket=F('pk') % spread).filter(bucket=today.toordinal() % spread)
+    contracts = contracts.order_by('pk').values_list(
+        'pk', 'user_id', 'package__package_type', 'package__name', 'elevator_count', 'start_date', 'end_date')
+
+    created = last_pk = 0
+    while True:
+        rows = list(contracts.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return created
+        last_pk = rows[-1][0]
+        created += _generate_batch(rows, today, last)
+        if on_batch:
+            on_batch(len(rows))
+
+
+def release_due(today=None, batch_size=1000):
+    """Move the scheduled visits due by ``today`` to ``submitted``; return how many."""
+    today = today or date.today()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = dict(ServiceRequest.objects.filter(status=SCHEDULED, visit_date__lte=today)
+                        .order_by('pk').values_list('pk', 'customer_id')[:batch_size])
+            if not rows:
+                return released
+            now = timezone.now()
+            ServiceRequest.objects.filter(pk__in=list(rows), status=SCHEDULED).update(
+                status='submitted', updated_at=now, version=F('version') + 1)
+            # A visit cancelled since the SELECT keeps its status; only rows stamped now were released.
+            won = ServiceRequest.objects.filter(pk__in=list(rows), status='submitted', updated_at=now) \
+                .values_list('pk', flat=True)
+            changes = [RequestStatusChange(pk, rows[pk], None, None, SCHEDULED, 'submitted') for pk in won]
+            if changes:
+                request_status_changed.send(sender=ServiceRequest, changes=changes)
+        released += len(changes)
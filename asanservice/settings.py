@@ -84,6 +84,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep a worker thread's connection across requests instead of opening one per
+        # request; it is pinged before reuse so a dropped connection is replaced.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -147,6 +151,69 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# How long a stored Idempotency-Key response is replayed (seconds)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# Insurance ending within this many days counts as "expiring soon" on the dashboard
+DASHBOARD_EXPIRING_SOON_DAYS = 30
+
+# Automatic dispatch (python manage.py dispatch_requests)
+DISPATCH_WEIGHTS = {'workload': 1.0, 'rating': 0.5, 'distance': 0.2}
+DISPATCH_MAX_OPEN_JOBS = 3
+DISPATCH_MAX_DISTANCE_KM = 30.0
+
+# In-process cache of discount code rules
+DISCOUNT_CACHE_SIZE = 4096
+DISCOUNT_CACHE_TTL = 60  # seconds
+
+# Most request ids accepted by one bulk_update_status / bulk_cancel call
+BULK_MAX_IDS = 5000
+
+# POST /api/batch/: most sub-requests per call and threads used with "parallel"
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Per-user cache of request/contract list payloads (api.listcache). Point "lists"
+# at a shared backend (Redis, Memcached) when running several workers.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'lists': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'list-payloads',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+LIST_CACHE_ALIAS = 'lists'
+LIST_CACHE_TIMEOUT = 300  # seconds
+
+# Paid/cancelled requests untouched for this long are moved to the archive tables
+ARCHIVE_AFTER_DAYS = 180
+
+# Who sends attachment bytes (api.media): None streams from the worker;
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd) hand it to the front server.
+ATTACHMENT_OFFLOAD = None
+ATTACHMENT_ACCEL_PREFIX = '/protected-media/'  # nginx "internal" location aliased to MEDIA_ROOT
+
+# Unused attachment blobs younger than this (seconds) are kept by collect_attachment_blobs
+ATTACHMENT_BLOB_GC_GRACE = 3600
+
+# Periodic maintenance visits (python manage.py generate_visits, daily): visits due within
+# VISIT_HORIZON_DAYS are created; each day handles contracts with id % VISIT_SPREAD_DAYS == day.
+VISIT_HORIZON_DAYS = 60
+VISIT_SPREAD_DAYS = 7
+
+# Changes to the quote catalog defaults in api.pricing.Catalog (multipliers, base prices), e.g.
+# {'package_multipliers': {'premium': '2.2'}}. Preview the effect with reprice_contracts first.
+PRICING_CATALOG = {}
+
+# In-process memo of quote responses by building profile (api.quotes); GET /api/pricing/quote-cache/ shows its counters
+QUOTE_CACHE_SIZE = 2048
+QUOTE_CACHE_TTL = 60  # seconds; bounds staleness in other workers unless CACHES['lists'] is shared
+
+# Prebuilt OpenAPI schema (python manage.py build_schema)
+SCHEMA_ARTIFACT_DIR = BASE_DIR / 'build' / 'schema'
+SCHEMA_FINGERPRINT_MODULES = ('api.serializers', 'api.models')
+
 # DRF Spectacular Settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Asan Service API Documentation',
@@ -159,4 +226,9 @@ SPECTACULAR_SETTINGS = {
     # کامپوننت‌های جداگانه در مستندات بسازد. این کار به طور موثری
     # حلقه‌های وابستگی که باعث هنگ کردن می‌شوند را می‌شکند.
     'COMPONENT_SPLIT_REQUEST': True,
+    # bulk_update_status takes a subset of the request statuses
+    'ENUM_NAME_OVERRIDES': {
+        'ServiceRequestStatusEnum': 'api.models.STATUS_CHOICES',
+        'RequestTargetStatusEnum': 'api.transitions.STATUS_ACTIONS',
+    },
 }
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Lean settings for API workers.
+
+Same as ``settings`` but without what only the admin site and the interactive
+docs need (admin, sessions, messages, static files, drf_spectacular), so a
+worker imports less and answers its first request sooner. The schema itself
+is still served from the prebuilt artifact at ``api/schema/``. Run the admin
+and docs from a separate process on the default settings.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+DEBUG = os.environ.get('DJANGO_DEBUG', '') == '1'
+if os.environ.get('DJANGO_ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = os.environ['DJANGO_ALLOWED_HOSTS'].split(',')
+if os.environ.get('DJANGO_SECRET_KEY'):
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEFERRED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+)
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEFERRED_APPS]
+
+# JWT only: no session, message or session-based auth middleware.
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    )
+]
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {'context_processors': ['django.template.context_processors.request']},
+}]
+
+ROOT_URLCONF = 'asanservice.urls_api'
+
+# DRF's default schema class; naming AutoSchema would import drf_spectacular with the first APIView.
+REST_FRAMEWORK = {key: value for key, value in REST_FRAMEWORK.items() if key != 'DEFAULT_SCHEMA_CLASS'}
+
+# Connections come from a per-process pool (see api/pooled) rather than one
+# persistent connection per thread; CONN_MAX_AGE 0 hands it back after each request.
+# DB_ENGINE picks the pooled backend: api.pooled.postgresql (default) or api.pooled.sqlite3.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'api.pooled.postgresql')
+DATABASES = {
+    **DATABASES,
+    'default': {
+        **DATABASES['default'],
+        'ENGINE': DB_ENGINE,
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+        },
+    },
+}
+if DB_ENGINE == 'api.pooled.postgresql':
+    DATABASES['default'].update({
+        'NAME': os.environ.get('DB_NAME', 'asanservice'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+    })
+
+# Attachment bytes are sent by the front server; the worker only checks access.
+# Set DJANGO_ATTACHMENT_OFFLOAD to 'x-sendfile' behind Apache, or empty to stream from Python.
+ATTACHMENT_OFFLOAD = os.environ.get('DJANGO_ATTACHMENT_OFFLOAD', 'x-accel-redirect') or None
@@ -1,17 +1,18 @@
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
-    SpectacularAPIView,
     SpectacularRedocView,
     SpectacularSwaggerView,
 )
+from api.views import SchemaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 
     # آدرس‌های جدید برای مستندات API
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    # از فایل ساخته‌شده توسط build_schema خوانده می‌شود
+    path('api/schema/', SchemaView.as_view(), name='schema'),
     # آدرس مستندات تعاملی Swagger UI
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     # آدرس مستندات ساده‌تر Redoc
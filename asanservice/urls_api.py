@@ -0,0 +1,9 @@
+"""URLconf of the lean API profile (settings_production): no admin or docs UIs."""
+from django.urls import include, path
+
+from api.views import SchemaView
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path('api/schema/', SchemaView.as_view(), name='schema'),
+]